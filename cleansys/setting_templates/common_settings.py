@@ -26,7 +26,8 @@ INSTALLED_APPS = [
     'bootstrap3',
     'crispy_forms',
     'coverage',
-    'rest_framework'
+    'rest_framework',
+    'django_filters',
 ]
 
 MIDDLEWARE = [
@@ -37,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'webinterface.epoch_calendar.CurrentEpochWeekMiddleware',
 ]
 
 ROOT_URLCONF = 'cleansys.urls'
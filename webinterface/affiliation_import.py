@@ -0,0 +1,193 @@
+import csv
+import json
+from django.db import transaction
+from webinterface.models import *
+
+
+def parse_week(value) -> int:
+    """
+    :param value: An epoch week number or a date in the format YYYY-MM-DD
+    :return: Epoch week number
+    """
+    if isinstance(value, int):
+        return value
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return date_to_epoch_week(datetime.date.fromisoformat(value))
+    except ValueError:
+        raise ValidationError("'{}' ist weder eine Wochennummer noch ein Datum im Format JJJJ-MM-TT.".format(value))
+
+
+class AffiliationImport:
+    """
+    The AffiliationImport creates many Affiliations at once, for example all move-ins and move-outs of a semester.
+
+    Each row names a Cleaner and a ScheduleGroup by name or slug and gives the beginning and end as epoch weeks or
+    as dates. The rows are checked for overlaps with each other and with the existing Affiliations of the
+    Cleaners in memory, by sorting the intervals of each Cleaner and sweeping over them. The Affiliations are then
+    written with a single bulk_create() and the CleaningWeeks they affect are invalidated at once, instead of
+    running Affiliation.date_validator() and cleaning_week_assignments_invalidator() for every row.
+    """
+    FIELDS = ['cleaner', 'group', 'beginning', 'end']
+
+    def __init__(self, rows: list):
+        """
+        :param rows: List of dicts with the keys cleaner, group, beginning and end
+        """
+        self.rows = rows
+        self.affiliations = []
+        # The line of the row each of self.affiliations was built from
+        self.lines = []
+        self.errors = []
+
+    @classmethod
+    def from_csv(cls, file):
+        """The first line of the CSV file must name the columns cleaner, group, beginning and end"""
+        return cls(list(csv.DictReader(file)))
+
+    @classmethod
+    def from_json(cls, file):
+        """The JSON file must hold a list of objects with the keys cleaner, group, beginning and end"""
+        return cls(json.load(file))
+
+    def validate(self) -> bool:
+        """
+        Builds the unsaved Affiliations of the rows and collects every problem in self.errors
+
+        :return: True if all rows can be imported
+        """
+        self.affiliations = []
+        self.lines = []
+        self.errors = []
+
+        if not isinstance(self.rows, list) or not all(isinstance(x, dict) for x in self.rows):
+            self.errors.append("Die Daten müssen eine Liste von Zugehörigkeiten sein.")
+            return False
+
+        cleaners = {x.slug: x for x in Cleaner.objects.filter(
+            slug__in=[slugify(str(x.get('cleaner', ''))) for x in self.rows])}
+        groups = {x.slug: x for x in ScheduleGroup.objects.filter(
+            slug__in=[slugify(str(x.get('group', ''))) for x in self.rows])}
+
+        for line, row in enumerate(self.rows, start=1):
+            missing = [x for x in self.FIELDS if row.get(x) in [None, '']]
+            if missing:
+                self.errors.append("Zeile {}: Es fehlen die Felder {}.".format(line, ", ".join(missing)))
+                continue
+            cleaner = cleaners.get(slugify(str(row['cleaner'])))
+            group = groups.get(slugify(str(row['group'])))
+            if cleaner is None:
+                self.errors.append("Zeile {}: Es gibt keinen Putzer '{}'.".format(line, row['cleaner']))
+            if group is None:
+                self.errors.append("Zeile {}: Es gibt keine Putzplan-Gruppe '{}'.".format(line, row['group']))
+            try:
+                beginning, end = parse_week(row['beginning']), parse_week(row['end'])
+            except ValidationError as e:
+                self.errors.append("Zeile {}: {}".format(line, e.messages[0]))
+                continue
+            if beginning > end:
+                self.errors.append("Zeile {}: Das Ende einer Zugehörigkeit darf nicht vor dem Anfang liegen!".
+                                   format(line))
+                continue
+            if cleaner is not None and group is not None:
+                self.affiliations.append(Affiliation(cleaner=cleaner, group=group, beginning=beginning, end=end))
+                self.lines.append(line)
+
+        self.errors += self.overlaps()
+        return not self.errors
+
+    def overlaps(self) -> list:
+        """
+        :return: Error messages for all new Affiliations which overlap with another Affiliation of their Cleaner
+        """
+        intervals = {}
+        for cleaner_pk, beginning, end in Affiliation.objects.filter(
+                cleaner__in=set(x.cleaner_id for x in self.affiliations)).values_list('cleaner', 'beginning', 'end'):
+            intervals.setdefault(cleaner_pk, []).append((beginning, end, None))
+        for affiliation, line in zip(self.affiliations, self.lines):
+            intervals.setdefault(affiliation.cleaner_id, []).append((affiliation.beginning, affiliation.end, line))
+
+        errors = []
+        for cleaner_intervals in intervals.values():
+            cleaner_intervals.sort(key=lambda x: (x[0], x[1]))
+            # Sweep over the intervals in the order of their beginnings, remembering the one which ends last
+            last = cleaner_intervals[0]
+            for current in cleaner_intervals[1:]:
+                if current[0] <= last[1] and (current[2] is not None or last[2] is not None):
+                    if current[2] is not None and last[2] is not None:
+                        errors.append("Zeile {}: Die Zugehörigkeit überlappt mit Zeile {}.".
+                                      format(current[2], last[2]))
+                    else:
+                        errors.append("Zeile {}: Die Zugehörigkeit überlappt mit einer vorhandenen Zugehörigkeit.".
+                                      format(current[2] if current[2] is not None else last[2]))
+                if current[1] > last[1]:
+                    last = current
+        return errors
+
+    def run(self) -> int:
+        """
+        Validates and imports all rows in one transaction
+
+        :return: Number of created Affiliations
+        """
+        if not self.validate():
+            raise ValidationError(self.errors)
+
+        with transaction.atomic():
+            Affiliation.objects.bulk_create(self.affiliations)
+            # bulk_create() doesn't call Affiliation.save(), so its side effects are applied here once for all rows
+            cleaner_pks = set(x.cleaner_id for x in self.affiliations)
+            ScheduleMembership.objects.refresh(Affiliation.objects.filter(cleaner__in=cleaner_pks))
+            week_ranges = self.affected_week_ranges()
+            self.invalidate_cleaning_weeks(week_ranges)
+            schedule_pks = week_ranges.keys()
+            AnalyticsPlot.objects.of_schedules(Schedule.objects.filter(pk__in=schedule_pks)).invalidate()
+            if self.affiliations:
+                DutySwitchCandidate.objects.refresh_for_weeks(
+                    first_week=min(x.beginning for x in self.affiliations),
+                    last_week=max(x.end for x in self.affiliations))
+        return len(self.affiliations)
+
+    def affected_week_ranges(self) -> dict:
+        """
+        :return: The merged week ranges of the new Affiliations for each Schedule: {schedule_pk: [(first, last)]}
+        """
+        group_schedules = {}
+        for group_pk, schedule_pk in ScheduleGroup.schedules.through.objects.filter(
+                schedulegroup__in=set(x.group_id for x in self.affiliations)).\
+                values_list('schedulegroup', 'schedule'):
+            group_schedules.setdefault(group_pk, []).append(schedule_pk)
+
+        ranges = {}
+        for affiliation in self.affiliations:
+            for schedule_pk in group_schedules.get(affiliation.group_id, []):
+                ranges.setdefault(schedule_pk, []).append((affiliation.beginning, affiliation.end))
+
+        for schedule_pk, schedule_ranges in ranges.items():
+            schedule_ranges.sort()
+            merged = [schedule_ranges[0]]
+            for beginning, end in schedule_ranges[1:]:
+                if beginning <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((beginning, end))
+            ranges[schedule_pk] = merged
+        return ranges
+
+    @staticmethod
+    def invalidate_cleaning_weeks(week_ranges: dict) -> int:
+        """
+        :param week_ranges: As returned by affected_week_ranges()
+        :return: Number of CleaningWeeks whose Assignments were invalidated
+        """
+        condition = Q()
+        for schedule_pk, ranges in week_ranges.items():
+            for beginning, end in ranges:
+                condition |= Q(schedule=schedule_pk, week__range=(beginning, end))
+        if not condition:
+            return 0
+        return CleaningWeek.objects.filter(condition).in_future().invalidate_assignments()
@@ -0,0 +1,72 @@
+"""
+The compact format of the API list endpoints, for clients which pull whole listings, like a wall display.
+
+Instead of a hyperlinked object per row, a page holds one array per column (id, week, schedule_id, cleaner_id, ...)
+with the IDs of related rows. The rows are read with QuerySet.values(), so neither model instances nor URLs are
+built. The format is chosen with the parameter ?format=compact or the Accept header
+application/vnd.cleansys.compact+json. If the optional package msgpack is installed, ?format=msgpack or
+application/msgpack return the same data as MessagePack.
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class CompactJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.cleansys.compact+json'
+    format = 'compact'
+    columnar = True
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    columnar = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Dates and lazy translations are sent as strings, like the JSONRenderer does
+        return msgpack.packb(data, use_bin_type=True, default=str)
+
+
+def compact_renderer_classes() -> list:
+    renderer_classes = list(api_settings.DEFAULT_RENDERER_CLASSES) + [CompactJSONRenderer]
+    if msgpack is not None:
+        renderer_classes.append(MessagePackRenderer)
+    return renderer_classes
+
+
+def columns(rows, fields: tuple) -> dict:
+    """
+    :param rows: Dicts as returned by QuerySet.values()
+    :return: A list of the values of each field
+    """
+    rows = list(rows)
+    return {field: [x[field] for x in rows] for field in fields}
+
+
+class CompactListMixin:
+    """
+    Adds the compact format to the list action of a ModelViewSet. compact_fields are the columns, which must be
+    fields, attnames like schedule_id or annotations of the viewset's queryset.
+    """
+    compact_fields = ('id',)
+    renderer_classes = compact_renderer_classes()
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(request.accepted_renderer, 'columnar', False):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*self.compact_fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(columns(page, self.compact_fields))
+        return Response(columns(queryset, self.compact_fields))
@@ -0,0 +1,87 @@
+"""
+The FilterSets of the API list endpoints, for example /api/assignments/?cleaning_week__week__range=2500,2510
+
+Every filter is on a column with an index (the week of CleaningWeeks is covered by the unique index on week and
+schedule), so that fetching a range of weeks reads only these weeks, see the API entries of
+query_plans.query_catalogue(). Ranges are given as two comma separated values, gte and lte work as well.
+"""
+from django_filters import rest_framework as filters
+from webinterface.models import *
+
+WEEK_LOOKUPS = ['exact', 'gte', 'lte', 'range']
+
+
+class ScheduleFilter(filters.FilterSet):
+    class Meta:
+        model = Schedule
+        fields = ['weekday', 'frequency']
+
+
+class ScheduleGroupFilter(filters.FilterSet):
+    class Meta:
+        model = ScheduleGroup
+        fields = ['schedules']
+
+
+class CleanerFilter(filters.FilterSet):
+    class Meta:
+        model = Cleaner
+        fields = ['slug']
+
+
+class AffiliationFilter(filters.FilterSet):
+    class Meta:
+        model = Affiliation
+        fields = {
+            'cleaner': ['exact'],
+            'group': ['exact'],
+            'beginning': WEEK_LOOKUPS,
+            'end': WEEK_LOOKUPS,
+        }
+
+
+class CleaningWeekFilter(filters.FilterSet):
+    class Meta:
+        model = CleaningWeek
+        fields = {
+            'week': WEEK_LOOKUPS,
+            'schedule': ['exact'],
+            'disabled': ['exact'],
+            'assignments_valid': ['exact'],
+        }
+
+
+class AssignmentFilter(filters.FilterSet):
+    class Meta:
+        model = Assignment
+        fields = {
+            'cleaning_week__week': WEEK_LOOKUPS,
+            'cleaning_week': ['exact'],
+            'schedule': ['exact'],
+            'cleaner': ['exact'],
+        }
+
+
+class TaskTemplateFilter(filters.FilterSet):
+    class Meta:
+        model = TaskTemplate
+        fields = ['schedule']
+
+
+class TaskFilter(filters.FilterSet):
+    class Meta:
+        model = Task
+        fields = {
+            'cleaning_week__week': WEEK_LOOKUPS,
+            'cleaning_week': ['exact'],
+            'cleaned_by': ['exact', 'isnull'],
+        }
+
+
+class DutySwitchFilter(filters.FilterSet):
+    class Meta:
+        model = DutySwitch
+        fields = {
+            'requester_assignment__cleaning_week__week': WEEK_LOOKUPS,
+            'requester_assignment__cleaner': ['exact'],
+        }
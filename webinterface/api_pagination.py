@@ -0,0 +1,20 @@
+"""
+Cursor pagination for the API endpoints whose rows pile up week after week.
+
+With page numbers, the database skips all rows in front of a page with OFFSET. A cursor instead encodes the week of
+the last row of a page and the next page starts with a week__gt condition, so fetching a page costs the same no
+matter how much history lies in front of it. The rows must have a 'week' field or annotation,
+Affiliations are ordered by the week of their beginning.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class WeekCursorPagination(CursorPagination):
+    ordering = ('week', 'pk')
+    # Clients which pull whole listings in the compact format ask for larger pages
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class BeginningCursorPagination(WeekCursorPagination):
+    ordering = ('beginning', 'pk')
@@ -1,10 +1,17 @@
 from rest_framework.viewsets import ModelViewSet
-from rest_framework import generics, mixins, viewsets, permissions
+from rest_framework import generics, mixins, viewsets, permissions, status
 from webinterface.models import *
 from webinterface.serializers import *
+from webinterface.affiliation_import import AffiliationImport
+from webinterface.api_compact import CompactListMixin
+from webinterface.api_filters import *
+from webinterface.api_pagination import WeekCursorPagination, BeginningCursorPagination
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
+from django.core.exceptions import ValidationError
+from django.db.models import F
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -18,54 +25,106 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         )
 
 
-class ScheduleViewSet(ModelViewSet):
+def paginated_response(view, queryset, serializer_class, pagination_class) -> Response:
+    """
+    :return: One page of queryset, for sub-resources which are paginated differently than the view itself
+    """
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(queryset, view.request, view=view)
+    serializer = serializer_class(page, many=True, context=view.get_serializer_context())
+    return paginator.get_paginated_response(serializer.data)
+
+
+class ScheduleViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint for Schedules. Each Schedule has a unique slug field.
     """
-    queryset = Schedule.objects.enabled()
+    queryset = Schedule.objects.enabled().prefetch_related('tasktemplate_set', 'schedulegroup_set')
     serializer_class = ScheduleSerializer
     lookup_field = 'slug'
     permission_classes = [IsAdminOrReadOnly]
+    compact_fields = ('id', 'slug', 'name', 'cleaners_per_date', 'weekday', 'frequency', 'disabled')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ScheduleFilter
 
 
-class ScheduleGroupViewSet(ModelViewSet):
+class ScheduleGroupViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint that returns ScheduleGroups
     """
-    queryset = ScheduleGroup.objects.all()
+    queryset = ScheduleGroup.objects.prefetch_related('schedules')
     serializer_class = ScheduleGroupSerializer
     lookup_field = 'slug'
     permission_classes = [IsAdminOrReadOnly]
+    compact_fields = ('id', 'slug', 'name')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ScheduleGroupFilter
+
+    @action(detail=True, methods=['GET'])
+    def affiliations(self, request, slug):
+        group = get_object_or_404(ScheduleGroup, slug=slug)
+        return paginated_response(self, AffiliationViewSet.queryset.filter(group=group), AffiliationSerializer,
+                                  BeginningCursorPagination)
 
 
-class CleanerViewSet(ModelViewSet):
+class CleanerViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint that returns Cleaners
     """
-    queryset = Cleaner.objects.active()
+    queryset = Cleaner.objects.prefetch_related('affiliation_set')
     serializer_class = CleanerSerializer
     lookup_field = 'slug'
     permission_classes = [IsAdminOrReadOnly]
+    compact_fields = ('id', 'slug', 'name')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CleanerFilter
+
+    def get_queryset(self):
+        # The active Cleaners are determined per request, as the class attribute is built only once
+        return super().get_queryset().active()
+
+    @action(detail=True, methods=['GET'])
+    def assignments(self, request, slug):
+        cleaner = get_object_or_404(Cleaner, slug=slug)
+        return paginated_response(self, Assignment.objects.filter(cleaner=cleaner).select_related(
+            'cleaner', 'schedule').annotate(week=F('cleaning_week__week')), AssignmentSerializer,
+                                  WeekCursorPagination)
 
     @action(detail=True, methods=['GET'])
     def acceptable_dutyswitch(self, request, slug):
         cleaner = get_object_or_404(Cleaner, slug=slug)
-        open_dutyswitch = DutySwitch.objects.open().all()
-        acceptable = [x for x in open_dutyswitch if x.possible_acceptors().filter(cleaner=cleaner).exists()]
+        acceptable = DutySwitch.objects.acceptable_by(cleaner)
         serializer = DutySwitchSerializer(acceptable, many=True, context={'request': request})
         return Response(serializer.data)
 
 
-class AffiliationViewSet(ModelViewSet):
+class AffiliationViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint for Affiliations. Beginning and end are epoch weeks. Use API xyz to convert to date.
     """
-    queryset = Affiliation.objects.all()
+    queryset = Affiliation.objects.select_related('cleaner', 'group')
     serializer_class = AffiliationSerializer
     permission_classes = [IsAdminOrReadOnly]
-
-
-class CleaningWeekViewSet(ModelViewSet):
+    compact_fields = ('id', 'beginning', 'end', 'cleaner_id', 'group_id')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AffiliationFilter
+    pagination_class = BeginningCursorPagination
+
+    @action(detail=False, methods=['POST'])
+    def bulk_import(self, request):
+        """
+        Creates all Affiliations of a list of objects with the keys cleaner, group, beginning and end at once.
+        See AffiliationImport for the format. Nothing is created if a single object is invalid.
+        """
+        affiliation_import = AffiliationImport(request.data)
+        try:
+            created = affiliation_import.run()
+        except ValidationError as e:
+            return Response({'errors': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
+
+
+class CleaningWeekViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint for CleaningWeek. CleaningWeeks are associated with a Schedule and bring Assignments and
     Tasks together.
@@ -74,43 +133,66 @@ class CleaningWeekViewSet(ModelViewSet):
     A Cleaner is added to this field when he had an Assignment in this week but switched it with someone else
     (prevents the Cleaner being switched back).
     """
-    queryset = CleaningWeek.objects.all()
+    queryset = CleaningWeek.objects.select_related('schedule').prefetch_related('excluded', 'assignment_set',
+                                                                                 'task_set')
     serializer_class = CleaningWeekSerializer
     permission_classes = [IsAdminOrReadOnly]
+    compact_fields = ('id', 'week', 'schedule_id', 'assignments_valid', 'disabled')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CleaningWeekFilter
+    pagination_class = WeekCursorPagination
 
 
-class AssignmentViewSet(ModelViewSet):
+class AssignmentViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint that returns Assignments. Assignments link Cleaners with CleaningWeeks.
     CleaningWeeks contain the Tasks which must be done by its Assignments.
     """
-    queryset = Assignment.objects.in_enabled_cleaning_weeks()  # Actually only the ones for a single Cleaner
+    queryset = Assignment.objects.in_enabled_cleaning_weeks().select_related('cleaner', 'schedule').\
+        annotate(week=F('cleaning_week__week'))  # Actually only the ones for a single Cleaner
     serializer_class = AssignmentSerializer
     permission_classes = [IsAdminOrReadOnly]
+    compact_fields = ('id', 'week', 'schedule_id', 'cleaner_id', 'cleaning_week_id')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AssignmentFilter
+    pagination_class = WeekCursorPagination
 
 
-class TaskTemplateViewSet(ModelViewSet):
+class TaskTemplateViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint that returns Assignments
     """
-    queryset = TaskTemplate.objects.all()  # Actually only the ones for a single Schedule
+    queryset = TaskTemplate.objects.select_related('schedule')  # Actually only the ones for a single Schedule
     serializer_class = TaskTemplateSerializer
     permission_classes = [IsAdminOrReadOnly]
+    compact_fields = ('id', 'schedule_id', 'name', 'start_days_before', 'end_days_after')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = TaskTemplateFilter
 
 
-class TaskViewSet(ModelViewSet):
+class TaskViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint that returns Assignments
     """
-    queryset = Task.objects.all()  # Actually only the ones for a single CleaningWeek
+    queryset = Task.objects.select_related('cleaned_by').\
+        annotate(week=F('cleaning_week__week'))  # Actually only the ones for a single CleaningWeek
     serializer_class = TaskSerializer
     permission_classes = [IsAdminOrReadOnly]
+    compact_fields = ('id', 'week', 'cleaning_week_id', 'template_id', 'cleaned_by_id')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = TaskFilter
+    pagination_class = WeekCursorPagination
 
 
-class DutySwitchViewSet(ModelViewSet):
+class DutySwitchViewSet(CompactListMixin, ModelViewSet):
     """
     API endpoint that returns Assignments
     """
-    queryset = DutySwitch.objects.open()  # Actually only the ones which the Cleaner is able to accept
+    # Actually only the ones which the Cleaner is able to accept
+    queryset = DutySwitch.objects.open().annotate(week=F('requester_assignment__cleaning_week__week'))
     serializer_class = DutySwitchSerializer
     permission_classes = [IsAdminOrReadOnly]
+    compact_fields = ('id', 'week', 'requester_assignment_id')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = DutySwitchFilter
+    pagination_class = WeekCursorPagination
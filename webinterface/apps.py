@@ -5,4 +5,5 @@ class WebinterfaceConfig(AppConfig):
     name = 'webinterface'
 
     def ready(self):
-        from webinterface.signals import schedule_group_changed
+        from webinterface.signals import schedule_group_changed, assignment_changed, acceptor_weeks_changed, \
+            excluded_cleaners_changed
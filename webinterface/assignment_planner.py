@@ -0,0 +1,206 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count
+from webinterface.models import *
+from webinterface.signals import batched_assignment_signals
+
+
+class AssignmentPlanner:
+    """
+    The AssignmentPlanner creates the Assignments of a Schedule over a timespan in one go.
+
+    It makes exactly the same decisions as calling Schedule.create_assignment() for every week of the timespan
+    (given the same state of the random module), but loads all Affiliations, CleaningWeeks, exclusions and
+    Assignments it needs up front. The deployment ratios are then kept up to date in memory while Cleaners are
+    picked, and the new Assignments are written with a single bulk_create().
+    """
+    def __init__(self, schedule: Schedule, start_week: int, end_week: int):
+        self.schedule = schedule
+        self.min_week = min(start_week, end_week)
+        self.max_week = max(start_week, end_week)
+
+        if not self.schedule.logger:
+            self.schedule.set_up_logger()
+        self.logger = self.schedule.logger
+
+        self.affiliations = []
+        self.cleaning_weeks = {}
+        self.excluded = {}
+        self.filled = Counter()
+
+        # Assignments of this Schedule as counted by the AssignmentLedger: {week: Counter({cleaner_pk: count})}
+        self.week_counts = {}
+        # Assignments of all Schedules in enabled CleaningWeeks: {week: Counter({cleaner_pk: count})}
+        self.cleaner_week_counts = {}
+        # Cached deployment ratio counts: {(beginning, end): [total, Counter({cleaner_pk: count})]}
+        self.windows = {}
+
+    def run(self) -> list:
+        """
+        :return: List of the Assignments that were created
+        """
+        self.logger.info('--- {}.create_assignments_over_timespan({}, {}) [planner] ---'.format(
+            self.schedule.name, self.min_week, self.max_week))
+
+        if self.schedule.disabled:
+            self.logger.warning("ABORT [Code04]: {} is disabled!".format(self.schedule.name))
+            return []
+
+        # The Assignments deleted here update the AssignmentLedger and DutySwitchCandidates once at the end
+        with transaction.atomic(), batched_assignment_signals() as changes:
+            stale_weeks = self.prepare_cleaning_weeks()
+            self.load_counts()
+            self.delete_stale_cleaning_weeks(stale_weeks)
+
+            planned = []
+            for week in range(self.min_week, self.max_week + 1):
+                if week in stale_weeks:
+                    self.remove_week(week)
+                if week in self.cleaning_weeks:
+                    planned += self.plan_week(week)
+
+            created = Assignment.objects.bulk_create(planned)
+
+            # bulk_create() doesn't send post_save
+            for assignment in created:
+                changes.add(assignment.schedule_id, assignment.cleaning_week_id)
+        return created
+
+    def prepare_cleaning_weeks(self) -> set:
+        """
+        Creates missing CleaningWeeks and Tasks and clears the Assignments of invalid CleaningWeeks.
+
+        :return: Set of weeks in which the Schedule doesn't occur but which still have a CleaningWeek
+        """
+        occurring_weeks = [x for x in range(self.min_week, self.max_week + 1) if self.schedule.occurs_in_week(x)]
+        existing = self.schedule.cleaningweek_set.filter(week__range=(self.min_week, self.max_week))
+
+        stale_weeks = set(existing.exclude(week__in=occurring_weeks).values_list('week', flat=True))
+
+        existing_weeks = set(existing.values_list('week', flat=True))
+        CleaningWeek.objects.bulk_create([CleaningWeek(schedule=self.schedule, week=x, assignments_valid=True)
+                                          for x in occurring_weeks if x not in existing_weeks])
+
+        cleaning_weeks = self.schedule.cleaningweek_set.filter(week__in=occurring_weeks)
+        invalid = cleaning_weeks.assignments_invalid()
+        Assignment.objects.filter(cleaning_week__in=invalid).delete()
+        invalid.update(assignments_valid=True)
+
+        self.cleaning_weeks = {x.week: x for x in cleaning_weeks}
+
+        templates = list(self.schedule.tasktemplate_set.all())
+        existing_tasks = set(Task.objects.filter(cleaning_week__in=cleaning_weeks).
+                             values_list('cleaning_week', 'template'))
+        Task.objects.bulk_create([Task(cleaning_week=cleaning_week, template=template)
+                                  for cleaning_week in self.cleaning_weeks.values() for template in templates
+                                  if (cleaning_week.pk, template.pk) not in existing_tasks])
+
+        for cleaning_week_pk, cleaner_pk in CleaningWeek.excluded.through.objects.filter(
+                cleaningweek__in=cleaning_weeks).values_list('cleaningweek', 'cleaner'):
+            self.excluded.setdefault(cleaning_week_pk, set()).add(cleaner_pk)
+
+        for x in Assignment.objects.filter(cleaning_week__in=cleaning_weeks).order_by().values('cleaning_week'). \
+                annotate(count=Count('pk')):
+            self.filled[x['cleaning_week']] = x['count']
+
+        return stale_weeks
+
+    def load_counts(self):
+        self.affiliations = list(Affiliation.objects.of_schedule(self.schedule).filter(
+            beginning__lte=self.max_week, end__gte=self.min_week).select_related('cleaner'))
+
+        if self.affiliations:
+            first_week = min(x.beginning for x in self.affiliations)
+            last_week = max(x.end for x in self.affiliations)
+            for week, cleaner_pk, count in AssignmentLedger.objects.filter(
+                    schedule=self.schedule, cleaner__isnull=False, week__range=(first_week, last_week)). \
+                    values_list('week', 'cleaner', 'count'):
+                self.week_counts.setdefault(week, Counter())[cleaner_pk] = count
+
+        for x in Assignment.objects.in_enabled_cleaning_weeks().filter(
+                cleaning_week__week__range=(self.min_week, self.max_week)).order_by(). \
+                values('cleaning_week__week', 'cleaner').annotate(count=Count('pk')):
+            self.cleaner_week_counts.setdefault(x['cleaning_week__week'], Counter())[x['cleaner']] = x['count']
+
+    def delete_stale_cleaning_weeks(self, stale_weeks: set):
+        if stale_weeks:
+            self.schedule.cleaningweek_set.filter(week__in=stale_weeks).delete()
+            self.logger.warning("CLEANING_WEEKS DELETED [Code90]: {}".format(sorted(stale_weeks)))
+
+    def window(self, beginning: int, end: int) -> list:
+        if (beginning, end) not in self.windows:
+            total = 0
+            own = Counter()
+            for week, counts in self.week_counts.items():
+                if beginning <= week <= end:
+                    total += sum(counts.values())
+                    own.update(counts)
+            self.windows[(beginning, end)] = [total, own]
+        return self.windows[(beginning, end)]
+
+    def add_assignment(self, week: int, cleaner_pk: int):
+        self.week_counts.setdefault(week, Counter())[cleaner_pk] += 1
+        for (beginning, end), counts in self.windows.items():
+            if beginning <= week <= end:
+                counts[0] += 1
+                counts[1][cleaner_pk] += 1
+
+    def remove_week(self, week: int):
+        counts = self.week_counts.pop(week, Counter())
+        for (beginning, end), window_counts in self.windows.items():
+            if beginning <= week <= end:
+                window_counts[0] -= sum(counts.values())
+                window_counts[1].subtract(counts)
+
+    def deployment_ratios(self, week: int) -> list:
+        """Same as Schedule.deployment_ratios(), but computed on the in-memory counts"""
+        active_affiliations = [x for x in self.affiliations if x.beginning <= week <= x.end]
+        if not active_affiliations:
+            return []
+
+        total, own = self.window(beginning=max(x.beginning for x in active_affiliations),
+                                 end=min(x.end for x in active_affiliations))
+        ratios = [[x.cleaner, own[x.cleaner.pk] / total if total != 0 else 0.0] for x in active_affiliations]
+        return sorted(ratios, key=itemgetter(1), reverse=False)
+
+    def plan_week(self, week: int) -> list:
+        cleaning_week = self.cleaning_weeks[week]
+        excluded = self.excluded.get(cleaning_week.pk, set())
+        nr_assignments = self.cleaner_week_counts.setdefault(week, Counter())
+
+        planned = []
+        while self.filled[cleaning_week.pk] < self.schedule.cleaners_per_date:
+            ratios = self.deployment_ratios(week)
+            if not ratios:
+                self.logger.warning("ABORT [Code03]: No Cleaners affiliated in week {}.".format(week))
+                break
+
+            choice = self.choose_cleaner(ratios, excluded, nr_assignments)
+            self.logger.info(">>>    Week {}: chose {}.".format(week, choice.name))
+
+            planned.append(Assignment(cleaner=choice, cleaning_week=cleaning_week, schedule=self.schedule))
+            self.filled[cleaning_week.pk] += 1
+            if not cleaning_week.disabled:
+                self.add_assignment(week, choice.pk)
+                nr_assignments[choice.pk] += 1
+        return planned
+
+    @staticmethod
+    def choose_cleaner(ratios: list, excluded: set, nr_assignments: Counter) -> Cleaner:
+        """Follows the selection of Schedule.create_assignment(), including its calls to random.choice()"""
+        distinct_ratio_values = list(set(x[1] for x in ratios))
+        distinct_ratio_values.sort()
+        grouped_by_ratios = [[x[0] for x in ratios if x[1] == val] for val in distinct_ratio_values]
+        for same_ratio in grouped_by_ratios:
+            non_excluded = [x for x in same_ratio if x.pk not in excluded]
+            if len(non_excluded) == 0:
+                continue
+
+            assignment_counts = list(set(nr_assignments[x.pk] for x in same_ratio))
+            assignment_counts.sort()
+            for count in assignment_counts:
+                same_assignment_count = [x for x in non_excluded if nr_assignments[x.pk] == count]
+                if same_assignment_count:
+                    return random.choice(same_assignment_count)
+
+        return random.choice(ratios)[0]
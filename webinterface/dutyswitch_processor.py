@@ -0,0 +1,95 @@
+from django.db import transaction
+from webinterface.models import *
+from webinterface.email_sending import create_email__dutyswitch_proposal, queue_emails
+
+
+class DutySwitchProcessor:
+    """
+    The DutySwitchProcessor proposes acceptors for all DutySwitches which have waited long enough for one and
+    executes all proposals which haven't been objected to in time.
+
+    It makes the same decisions as calling DutySwitch.set_new_proposal() and set_proposal_as_acceptor() on each
+    DutySwitch, but loads the DutySwitches and their candidates (see DutySwitchCandidate) up front and never
+    proposes one Assignment to two DutySwitches. Everything is applied in one transaction and the proposal
+    emails are put into the outbox at once.
+    """
+    def __init__(self, days_until_proposal: int = 2, days_until_execution: int = 2):
+        self.today = timezone.now().date()
+        self.days_until_proposal = days_until_proposal
+        self.days_until_execution = days_until_execution
+
+    def run(self) -> tuple:
+        """
+        :return: Tuple of the number of proposed and executed DutySwitches
+        """
+        with transaction.atomic():
+            nr_proposed = self.propose()
+            nr_executed = self.execute()
+        return nr_proposed, nr_executed
+
+    def need_proposal(self) -> list:
+        return list(DutySwitch.objects.open().filter(
+            created__lt=self.today - datetime.timedelta(days=self.days_until_proposal),
+            proposed_acceptor__isnull=True).select_related('requester_assignment__cleaning_week__schedule',
+                                                           'requester_assignment__schedule',
+                                                           'requester_assignment__cleaner'))
+
+    def candidates(self, dutyswitches: list) -> dict:
+        """
+        :return: The Assignments each DutySwitch can be accepted with right now: {dutyswitch_pk: [Assignment]}
+        """
+        dont_propose = set(DutySwitch.dont_propose.through.objects.filter(dutyswitch__in=dutyswitches).
+                           values_list('dutyswitch', 'assignment'))
+        candidates = {}
+        for candidate in DutySwitchCandidate.objects.filter(
+                dutyswitch__in=dutyswitches, assignment__in=Assignment.objects.not_passed(self.today),
+                dutyswitch__requester_assignment__in=Assignment.objects.not_passed(self.today)).\
+                select_related('assignment__cleaner__user', 'assignment__cleaning_week__schedule').\
+                order_by('dutyswitch', 'assignment'):
+            if (candidate.dutyswitch_id, candidate.assignment_id) not in dont_propose:
+                candidates.setdefault(candidate.dutyswitch_id, []).append(candidate.assignment)
+        return candidates
+
+    def propose(self) -> int:
+        dutyswitches = self.need_proposal()
+        candidates = self.candidates(dutyswitches)
+        taken = set(DutySwitch.objects.open().proposed_acceptors().values_list('proposed_acceptor', flat=True))
+
+        proposed = []
+        for dutyswitch in dutyswitches:
+            choices = [x for x in candidates.get(dutyswitch.pk, []) if x.pk not in taken]
+            if choices:
+                dutyswitch.proposed_acceptor = random.choice(choices)
+                dutyswitch.execute_proposal = self.today + datetime.timedelta(days=DutySwitch.PROPOSAL_OBJECTION_DAYS)
+                taken.add(dutyswitch.proposed_acceptor.pk)
+                proposed.append(dutyswitch)
+
+        DutySwitch.objects.bulk_update(proposed, ['proposed_acceptor', 'execute_proposal'])
+
+        if proposed:
+            reply_to = User.objects.filter(is_superuser=True).first().email
+            queue_emails([create_email__dutyswitch_proposal(x, reply_to=reply_to) for x in proposed])
+        return len(proposed)
+
+    def execute(self) -> int:
+        """
+        Executes the proposals one by one, as each DutySwitch.save() swaps the Cleaners of two Assignments and can
+        resolve further DutySwitches. A proposal whose Assignment has already been swapped in this run is dropped,
+        so that the DutySwitch gets a new proposal on the next run.
+        """
+        execute_proposal = DutySwitch.objects.filter(
+            execute_proposal__lt=self.today - datetime.timedelta(days=self.days_until_execution),
+            proposed_acceptor__isnull=False).select_related('requester_assignment__cleaning_week',
+                                                            'proposed_acceptor__cleaning_week')
+        swapped = set()
+        executed = 0
+        for dutyswitch in execute_proposal:
+            if not DutySwitch.objects.filter(pk=dutyswitch.pk).exists():
+                continue  # Resolved by a DutySwitch executed before
+            if {dutyswitch.requester_assignment_id, dutyswitch.proposed_acceptor_id} & swapped:
+                DutySwitch.objects.filter(pk=dutyswitch.pk).update(proposed_acceptor=None, execute_proposal=None)
+                continue
+            swapped |= {dutyswitch.requester_assignment_id, dutyswitch.proposed_acceptor_id}
+            dutyswitch.set_proposal_as_acceptor()
+            executed += 1
+        return executed
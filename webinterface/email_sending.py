@@ -3,10 +3,13 @@ from markdown import markdown
 from django.core import mail
 from django.template.loader import get_template
 from cleansys.settings import EMAIL_FROM_ADDRESS, HOST
+from concurrent.futures import ThreadPoolExecutor
+import logging
 
 
-def create_email_message(subject, rendered_markdown, to):
-    admin = User.objects.filter(is_superuser=True).first()
+def create_email_message(subject, rendered_markdown, to, reply_to=None):
+    if reply_to is None:
+        reply_to = User.objects.filter(is_superuser=True).first().email
     html = markdown(rendered_markdown, extensions=['tables'])
     msg = mail.EmailMultiAlternatives(
         subject=subject,
@@ -14,7 +17,7 @@ def create_email_message(subject, rendered_markdown, to):
         from_email=EMAIL_FROM_ADDRESS,
         to=[to],
         bcc=[EMAIL_FROM_ADDRESS],
-        reply_to=[admin.email])
+        reply_to=[reply_to])
     msg.attach_alternative(html, "text/html")
     return msg
 
@@ -31,8 +34,7 @@ def send_welcome_email(cleaner):
         subject="Willkommen im Putzplan-System CleanSys!",
         rendered_markdown=template.render(context),
         to=cleaner.user.email))
-    connection = mail.get_connection()
-    connection.send_messages(outbox)
+    queue_emails(outbox)
 
 
 def send_email_changed(cleaner, previous_address):
@@ -48,12 +50,10 @@ def send_email_changed(cleaner, previous_address):
         subject="Deine Email-Addresse wurde geändert",
         rendered_markdown=template.render(context),
         to=previous_address))
-    connection = mail.get_connection()
-    connection.send_messages(outbox)
+    queue_emails(outbox)
 
 
-def send_email__dutyswitch_proposal(dutyswitch):
-    outbox = []
+def create_email__dutyswitch_proposal(dutyswitch, reply_to=None):
     cleaner = dutyswitch.proposed_acceptor.cleaner
 
     template = get_template('email_templates/email_new_dutyswitch_proposal.md')
@@ -63,12 +63,15 @@ def send_email__dutyswitch_proposal(dutyswitch):
         'dutyswitch': dutyswitch,
         'requester': dutyswitch.requester_assignment,
     }
-    outbox.append(create_email_message(
+    return create_email_message(
         subject="Dein Putzdienst wurde zum Tausch vorgeschlagen",
         rendered_markdown=template.render(context),
-        to=cleaner.user.email))
-    connection = mail.get_connection()
-    connection.send_messages(outbox)
+        to=cleaner.user.email,
+        reply_to=reply_to)
+
+
+def send_email__dutyswitch_proposal(dutyswitch):
+    queue_emails([create_email__dutyswitch_proposal(dutyswitch)])
 
 
 def send_email__dutyswitch_complete(dutyswitch):
@@ -104,34 +107,155 @@ def send_email__dutyswitch_complete(dutyswitch):
             rendered_markdown=template.render(context),
             to=acceptor_cleaner.user.email))
 
+    queue_emails(outbox)
+
+
+def queue_emails(outbox) -> int:
+    """
+    Puts the messages into the outbox, from which they are delivered by the send_queued_emails command.
+    No connection to the mail server is made here.
+
+    :return: Number of queued messages
+    """
+    from webinterface.models import QueuedEmail
+    if not outbox:
+        return 0
+    return len(QueuedEmail.objects.enqueue(outbox))
+
+
+def send_messages_in_batches(outbox, batch_size=50, on_batch_sent=None):
+    """
+    Sends the messages over a single connection, batch_size messages at a time. A batch which fails to send
+    is counted as failed, the remaining batches are still sent.
+
+    :param on_batch_sent: Called with (batch, nr_sent, error) after each batch, error is None if no exception
+    was raised
+    :return: Tuple of the number of sent and failed messages
+    """
+    sent, failed = 0, 0
+    if not outbox:
+        return sent, failed
+
+    batches = [outbox[i:i+batch_size] for i in range(0, len(outbox), batch_size)]
     connection = mail.get_connection()
-    connection.send_messages(outbox)
+    try:
+        connection.open()
+    except Exception as e:
+        logging.exception("Opening the connection to the mail server failed")
+        for batch in batches:
+            if on_batch_sent is not None:
+                on_batch_sent(batch, 0, "{}: {}".format(type(e).__name__, e))
+        return sent, len(outbox)
+
+    try:
+        for batch in batches:
+            error = None
+            try:
+                nr_sent = connection.send_messages(batch) or 0
+            except Exception as e:
+                logging.exception("Sending a batch of {} emails failed".format(len(batch)))
+                nr_sent, error = 0, "{}: {}".format(type(e).__name__, e)
+            sent += nr_sent
+            failed += len(batch) - nr_sent
+            if on_batch_sent is not None:
+                on_batch_sent(batch, nr_sent, error)
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def deliver_batch(queued_emails) -> list:
+    """
+    Sends the QueuedEmails over a single connection using send_messages_in_batches(). Each message is its own
+    batch, so a message which fails to send doesn't stop the remaining messages from being sent.
+    Doesn't touch the database, so it can run outside of the main thread.
+
+    :return: List of (QueuedEmail, error) tuples, where error is None if the message was sent
+    """
+    results = []
+
+    def record_result(batch, nr_sent, error):
+        if error is None and not nr_sent:
+            error = "The mail server didn't accept the message"
+        results.append((queued_emails[len(results)], error))
+
+    send_messages_in_batches([x.as_message() for x in queued_emails], batch_size=1, on_batch_sent=record_result)
+    return results
+
+
+def deliver_queued_emails(batch_size=50, nr_workers=4):
+    """
+    Delivers the due QueuedEmails. The batches are sent concurrently by nr_workers threads, each over its own
+    connection. Failed deliveries are retried later with an exponential backoff.
+
+    :return: Tuple of the number of sent and failed emails
+    """
+    from webinterface.models import QueuedEmail
+    sent, failed = 0, 0
+    while True:
+        claimed = QueuedEmail.objects.claim(limit=batch_size * nr_workers)
+        if not claimed:
+            return sent, failed
+
+        batches = [claimed[i:i+batch_size] for i in range(0, len(claimed), batch_size)]
+        with ThreadPoolExecutor(max_workers=nr_workers) as executor:
+            results = [x for batch_results in executor.map(deliver_batch, batches) for x in batch_results]
+
+        now = timezone.now()
+        delivered = [queued_email.pk for queued_email, error in results if error is None]
+        QueuedEmail.objects.filter(pk__in=delivered).update(sent=now, last_error='')
+        sent += len(delivered)
+
+        for queued_email, error in results:
+            if error is not None:
+                logging.error("Sending '{}' failed: {}".format(queued_email, error))
+                queued_email.attempts += 1
+                queued_email.next_attempt = now + queued_email.retry_delay()
+                queued_email.last_error = error
+                queued_email.save(update_fields=['attempts', 'next_attempt', 'last_error'])
+                failed += 1
 
 
 def send_email__assignment_coming_up(notify_days_before=5):
-    from webinterface.models import Cleaner, current_epoch_week
-    outbox = []
-    for cleaner in Cleaner.objects.has_email().filter(email_pref_assignment_coming_up=True):
-        assignments = cleaner.assignment_set.in_enabled_cleaning_weeks().\
-            filter(cleaning_week__week__range=(current_epoch_week(), current_epoch_week()+1))
+    """
+    Notifies Cleaners of their Assignments which are notify_days_before days away
 
-        notify = [x for x in assignments.all()
-                  if x.assignment_date()-timezone.timedelta(days=notify_days_before) == timezone.now().date()]
+    :return: Number of queued emails
+    """
+    from webinterface.models import Assignment, Task, date_to_epoch_week
+    from django.db.models import Prefetch
 
-        for assignment in notify:
-            template = get_template('email_templates/email_assignment_coming_up.md')
-            context = {  # for base_template, context MUST contain cleaner and host
-                'cleaner': cleaner,
-                'host': HOST,
-                'assignment': assignment,
-            }
-            outbox.append(create_email_message(
-                subject="Dein Putzdienst in {} am {}".format(
-                    assignment.schedule, assignment.assignment_date().strftime("%a, %d.%b.%Y")),
-                rendered_markdown=template.render(context),
-                to=cleaner.user.email))
-    connection = mail.get_connection()
-    connection.send_messages(outbox)
+    assignment_date = timezone.now().date() + timezone.timedelta(days=notify_days_before)
+    assignments = Assignment.objects.filter(
+        cleaning_week__week=date_to_epoch_week(assignment_date), cleaning_week__disabled=False,
+        schedule__weekday=assignment_date.weekday(), cleaner__email_pref_assignment_coming_up=True).\
+        exclude(cleaner__user__email__isnull=True).\
+        select_related('cleaner__user', 'schedule', 'cleaning_week__schedule').\
+        prefetch_related(
+            Prefetch('cleaning_week__assignment_set', queryset=Assignment.objects.select_related('cleaner')),
+            Prefetch('cleaning_week__task_set', queryset=Task.objects.select_related('template')))
+
+    template = get_template('email_templates/email_assignment_coming_up.md')
+    admin = User.objects.filter(is_superuser=True).first()
+
+    outbox = []
+    for assignment in assignments:
+        cleaner = assignment.cleaner
+        other_cleaners = sorted([x.cleaner for x in assignment.cleaning_week.assignment_set.all()
+                                 if x.cleaner_id != cleaner.pk], key=lambda x: x.name)
+        context = {  # for base_template, context MUST contain cleaner and host
+            'cleaner': cleaner,
+            'host': HOST,
+            'assignment': assignment,
+            'other_cleaners': other_cleaners,
+        }
+        outbox.append(create_email_message(
+            subject="Dein Putzdienst in {} am {}".format(
+                assignment.schedule, assignment.assignment_date().strftime("%a, %d.%b.%Y")),
+            rendered_markdown=template.render(context),
+            to=cleaner.user.email,
+            reply_to=admin.email))
+    return queue_emails(outbox)
 
 
 def send_email__warn_admin_assignments_running_out():
@@ -144,8 +268,7 @@ def send_email__warn_admin_assignments_running_out():
         outbox.append(create_email_message(subject="CleanSys erfordert dein Eingreifen!",
                                            rendered_markdown=template.render(),
                                            to=admin.email))
-        connection = mail.get_connection()
-        connection.send_messages(outbox)
+        queue_emails(outbox)
 
 
 def send_email__warn_admin_cleaner_soon_homeless():
@@ -159,8 +282,7 @@ def send_email__warn_admin_cleaner_soon_homeless():
         outbox.append(create_email_message(subject="CleanSys erfordert vielleicht dein Eingreifen!",
                                            rendered_markdown=template.render(),
                                            to=admin.email))
-        connection = mail.get_connection()
-        connection.send_messages(outbox)
+        queue_emails(outbox)
 
 
 def send_email__warn_admin_tasks_forgotten():
@@ -191,7 +313,6 @@ def send_email__warn_admin_tasks_forgotten():
             outbox.append(create_email_message(subject="Bei einem Putzdienst wurden Aufgaben vergessen",
                                                rendered_markdown=template.render(context),
                                                to=admin.email))
-            connection = mail.get_connection()
-            connection.send_messages(outbox)
+            queue_emails(outbox)
 
 
@@ -0,0 +1,99 @@
+"""
+Conversions between dates and epoch weeks.
+
+Epoch week 0 is the week from Monday, 29. Dec 1969 to Sunday, 4. Jan 1970, which contains the Unix epoch.
+All conversions are integer arithmetic on proleptic Gregorian ordinals (see datetime.date.toordinal()), so they
+don't depend on the time zone of the server.
+"""
+import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+# Ordinal of the Monday of epoch week 0
+WEEK_ZERO_ORDINAL = EPOCH_ORDINAL - 3
+
+_frozen_epoch_week = ContextVar('frozen_epoch_week', default=None)
+
+
+def date_to_epoch_week(date: datetime.date) -> int:
+    return (date.toordinal() - WEEK_ZERO_ORDINAL) // 7
+
+
+def date_to_epoch_day(date: datetime.date) -> int:
+    """Days since 1. Jan 1970. The Monday of an epoch week is the day 7*week-3."""
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+@lru_cache(maxsize=8192)
+def epoch_week_to_date(week: int, weekday: int) -> datetime.date:
+    """
+    :param weekday: 0 for Monday to 6 for Sunday, as in Schedule.weekday
+    """
+    return datetime.date.fromordinal(WEEK_ZERO_ORDINAL + 7 * week + weekday)
+
+
+def epoch_week_to_monday(week: int) -> datetime.date:
+    return epoch_week_to_date(week, 0)
+
+
+def epoch_week_to_sunday(week: int) -> datetime.date:
+    return epoch_week_to_date(week, 6)
+
+
+def epoch_weeks_to_dates(weeks, weekday: int = 0) -> list:
+    """
+    :param weeks: Iterable of epoch weeks, such as a range
+    :return: List of the dates of the given weekday in the weeks
+    """
+    return [epoch_week_to_date(week, weekday) for week in weeks]
+
+
+def epoch_week_range_to_dates(first_week: int, last_week: int, weekday: int = 0) -> list:
+    """
+    :return: List of the dates of the given weekday from first_week up to and including last_week
+    """
+    first_ordinal = WEEK_ZERO_ORDINAL + 7 * first_week + weekday
+    last_ordinal = WEEK_ZERO_ORDINAL + 7 * last_week + weekday
+    return [datetime.date.fromordinal(x) for x in range(first_ordinal, last_ordinal + 1, 7)]
+
+
+def epoch_week_range_to_days(first_week: int, last_week: int) -> list:
+    """
+    :return: List of all dates from the Monday of first_week up to and including the Sunday of last_week
+    """
+    first_ordinal = WEEK_ZERO_ORDINAL + 7 * first_week
+    last_ordinal = WEEK_ZERO_ORDINAL + 7 * last_week + 6
+    return [datetime.date.fromordinal(x) for x in range(first_ordinal, last_ordinal + 1)]
+
+
+def current_epoch_week() -> int:
+    """
+    The epoch week of today. Within a request (see CurrentEpochWeekMiddleware) or a frozen_epoch_week() block,
+    this is the week in which it started, so that it doesn't change at midnight from Sunday to Monday.
+    """
+    week = _frozen_epoch_week.get()
+    if week is None:
+        return date_to_epoch_week(datetime.date.today())
+    return week
+
+
+@contextmanager
+def frozen_epoch_week(week: int = None):
+    """Fixes current_epoch_week() to week (or the current week, if week is None) inside the block"""
+    token = _frozen_epoch_week.set(current_epoch_week() if week is None else week)
+    try:
+        yield _frozen_epoch_week.get()
+    finally:
+        _frozen_epoch_week.reset(token)
+
+
+class CurrentEpochWeekMiddleware:
+    """Fixes current_epoch_week() for the duration of each request"""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with frozen_epoch_week():
+            return self.get_response(request)
@@ -438,7 +438,7 @@ class AssignmentCreateView(FormView):
         to_week = date_to_epoch_week(form.cleaned_data['to_date'])
         schedules = form.cleaned_data['schedules']
         for schedule in schedules:
-            schedule.create_assignments_over_timespan(start_week=from_week, end_week=to_week)
+            schedule.create_assignments_over_timespan(start_week=from_week, end_week=to_week, in_memory=True)
         return HttpResponseRedirect(self.success_url)
 
 
@@ -235,10 +235,8 @@ class AssignmentForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         if 'instance' in kwargs and kwargs['instance']:
             assignment = kwargs['instance']
-            active_affiliations = Affiliation.objects.active_in_week_for_schedule(
-                week=assignment.cleaning_week.week, schedule=assignment.schedule)
-            active_cleaners = [x.cleaner.pk for x in active_affiliations.all()]
-            self.fields['cleaner'].queryset = Cleaner.objects.filter(pk__in=active_cleaners)
+            self.fields['cleaner'].queryset = Cleaner.objects.active(
+                schedule=assignment.schedule, week=assignment.cleaning_week.week)
 
 
 class TaskTemplateForm(forms.ModelForm):
@@ -0,0 +1,88 @@
+from django.db.models import Count, Exists, IntegerField, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+from webinterface.models import *
+from cleansys.settings import WARN_WEEKS_IN_ADVANCE__ASSIGNMENTS_RUNNING_OUT, \
+    WARN_WEEKS_IN_ADVANCE__CLEANER_SOON_HOMELESS
+
+
+def count_subquery(queryset: QuerySet, outer_field: str):
+    return Coalesce(Subquery(queryset.order_by().values(outer_field).annotate(count=Count('pk')).values('count'),
+                             output_field=IntegerField()), Value(0))
+
+
+class HealthSnapshot:
+    """
+    The HealthSnapshot finds out which Schedules and Cleaners need the attention of the admin.
+
+    All Schedules are loaded in one annotated query and all Cleaners in one query with their Affiliations
+    prefetched. Every Schedule and Cleaner gets a `health` dict, which is what the panels of the admin dashboard
+    display (see webinterface_snippets/schedule_panel.html and cleaner_panel.html).
+    """
+    def __init__(self, week: int = None):
+        self.week = week if week is not None else current_epoch_week()
+
+        self.schedules = list(self.annotated_schedules())
+        for schedule in self.schedules:
+            schedule.health = self.schedule_health(schedule)
+
+        self.cleaners = list(Cleaner.objects.prefetch_related(
+            Prefetch('affiliation_set', queryset=Affiliation.objects.select_related('group'))))
+        for cleaner in self.cleaners:
+            cleaner.health = self.cleaner_health(cleaner)
+
+        self.action_needed_schedules = [x for x in self.schedules if not x.disabled and x.health['action_needed']]
+        self.active_schedules = [x for x in self.schedules if not x.disabled and not x.health['action_needed']]
+        self.disabled_schedules = [x for x in self.schedules if x.disabled]
+
+        self.action_needed_cleaners = [x for x in self.cleaners if x.health['action_needed']]
+        self.active_cleaners = [x for x in self.cleaners
+                                if not x.health['action_needed'] and x.health['current_affiliation']]
+        self.inactive_cleaners = [x for x in self.cleaners
+                                  if not x.health['action_needed'] and not x.health['current_affiliation']]
+
+    def annotated_schedules(self) -> QuerySet:
+        return Schedule.objects.annotate(
+            nr_task_templates=count_subquery(TaskTemplate.objects.filter(schedule=OuterRef('pk')), 'schedule'),
+            has_assignments=Exists(Assignment.objects.filter(schedule=OuterRef('pk'))),
+            has_schedule_groups=Exists(ScheduleGroup.schedules.through.objects.filter(schedule=OuterRef('pk'))),
+            has_invalid_cleaning_weeks=Exists(CleaningWeek.objects.filter(schedule=OuterRef('pk'),
+                                                                          assignments_valid=False)),
+            last_assignment_week=Subquery(Assignment.objects.filter(schedule=OuterRef('pk')).
+                                          order_by('-cleaning_week__week').values('cleaning_week__week')[:1]),
+            nr_active_affiliations=count_subquery(
+                ScheduleMembership.objects.active_in_week(self.week).filter(schedule=OuterRef('pk')), 'schedule')
+        )
+
+    def schedule_health(self, schedule: Schedule) -> dict:
+        running_out = schedule.last_assignment_week is not None and \
+            schedule.last_assignment_week - self.week <= WARN_WEEKS_IN_ADVANCE__ASSIGNMENTS_RUNNING_OUT
+        health = {
+            'templates_exist': schedule.nr_task_templates != 0,
+            'assignments_exist': schedule.has_assignments,
+            'groups_exist': schedule.has_schedule_groups,
+            'some_assignments_invalid': schedule.has_invalid_cleaning_weeks,
+            'assignments_running_out': running_out,
+            'last_assignment_date': None,
+            'nr_task_templates': schedule.nr_task_templates,
+            'nr_active_affiliations': schedule.nr_active_affiliations,
+        }
+        if schedule.last_assignment_week is not None:
+            health['last_assignment_date'] = epoch_week_to_date(schedule.last_assignment_week, schedule.weekday)
+        health['action_needed'] = not health['templates_exist'] or not health['assignments_exist'] \
+            or not health['groups_exist'] or health['some_assignments_invalid'] or running_out
+        return health
+
+    def cleaner_health(self, cleaner: Cleaner) -> dict:
+        affiliations = list(cleaner.affiliation_set.all())
+        current_affiliation = next((x for x in affiliations if x.beginning <= self.week <= x.end), None)
+
+        homeless_soon = current_affiliation is not None \
+            and not any(x.beginning == current_affiliation.end + 1 for x in affiliations) \
+            and current_affiliation.end <= self.week + WARN_WEEKS_IN_ADVANCE__CLEANER_SOON_HOMELESS
+
+        return {
+            'current_affiliation': current_affiliation,
+            'last_affiliation': affiliations[-1] if affiliations else None,
+            'homeless_soon': homeless_soon,
+            'action_needed': not affiliations or homeless_soon,
+        }
@@ -0,0 +1,137 @@
+"""
+The iCalendar feed of a Cleaner's upcoming Assignments (RFC 5545).
+
+Calendar apps can't log in, so the feed's URL contains a signed token of the Cleaner instead. The feed carries an
+ETag, which is computed with one aggregate query, so that polling clients get a 304 response without the feed
+being generated. There is no Last-Modified header: the newest modification time doesn't change when an
+Assignment or Task is deleted, so If-Modified-Since would keep serving a stale feed.
+"""
+import hashlib
+from django.core import signing
+from django.db.models import Count, Max, Prefetch
+from webinterface.models import *
+
+SIGNING_SALT = 'webinterface.ics_feed'
+
+
+def feed_token(cleaner: Cleaner) -> str:
+    return signing.Signer(salt=SIGNING_SALT).sign(str(cleaner.pk))
+
+
+def cleaner_from_token(token: str):
+    """
+    :return: The Cleaner of the token, or None if the token is invalid
+    """
+    try:
+        pk = signing.Signer(salt=SIGNING_SALT).unsign(token)
+    except signing.BadSignature:
+        return None
+    return Cleaner.objects.filter(pk=pk).first()
+
+
+def feed_first_week() -> int:
+    return current_epoch_week() - 1
+
+
+def feed_state(cleaner: Cleaner, first_week: int) -> str:
+    """
+    Everything the feed depends on which can change: the first week, the Assignments in it, their Schedules,
+    Tasks and TaskTemplates. Deleted Assignments and Tasks are noticed through the counts.
+
+    :param first_week: As returned by feed_first_week()
+    :return: The ETag of the feed
+    """
+    state = cleaner.assignment_set.in_week_or_later(week=first_week).order_by().aggregate(
+        nr_assignments=Count('pk', distinct=True), assignments_modified=Max('modified'),
+        schedules_modified=Max('cleaning_week__schedule__modified'),
+        nr_tasks=Count('cleaning_week__task', distinct=True), tasks_modified=Max('cleaning_week__task__modified'),
+        templates_modified=Max('cleaning_week__task__template__modified'))
+    modified = [state[x].isoformat() if state[x] else '' for x in
+                ['assignments_modified', 'schedules_modified', 'tasks_modified', 'templates_modified']]
+    return hashlib.md5("{}:{}:{}:{}:{}:{}".format(
+        cleaner.pk, cleaner.name, first_week, state['nr_assignments'], state['nr_tasks'],
+        ":".join(modified)).encode()).hexdigest()
+
+
+def ics_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_line(line: str) -> str:
+    """Folds the content line after 75 octets, as RFC 5545 demands, and terminates it with CRLF"""
+    encoded = line.encode('utf-8')
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Don't cut a multi-byte character apart
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def ics_date(date: datetime.date) -> str:
+    return date.strftime("%Y%m%d")
+
+
+def assignment_events(assignment: Assignment, dtstamp: str) -> list:
+    """
+    :return: The content lines of the Assignment's duty and of the days on which its open Tasks can be done
+    """
+    date = assignment.assignment_date()
+    schedule = assignment.cleaning_week.schedule
+    tasks = [x for x in assignment.cleaning_week.task_set.all() if x.cleaned_by_id is None]
+    description = "\n".join("{}: {} bis {}".format(
+        x.template.name, (date - datetime.timedelta(days=x.template.start_days_before)).strftime("%d.%m."),
+        (date + datetime.timedelta(days=x.template.end_days_after)).strftime("%d.%m.")) for x in tasks)
+
+    lines = ["BEGIN:VEVENT",
+             "UID:assignment-{}@cleansys".format(assignment.pk),
+             "DTSTAMP:{}".format(dtstamp),
+             "DTSTART;VALUE=DATE:{}".format(ics_date(date)),
+             "DTEND;VALUE=DATE:{}".format(ics_date(date + datetime.timedelta(days=1))),
+             "SUMMARY:{}".format(ics_escape("Putzdienst: {}".format(schedule.name)))]
+    if description:
+        lines.append("DESCRIPTION:{}".format(ics_escape(description)))
+    lines.append("END:VEVENT")
+
+    if tasks:
+        start = date - datetime.timedelta(days=max(x.template.start_days_before for x in tasks))
+        end = date + datetime.timedelta(days=max(x.template.end_days_after for x in tasks))
+        lines += ["BEGIN:VEVENT",
+                  "UID:tasks-{}@cleansys".format(assignment.pk),
+                  "DTSTAMP:{}".format(dtstamp),
+                  "DTSTART;VALUE=DATE:{}".format(ics_date(start)),
+                  "DTEND;VALUE=DATE:{}".format(ics_date(end + datetime.timedelta(days=1))),
+                  "SUMMARY:{}".format(ics_escape("Aufgaben bereit: {}".format(schedule.name))),
+                  "DESCRIPTION:{}".format(ics_escape(description)),
+                  "TRANSP:TRANSPARENT",
+                  "END:VEVENT"]
+    return lines
+
+
+def feed_assignments(cleaner: Cleaner, first_week: int) -> QuerySet:
+    return cleaner.assignment_set.in_week_or_later(week=first_week).\
+        select_related('cleaning_week__schedule').\
+        prefetch_related(Prefetch('cleaning_week__task_set', queryset=Task.objects.select_related('template')))
+
+
+def ics_feed(cleaner: Cleaner, first_week: int):
+    """
+    Generates the feed line by line, for a StreamingHttpResponse. The generator runs after the view has returned,
+    so first_week must be determined beforehand.
+
+    :param first_week: As returned by feed_first_week()
+    """
+    dtstamp = timezone.now().astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield ics_line("BEGIN:VCALENDAR")
+    yield ics_line("VERSION:2.0")
+    yield ics_line("PRODID:-//CleanSys//Putzplan//DE")
+    yield ics_line("CALSCALE:GREGORIAN")
+    yield ics_line("X-WR-CALNAME:{}".format(ics_escape("Putzdienste von {}".format(cleaner.name))))
+    for assignment in feed_assignments(cleaner, first_week):
+        for line in assignment_events(assignment, dtstamp):
+            yield ics_line(line)
+    yield ics_line("END:VCALENDAR")
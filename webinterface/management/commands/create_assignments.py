@@ -12,7 +12,8 @@ class Command(BaseCommand):
            'This command only creates Assignments where there are ones missing or in ' \
            'CleaningWeeks where the assignments_valid field is False. ' \
            'Existing, valid Assignments are left alone, so there is no problem in running this command over the same' \
-           'timespan multiple times.'
+           'timespan multiple times. ' \
+           'The Assignments of each Schedule are planned in memory by the AssignmentPlanner and written in bulk.'
 
     def add_arguments(self, parser):
         parser.add_argument('-weeks-ahead', nargs='*', type=int,
@@ -26,4 +27,5 @@ class Command(BaseCommand):
             weeks_ahead = WARN_WEEKS_IN_ADVANCE__ASSIGNMENTS_RUNNING_OUT + 4
 
         for schedule in Schedule.objects.enabled():
-            schedule.create_assignments_over_timespan(current_epoch_week(), current_epoch_week() + weeks_ahead)
+            schedule.create_assignments_over_timespan(current_epoch_week(), current_epoch_week() + weeks_ahead,
+                                                      in_memory=True)
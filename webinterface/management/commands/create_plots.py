@@ -1,12 +1,16 @@
 from django.core.management.base import BaseCommand
-from webinterface.views import create_cleaner_analytics, create_schedule_analytics
+from webinterface.plot_cache import rebuild_stale_plots
 
 
 class Command(BaseCommand):
     help = 'Creates plots for CleanerAnalyticsView and ScheduleAnalyticsView. This function is best run ' \
            'as a Cron job once a week. Creating the plots and saving them under media/ saves processing ' \
-           'time, as collecting all the data from the database is very expensive. '
+           'time, as collecting all the data from the database is very expensive. ' \
+           'Only plots whose data changed since they were created are rebuilt, unless --all is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild all plots, even if they are up to date')
 
     def handle(self, *args, **options):
-        create_cleaner_analytics(recreate=True)
-        create_schedule_analytics(recreate=True)
+        rebuilt = rebuild_stale_plots(force=options['all'])
+        self.stdout.write("{} plots were created.".format(rebuilt))
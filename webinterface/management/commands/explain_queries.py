@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from webinterface.query_plans import explain_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Prints the query plans of the queries CleanSys runs most often and lists the tables which are ' \
+           'read in full instead of through an index. Run it on a copy of the production database after changing ' \
+           'a query or an index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', action='store_true',
+                            help="Print the full query plan of every query, not only the tables which are scanned.")
+        parser.add_argument('--analyze', action='store_true',
+                            help="Run ANALYZE first, so that the query planner has up-to-date table statistics.")
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help="Exit with an error if a query scans a table which isn't known to be small.")
+
+    def handle(self, *args, **options):
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        scanning = []
+        for name, plan, scans in explain_catalogue():
+            if scans:
+                scanning.append(name)
+                self.stdout.write(self.style.WARNING("{}: scans {}".format(name, ", ".join(scans))))
+            else:
+                self.stdout.write("{}: OK".format(name))
+            if options['plans']:
+                self.stdout.write(plan + "\n")
+
+        if scanning and options['fail_on_scan']:
+            raise CommandError("{} queries scan large tables: {}".format(len(scanning), ", ".join(scanning)))
@@ -0,0 +1,42 @@
+import os
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from webinterface.affiliation_import import AffiliationImport
+
+
+class Command(BaseCommand):
+    help = 'Imports Affiliations from a CSV or JSON file. The CSV file needs the columns cleaner, group, beginning ' \
+           'and end, the JSON file a list of objects with these keys. Cleaners and ScheduleGroups are given by ' \
+           'name, beginning and end as epoch weeks or dates (YYYY-MM-DD). Nothing is imported if a single ' \
+           'row is invalid.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', type=str, help="Path of the CSV or JSON file")
+        parser.add_argument('--format', choices=['csv', 'json'], default=None,
+                            help="Format of the file. By default, it is taken from the file extension.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only check the file, without importing anything.")
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(options['file'])[1].lstrip('.').lower()
+        if file_format not in ['csv', 'json']:
+            raise CommandError("Can't tell the format of {}, please pass --format.".format(options['file']))
+
+        with open(options['file'], newline='', encoding='utf-8') as file:
+            try:
+                affiliation_import = AffiliationImport.from_csv(file) if file_format == 'csv' \
+                    else AffiliationImport.from_json(file)
+            except ValueError as e:
+                raise CommandError("{} can't be read: {}".format(options['file'], e))
+
+        if options['dry_run']:
+            if not affiliation_import.validate():
+                raise CommandError("\n".join(affiliation_import.errors))
+            self.stdout.write("{} Affiliations can be imported.".format(len(affiliation_import.affiliations)))
+            return
+
+        try:
+            created = affiliation_import.run()
+        except ValidationError as e:
+            raise CommandError("\n".join(e.messages))
+        self.stdout.write("{} Affiliations were imported.".format(created))
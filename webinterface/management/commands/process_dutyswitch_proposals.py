@@ -1,6 +1,5 @@
 from django.core.management.base import BaseCommand
-from webinterface.models import *
-from cleansys.settings import WARN_WEEKS_IN_ADVANCE__ASSIGNMENTS_RUNNING_OUT
+from webinterface.dutyswitch_processor import DutySwitchProcessor
 
 
 class Command(BaseCommand):
@@ -28,15 +27,6 @@ class Command(BaseCommand):
         else:
             days_until_execution = 2
 
-        need_proposal = DutySwitch.objects.\
-            filter(created__lt=timezone.now().date() - timezone.timedelta(days=days_until_proposal)).\
-            filter(proposed_acceptor__isnull=True)
-
-        [x.set_new_proposal() for x in need_proposal]
-
-        execute_proposal = DutySwitch.objects.\
-            filter(execute_proposal__lt=timezone.now().date() - timezone.timedelta(days=days_until_execution)).\
-            exclude(proposed_acceptor__isnull=True)
-
-        [x.set_proposal_as_acceptor() for x in execute_proposal]
-
+        nr_proposed, nr_executed = DutySwitchProcessor(days_until_proposal=days_until_proposal,
+                                                       days_until_execution=days_until_execution).run()
+        self.stdout.write("DutySwitches: {} proposed, {} executed".format(nr_proposed, nr_executed))
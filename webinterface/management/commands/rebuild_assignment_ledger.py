@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from webinterface.models import AssignmentLedger
+
+
+class Command(BaseCommand):
+    help = 'Recreates the AssignmentLedger, which counts the Assignments of every Cleaner per Schedule and week ' \
+           'for Cleaner.deployment_ratio(), from the Assignments in the database. ' \
+           'The ledger is kept up to date by the models, so this command only needs to be run once after ' \
+           'updating CleanSys to a version with the ledger, or after Assignments were changed outside of Django.'
+
+    def handle(self, *args, **options):
+        AssignmentLedger.objects.rebuild()
+        self.stdout.write("The AssignmentLedger now has {} rows.".format(AssignmentLedger.objects.count()))
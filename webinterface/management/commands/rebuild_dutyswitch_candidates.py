@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from webinterface.models import DutySwitchCandidate
+
+
+class Command(BaseCommand):
+    help = 'Recreates the DutySwitchCandidate table, which maps every open DutySwitch to the Assignments it can ' \
+           'be accepted with. The table is kept up to date by the models, so this command only needs to be run ' \
+           'once after updating CleanSys to a version with the table, or after data was changed outside of Django.'
+
+    def handle(self, *args, **options):
+        DutySwitchCandidate.objects.rebuild()
+        self.stdout.write("The DutySwitchCandidate table now has {} rows.".format(
+            DutySwitchCandidate.objects.count()))
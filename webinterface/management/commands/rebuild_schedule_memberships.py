@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from webinterface.models import ScheduleMembership
+
+
+class Command(BaseCommand):
+    help = 'Recreates the ScheduleMembership table, which holds the weeks in which each Cleaner belongs to each ' \
+           'Schedule. The table is kept up to date by the models, so this command only needs to be run ' \
+           'once after updating CleanSys to a version with the table, or after data was changed outside of Django.'
+
+    def handle(self, *args, **options):
+        ScheduleMembership.objects.rebuild()
+        self.stdout.write("The ScheduleMembership table now has {} rows.".format(
+            ScheduleMembership.objects.count()))
@@ -1,12 +1,23 @@
 from django.core.management.base import BaseCommand
-from webinterface.email_sending import send_email__assignment_coming_up, send_email__warn_admin_tasks_forgotten
+from webinterface.email_sending import send_email__assignment_coming_up, send_email__warn_admin_tasks_forgotten, \
+    deliver_queued_emails
 
 
 class Command(BaseCommand):
     help = 'Call multiple functions which may send emails if their conditions are met. ' \
            'Calls the send_email__assignment_coming_up() function in webinterface.emailing ' \
-           'which notifies Cleaners of upcoming Assignments when these are 5 days away. '
+           'which notifies Cleaners of upcoming Assignments when these are 5 days away. ' \
+           'The emails are put into the outbox, which is delivered right away. '
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="Number of emails which are sent over one SMTP connection.")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Number of SMTP connections which send emails at the same time.")
 
     def handle(self, *args, **options):
-        send_email__assignment_coming_up(notify_days_before=5)
+        queued = send_email__assignment_coming_up(notify_days_before=5)
+        self.stdout.write("Assignment reminders: {} queued".format(queued))
         send_email__warn_admin_tasks_forgotten()
+        sent, failed = deliver_queued_emails(batch_size=options['batch_size'], nr_workers=options['workers'])
+        self.stdout.write("Queued emails: {} sent, {} failed".format(sent, failed))
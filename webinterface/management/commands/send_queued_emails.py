@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from webinterface.email_sending import deliver_queued_emails
+from webinterface.models import QueuedEmail
+import datetime
+
+
+class Command(BaseCommand):
+    help = 'Delivers the emails in the outbox which are due. Emails which fail to send are retried ' \
+           'with an exponential backoff by later runs of this command. ' \
+           'Sent emails are deleted from the outbox after --keep-sent-days days. '
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help="Number of emails which are sent over one SMTP connection.")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Number of SMTP connections which send emails at the same time.")
+        parser.add_argument('--keep-sent-days', type=int, default=QueuedEmail.KEEP_SENT_DAYS,
+                            help="Number of days sent emails are kept in the outbox.")
+
+    def handle(self, *args, **options):
+        sent, failed = deliver_queued_emails(batch_size=options['batch_size'], nr_workers=options['workers'])
+        self.stdout.write("Queued emails: {} sent, {} failed".format(sent, failed))
+        deleted = QueuedEmail.objects.delete_sent(older_than=datetime.timedelta(days=options['keep_sent_days']))
+        self.stdout.write("Queued emails: {} sent emails deleted".format(deleted))
@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import *
 from django.db.models.query import QuerySet
+from django.db.models import Case, Count, Exists, F, OuterRef, Prefetch, Q, Subquery, Value, When
 from operator import itemgetter
+from itertools import accumulate
 import datetime
 from django.contrib.auth.hashers import make_password
 from django.utils.text import slugify
@@ -9,32 +11,13 @@ import logging
 from logging.config import dictConfig
 from django.contrib.auth.models import User
 from django.utils import timezone
-import calendar
 import random
-import time
 import os
 from cleansys.settings import WARN_WEEKS_IN_ADVANCE__ASSIGNMENTS_RUNNING_OUT, LOGGING, LOGGING_PATH, MEDIA_ROOT, \
-    WARN_WEEKS_IN_ADVANCE__CLEANER_SOON_HOMELESS
+    WARN_WEEKS_IN_ADVANCE__CLEANER_SOON_HOMELESS, CLEANER_ANALYTICS_FILE
 from webinterface import email_sending
-
-
-def date_to_epoch_week(date: datetime.date) -> int:
-    epoch_seconds = calendar.timegm(date.timetuple())
-    return int(((epoch_seconds / 60 / 60 / 24) + 3) / 7)
-
-
-def epoch_week_to_monday(week: int) -> datetime.date:
-    epoch_seconds = ((week * 7) - 3) * 24 * 60 * 60
-    return datetime.date.fromtimestamp(time.mktime(time.gmtime(epoch_seconds)))
-
-
-def epoch_week_to_sunday(week: int) -> datetime.date:
-    epoch_seconds = ((week * 7) + 3) * 24 * 60 * 60
-    return datetime.date.fromtimestamp(time.mktime(time.gmtime(epoch_seconds)))
-
-
-def current_epoch_week():
-    return date_to_epoch_week(datetime.date.today())
+from webinterface.epoch_calendar import date_to_epoch_week, date_to_epoch_day, epoch_week_to_date, \
+    epoch_week_to_monday, epoch_week_to_sunday, current_epoch_week
 
 
 class ScheduleQuerySet(models.QuerySet):
@@ -56,12 +39,14 @@ class Schedule(models.Model):
 
     WEEKDAYS = ((0, 'Montag'), (1, 'Dienstag'), (2, 'Mittwoch'), (3, 'Donnerstag'),
                 (4, 'Freitag'), (5, 'Samstag'), (6, 'Sonntag'))
+    MAX_WEEKDAY = max(x for x, _ in WEEKDAYS)
     weekday = models.IntegerField(default=6, choices=WEEKDAYS)
 
     FREQUENCY_CHOICES = ((1, 'Jede Woche'), (2, 'Gerade Wochen'), (3, 'Ungerade Wochen'))
     frequency = models.IntegerField(default=1, choices=FREQUENCY_CHOICES)
 
     disabled = models.BooleanField(default=False)
+    modified = models.DateTimeField(auto_now=True)
 
     objects = ScheduleQuerySet.as_manager()
 
@@ -156,19 +141,75 @@ class Schedule(models.Model):
         else:
             return []
 
+    def deployment_ratio_series(self, weeks: list) -> dict:
+        """
+        Computes deployment_ratios() for many weeks at once. The Affiliations and the AssignmentLedger rows of the
+        whole timespan are fetched with one query each, and the Assignment counts of the constant affiliation
+        timespans are taken from cumulative sums over these rows.
+
+        :param weeks: List of epoch week numbers
+        :return: dict which maps every week to the same list deployment_ratios(week) would return
+        """
+        series = {week: [] for week in weeks}
+        if not weeks:
+            return series
+
+        affiliations = list(Affiliation.objects.of_schedule(self).filter(
+            beginning__lte=max(weeks), end__gte=min(weeks)).select_related('cleaner'))
+        if not affiliations:
+            return series
+
+        first_week = min(x.beginning for x in affiliations)
+        last_week = max(x.end for x in affiliations)
+
+        # {cleaner_pk: [0, count in first_week, count up to first_week+1, ...]}, the key None holds all Cleaners
+        cumulative_counts = {}
+        for week, cleaner_pk, count in AssignmentLedger.objects.filter(
+                schedule=self, week__range=(first_week, last_week)).values_list('week', 'cleaner', 'count'):
+            cumulative_counts.setdefault(cleaner_pk, [0] * (last_week - first_week + 1))[week - first_week] = count
+        for cleaner_pk, counts in cumulative_counts.items():
+            cumulative_counts[cleaner_pk] = [0] + list(accumulate(counts))
+
+        def count_in_timespan(cleaner_pk, from_week, to_week):
+            if cleaner_pk not in cumulative_counts:
+                return 0
+            return cumulative_counts[cleaner_pk][to_week - first_week + 1] - \
+                cumulative_counts[cleaner_pk][from_week - first_week]
+
+        for week in weeks:
+            active_affiliations = [x for x in affiliations if x.beginning <= week <= x.end]
+            if not active_affiliations:
+                continue
+            beginning = max(x.beginning for x in active_affiliations)
+            end = min(x.end for x in active_affiliations)
+
+            all_assignment_count = count_in_timespan(None, beginning, end)
+            ratios = [[x.cleaner, count_in_timespan(x.cleaner_id, beginning, end) / all_assignment_count
+                       if all_assignment_count != 0 else 0.0] for x in active_affiliations]
+            series[week] = sorted(ratios, key=itemgetter(1), reverse=False)
+        return series
+
     def occurs_in_week(self, week: int) -> bool:
         return self.frequency == 1 or \
                self.frequency == 2 and week % 2 == 0 or \
                self.frequency == 3 and week % 2 == 1
 
-    def create_assignments_over_timespan(self, start_week: int, end_week: int) -> None:
+    def create_assignments_over_timespan(self, start_week: int, end_week: int, in_memory=False) -> None:
         """
         Calls create_assignment() for every week between (and including) start_week to end_week
 
         :param start_week: First week number on which a new Assignment will be created.
         :param end_week: Last week number on which a new Assignment will be created
+        :param in_memory: If True, the Assignments are planned by the AssignmentPlanner, which makes the same
+        choices as create_assignment() but loads everything it needs with a few queries and writes the
+        Assignments with a single bulk_create()
         :return: None
         """
+        if in_memory:
+            from webinterface.assignment_planner import AssignmentPlanner
+            AssignmentPlanner(schedule=self, start_week=start_week, end_week=end_week).run()
+            return
+
         min_week = min(start_week, end_week)
         max_week = max(start_week, end_week)
 
@@ -207,7 +248,9 @@ class Schedule(models.Model):
         cleaning_week, was_created = self.cleaningweek_set.get_or_create(week=week)
         cleaning_week.create_missing_tasks()
         if not cleaning_week.assignments_valid:
-            cleaning_week.assignment_set.all().delete()
+            from webinterface.signals import batched_assignment_signals
+            with batched_assignment_signals():
+                cleaning_week.assignment_set.all().delete()
             cleaning_week.set_assignments_valid_field(True)
 
         if cleaning_week.assignment_set.count() >= self.cleaners_per_date:
@@ -264,8 +307,7 @@ class Schedule(models.Model):
 
         if self.__previous_frequency != self.frequency \
                 or self.__previous_cleaners_per_date != self.cleaners_per_date:
-            [x.set_assignments_valid_field(False)
-             for x in self.cleaningweek_set.in_future().all()]
+            self.cleaningweek_set.in_future().invalidate_assignments()
             self.update_previous()
 
 
@@ -290,13 +332,22 @@ class ScheduleGroup(models.Model):
 
 
 class CleanerQuerySet(models.QuerySet):
-    def active(self) -> QuerySet:
-        return self.filter(
-            affiliation__beginning__lte=current_epoch_week(), affiliation__end__gte=current_epoch_week())
+    def active_cleaner_pks(self, schedule: Schedule = None, week: int = None) -> QuerySet:
+        """
+        :param schedule: If given, only Cleaners who belong to this Schedule in the week are active. Otherwise,
+        every Cleaner with an Affiliation in the week is, even if the ScheduleGroup has no Schedules.
+        :param week: Defaults to the current week
+        """
+        week = current_epoch_week() if week is None else week
+        if schedule is None:
+            return Affiliation.objects.active_in_week(week).order_by().values('cleaner')
+        return ScheduleMembership.objects.filter(schedule=schedule).active_in_week(week).order_by().values('cleaner')
 
-    def inactive(self) -> QuerySet:
-        return self.exclude(
-            affiliation__beginning__lte=current_epoch_week(), affiliation__end__gte=current_epoch_week())
+    def active(self, schedule: Schedule = None, week: int = None) -> QuerySet:
+        return self.filter(pk__in=self.active_cleaner_pks(schedule, week))
+
+    def inactive(self, schedule: Schedule = None, week: int = None) -> QuerySet:
+        return self.exclude(pk__in=self.active_cleaner_pks(schedule, week))
 
     def has_email(self) -> QuerySet:
         return self.exclude(user__email__isnull=True)
@@ -353,13 +404,8 @@ class Cleaner(models.Model):
         return False
 
     def deployment_ratio(self, schedule: Schedule, from_week: int, to_week: int) -> float:
-        all_assignments = schedule.assignment_set.in_enabled_cleaning_weeks().filter(
-                cleaning_week__week__gte=from_week,
-                cleaning_week__week__lte=to_week,
-                cleaning_week__assignments_valid=True)
-
-        all_assignment_count = all_assignments.count()
-        own_assignment_count = all_assignments.filter(cleaner=self).count()
+        all_assignment_count = AssignmentLedger.objects.count_in_timespan(schedule, None, from_week, to_week)
+        own_assignment_count = AssignmentLedger.objects.count_in_timespan(schedule, self, from_week, to_week)
 
         if all_assignment_count != 0:
             return own_assignment_count / all_assignment_count
@@ -393,6 +439,8 @@ class Cleaner(models.Model):
             self.user.username = self.slug
             self.user.set_password(self.slug)
             self.user.save()
+            # The name of the Cleaner changed, which is shown in all plots
+            AnalyticsPlot.objects.invalidate()
 
         super().save(force_insert, force_update, using, update_fields)
 
@@ -401,8 +449,13 @@ class AffiliationQuerySet(models.QuerySet):
     def active_in_week(self, week):
         return self.filter(beginning__lte=week, end__gte=week)
 
+    def of_schedule(self, schedule):
+        return self.filter(schedulemembership__schedule=schedule)
+
     def active_in_week_for_schedule(self, week, schedule):
-        return self.active_in_week(week).filter(group__schedules=schedule)
+        # One filter() call, so that all conditions apply to the same ScheduleMembership
+        return self.filter(schedulemembership__schedule=schedule, schedulemembership__beginning__lte=week,
+                           schedulemembership__end__gte=week)
 
 
 class Affiliation(models.Model):
@@ -415,6 +468,10 @@ class Affiliation(models.Model):
     class Meta:
         ordering = ('-end',)
         unique_together = ('beginning', 'cleaner')
+        indexes = [
+            models.Index(fields=['cleaner', 'beginning', 'end']),
+            models.Index(fields=['end', 'beginning']),  # active_in_week()
+        ]
 
     cleaner = models.ForeignKey(Cleaner, on_delete=models.CASCADE, editable=False)
     group = models.ForeignKey(ScheduleGroup, on_delete=models.CASCADE, null=False)
@@ -434,16 +491,24 @@ class Affiliation(models.Model):
         if self.pk:
             self.__previous_beginning = self.beginning
             self.__previous_end = self.end
-            self.__previous_group = self.group
+            self.__previous_group_id = self.group_id
         else:
             self.__previous_beginning = None
             self.__previous_end = None
-            self.__previous_group = None
+            self.__previous_group_id = None
 
     def __init__(self, *args, **kwargs):
         super(Affiliation, self).__init__(*args, **kwargs)
         self.update_previous()
 
+    def previous_group(self):
+        # Only the pk is tracked, so that loading an Affiliation doesn't query its ScheduleGroup
+        if self.__previous_group_id is None:
+            return None
+        if self.__previous_group_id == self.group_id:
+            return self.group
+        return ScheduleGroup.objects.get(pk=self.__previous_group_id)
+
     def beginning_as_date(self):
         return epoch_week_to_monday(self.beginning)
 
@@ -498,38 +563,103 @@ class Affiliation(models.Model):
 
             min_beginning = min(prev_beginning, new_beginning)
             max_beginning = max(prev_beginning, new_beginning)
-            beginning_affects = cleaning_weeks. \
-                filter(week__range=(min_beginning, max_beginning)). \
-                exclude(week=max_beginning)
+            beginning_affects = Q(week__gte=min_beginning, week__lt=max_beginning)
 
             min_end = min(prev_end, new_end)
             max_end = max(prev_end, new_end)
-            end_affects = cleaning_weeks. \
-                filter(week__range=(min_end, max_end)). \
-                exclude(week=min_end)
+            end_affects = Q(week__gt=min_end, week__lte=max_end)
 
-            # XORing both sets deals with the case that the old and new affiliation week ranges don't overlap
-            cleaning_weeks_invalidated = set(beginning_affects) ^ set(end_affects)
+            # XORing both ranges deals with the case that the old and new affiliation week ranges don't overlap
+            cleaning_weeks_invalidated = cleaning_weeks.filter(
+                (beginning_affects & ~end_affects) | (end_affects & ~beginning_affects))
 
         if cleaning_weeks_invalidated is not None:
-            for cleaning_week in cleaning_weeks_invalidated:
-                cleaning_week.set_assignments_valid_field(False)
+            return cleaning_weeks_invalidated.invalidate_assignments()
+        return 0
 
     def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
         self.date_validator(affiliation_pk=self.pk, cleaner=self.cleaner, beginning=self.beginning, end=self.end)
         self.cleaning_week_assignments_invalidator(
-            affiliation_pk=self.pk, prev_group=self.__previous_group, new_group=self.group,
+            affiliation_pk=self.pk, prev_group=self.previous_group(), new_group=self.group,
             prev_beginning=self.__previous_beginning, prev_end=self.__previous_end,
             new_beginning=self.beginning, new_end=self.end)
         super().save(force_insert, force_update, using, update_fields)
+        self.invalidate_analytics_plots()
+        if (self.__previous_beginning, self.__previous_end) != (self.beginning, self.end):
+            self.refresh_dutyswitch_candidates()
+        if self.__previous_group_id != self.group_id:
+            ScheduleMembership.objects.refresh(Affiliation.objects.filter(pk=self.pk))
+        elif (self.__previous_beginning, self.__previous_end) != (self.beginning, self.end):
+            self.schedulemembership_set.update(beginning=self.beginning, end=self.end)
         self.update_previous()
 
     def delete(self, using=None, keep_parents=False):
         self.cleaning_week_assignments_invalidator(
-            affiliation_pk=None, prev_group=self.__previous_group, new_group=self.group,
+            affiliation_pk=None, prev_group=self.previous_group(), new_group=self.group,
             prev_beginning=self.beginning, prev_end=self.end,
             new_beginning=self.beginning, new_end=self.end)
         super().delete(using, keep_parents)
+        self.invalidate_analytics_plots()
+        self.refresh_dutyswitch_candidates()
+
+    def refresh_dutyswitch_candidates(self):
+        weeks = [x for x in [self.__previous_beginning, self.__previous_end, self.beginning, self.end]
+                 if x is not None]
+        DutySwitchCandidate.objects.refresh_for_weeks(first_week=min(weeks), last_week=max(weeks))
+
+    def invalidate_analytics_plots(self):
+        group_pks = [x for x in [self.__previous_group_id, self.group_id] if x is not None]
+        AnalyticsPlot.objects.of_schedules(Schedule.objects.filter(schedulegroup__in=group_pks)).invalidate()
+
+
+class ScheduleMembershipQuerySet(models.QuerySet):
+    def active_in_week(self, week: int):
+        return self.filter(beginning__lte=week, end__gte=week)
+
+    def refresh(self, affiliations: QuerySet) -> None:
+        """Recomputes the rows of the given Affiliations from their ScheduleGroups' Schedules"""
+        affiliation_pks = list(affiliations.values_list('pk', flat=True))
+        with transaction.atomic():
+            self.filter(affiliation__in=affiliation_pks).delete()
+            self.bulk_create([ScheduleMembership(affiliation_id=pk, cleaner_id=cleaner_pk, schedule_id=schedule_pk,
+                                                 beginning=beginning, end=end)
+                              for pk, cleaner_pk, beginning, end, schedule_pk in
+                              Affiliation.objects.filter(pk__in=affiliation_pks).order_by().annotate(
+                                  schedule_pk=F('group__schedules')).filter(schedule_pk__isnull=False).
+                              values_list('pk', 'cleaner', 'beginning', 'end', 'schedule_pk')])
+
+    def refresh_for_schedule_groups(self, schedule_groups) -> None:
+        self.refresh(Affiliation.objects.filter(group__in=schedule_groups))
+
+    def rebuild(self) -> None:
+        self.all().delete()
+        self.refresh(Affiliation.objects.all())
+
+
+class ScheduleMembership(models.Model):
+    """
+    The ScheduleMembership table holds the weeks in which a Cleaner belongs to a Schedule, with one row for
+    every Affiliation and every Schedule of its ScheduleGroup. It answers which Cleaners are active in a Schedule
+    in a given week without joining Affiliation, ScheduleGroup and ScheduleGroup.schedules.
+
+    The table is kept up to date by Affiliation and by the schedule_group_changed signal in signals.py.
+    """
+    class Meta:
+        unique_together = ('affiliation', 'schedule')
+        # Covers "who is active in Schedule S during week W", and with W the current week "who is active now"
+        indexes = [models.Index(fields=['schedule', 'end', 'beginning', 'cleaner'])]
+
+    affiliation = models.ForeignKey(Affiliation, on_delete=models.CASCADE, editable=False)
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, editable=False)
+    cleaner = models.ForeignKey(Cleaner, on_delete=models.CASCADE, editable=False)
+    beginning = models.IntegerField(editable=False)
+    end = models.IntegerField(editable=False)
+
+    objects = ScheduleMembershipQuerySet.as_manager()
+
+    def __str__(self):
+        return "{} belongs to Schedule {} from week {} to week {}".format(
+            self.cleaner.name, self.schedule.name, self.beginning, self.end)
 
 
 class CleaningWeekQuerySet(models.QuerySet):
@@ -548,11 +678,58 @@ class CleaningWeekQuerySet(models.QuerySet):
     def assignments_invalid(self):
         return self.filter(assignments_valid=False)
 
+    def with_task_counts(self):
+        """
+        Annotates nr_tasks and nr_completed_tasks
+        """
+        return self.annotate(
+            nr_tasks=Count('task', distinct=True),
+            nr_completed_tasks=Count('task', filter=Q(task__cleaned_by__isnull=False), distinct=True)
+        )
+
+    def with_listing_data(self):
+        """
+        Annotates everything a listing of CleaningWeeks displays, so that rendering it needs a constant number of
+        queries: nr_assignments, nr_tasks, nr_completed_tasks and has_missing_task_templates.
+        The Schedule is joined in and the Assignments (with their Cleaners) and Tasks (with their TaskTemplates)
+        are prefetched.
+        """
+        missing_task_templates = TaskTemplate.objects.filter(schedule=OuterRef('schedule')).annotate(
+            has_task=Exists(Task.objects.filter(cleaning_week=OuterRef(OuterRef('pk')), template=OuterRef('pk')))
+        ).filter(has_task=False)
+
+        return self.select_related('schedule').with_task_counts().annotate(
+            nr_assignments=Count('assignment', distinct=True),
+            has_missing_task_templates=Exists(missing_task_templates)
+        ).prefetch_related(
+            Prefetch('assignment_set', queryset=Assignment.objects.select_related('cleaner')),
+            Prefetch('task_set', queryset=Task.objects.select_related('template'))
+        )
+
+    def invalidate_assignments(self) -> int:
+        """
+        Sets assignments_valid=False on all CleaningWeeks of the QuerySet with a single UPDATE.
+        The AssignmentLedger is refreshed once per affected Schedule, as update() bypasses CleaningWeek.save().
+
+        :return: Number of CleaningWeeks that were valid before and are invalid now
+        """
+        affected = self.filter(assignments_valid=True)
+        affected_weeks = {}
+        for schedule_pk, week in affected.filter(disabled=False).values_list('schedule', 'week'):
+            affected_weeks.setdefault(schedule_pk, []).append(week)
+
+        invalidated = affected.update(assignments_valid=False)
+
+        for schedule_pk, weeks in affected_weeks.items():
+            AssignmentLedger.objects.refresh(schedule=schedule_pk, weeks=weeks)
+        return invalidated
+
 
 class CleaningWeek(models.Model):
     class Meta:
         ordering = ('week',)
         unique_together = ('week', 'schedule')
+        indexes = [models.Index(fields=['schedule', 'week', 'disabled'])]
     week = models.IntegerField(editable=False)
     excluded = models.ManyToManyField(Cleaner)
     schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, editable=False)
@@ -568,11 +745,16 @@ class CleaningWeek(models.Model):
         #     self.schedule.name, self.assignment_date().strftime("%d. %b %Y"),
         #     self.week_start().strftime("%d. %b %Y"), self.week_end().strftime("%d. %b %Y"))
 
+    def update_previous(self):
+        self.__previous_disabled = self.disabled
+        self.__previous_assignments_valid = self.assignments_valid
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.update_previous()
 
     def assignment_date(self) -> datetime.date:
-        return epoch_week_to_monday(self.week) + datetime.timedelta(days=self.schedule.weekday)
+        return epoch_week_to_date(self.week, self.schedule.weekday)
 
     def is_current_week(self) -> bool:
         return current_epoch_week() == self.week
@@ -626,6 +808,16 @@ class CleaningWeek(models.Model):
         self.assignments_valid = value
         self.save()
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        super().save(force_insert, force_update, using, update_fields)
+
+        if self.__previous_disabled != self.disabled:
+            DutySwitchCandidate.objects.refresh_for_cleaning_weeks(CleaningWeek.objects.filter(pk=self.pk))
+
+        if self.__previous_disabled != self.disabled or self.__previous_assignments_valid != self.assignments_valid:
+            AssignmentLedger.objects.refresh(schedule=self.schedule_id, weeks=[self.week])
+            self.update_previous()
+
 
 class AssignmentQuerySet(models.QuerySet):
     def in_enabled_cleaning_weeks(self):
@@ -634,11 +826,79 @@ class AssignmentQuerySet(models.QuerySet):
     def in_week_or_later(self, week: int):
         return self.in_enabled_cleaning_weeks().filter(cleaning_week__week__gte=week)
 
+    def not_passed(self, date: datetime.date = None):
+        """
+        The Assignments for which Assignment.has_passed() is False, evaluated on dates in the database.
+        The dates are compared as days since the epoch, the Monday of an epoch week being the day 7*week-3.
+
+        :param date: The date to evaluate on, defaults to today
+        """
+        day = date_to_epoch_day(date or timezone.now().date())
+        return self.annotate(
+            assignment_day=F('cleaning_week__week') * 7 - 3 + F('schedule__weekday'),
+            tasks_ready_to_be_done=self.tasks_ready_to_be_done_on(day)).\
+            filter(Q(assignment_day__gte=day) | Q(tasks_ready_to_be_done=True),
+                   # Redundant, but lets the week index be used
+                   cleaning_week__week__gte=self.first_week_not_passed_on(day))
+
+    @staticmethod
+    def first_week_not_passed_on(day: int) -> int:
+        """
+        The last day on which a Task of a week can be done is at most Schedule.MAX_WEEKDAY +
+        TaskTemplate.MAX_END_DAYS_AFTER days after the Monday of the week (the day 7*week-3). Assignments of earlier
+        weeks have passed on day.
+
+        :param day: Days since the epoch
+        :return: The first week whose last day is on or after day
+        """
+        last_day_after_monday = Schedule.MAX_WEEKDAY + TaskTemplate.MAX_END_DAYS_AFTER
+        # The smallest week with 7*week - 3 + last_day_after_monday >= day
+        return -((last_day_after_monday - 3 - day) // 7)
+
+    @staticmethod
+    def tasks_ready_to_be_done_on(day: int) -> Exists:
+        """
+        :param day: Days since the epoch
+        :return: True if the CleaningWeek of the Assignment has open Tasks which can be done on day, as
+        CleaningWeek.tasks_are_ready_to_be_done() would return
+        """
+        return Exists(Task.objects.filter(cleaning_week=OuterRef('cleaning_week'), cleaned_by__isnull=True).annotate(
+            start_day=F('cleaning_week__week') * 7 - 3 + F('cleaning_week__schedule__weekday')
+            - F('template__start_days_before'),
+            end_day=F('cleaning_week__week') * 7 - 3 + F('cleaning_week__schedule__weekday')
+            + F('template__end_days_after')).filter(start_day__lte=day, end_day__gte=day))
+
+    def with_card_data(self, date: datetime.date = None):
+        """
+        Everything CleanerView shows about an Assignment, so that a page of them is loaded with a fixed number of
+        queries. Annotates tasks_ready (Assignment.tasks_are_ready_to_be_done()), passed (Assignment.has_passed()),
+        nr_tasks, nr_completed_tasks and open_dutyswitch_pk (the pk of Assignment.switch_requested()).
+        The Assignments of the same CleaningWeek are prefetched, see Assignment.other_cleaners_on_card().
+
+        :param date: The date to evaluate on, defaults to today
+        """
+        day = date_to_epoch_day(date or timezone.now().date())
+        open_dutyswitches = DutySwitch.objects.filter(requester_assignment=OuterRef('pk'),
+                                                      acceptor_assignment__isnull=True)
+        return self.select_related('cleaner', 'schedule', 'cleaning_week__schedule').annotate(
+            assignment_day=F('cleaning_week__week') * 7 - 3 + F('schedule__weekday'),
+            tasks_ready=self.tasks_ready_to_be_done_on(day),
+            nr_tasks=Count('cleaning_week__task', distinct=True),
+            nr_completed_tasks=Count('cleaning_week__task', distinct=True,
+                                     filter=Q(cleaning_week__task__cleaned_by__isnull=False)),
+            open_dutyswitch_pk=Subquery(open_dutyswitches.values('pk')[:1])).annotate(
+            passed=Case(When(assignment_day__lt=day, tasks_ready=False, then=Value(True)),
+                        default=Value(False), output_field=models.BooleanField())).\
+            prefetch_related(Prefetch('cleaning_week__assignment_set',
+                                      queryset=Assignment.objects.select_related('cleaner').order_by('cleaner__name'),
+                                      to_attr='assignments_with_cleaners'))
+
 
 class Assignment(models.Model):
     cleaner = models.ForeignKey(Cleaner, on_delete=models.CASCADE)
     cleaners_comment = models.CharField(max_length=200)
     created = models.DateField(auto_now_add=timezone.now().date(), editable=False)
+    modified = models.DateTimeField(auto_now=True)
 
     cleaning_week = models.ForeignKey(CleaningWeek, on_delete=models.CASCADE, editable=False)
     schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, editable=False)
@@ -647,6 +907,10 @@ class Assignment(models.Model):
 
     class Meta:
         ordering = ('cleaning_week__week', 'schedule__weekday')
+        indexes = [
+            models.Index(fields=['cleaner', 'cleaning_week']),
+            models.Index(fields=['cleaning_week', 'cleaner']),
+        ]
 
     def __str__(self):
         return "{}: {}, {} ".format(
@@ -669,6 +933,17 @@ class Assignment(models.Model):
     def other_cleaners_in_week_for_schedule(self):
         return self.all_cleaners_in_week_for_schedule().exclude(pk=self.cleaner.pk)
 
+    def other_cleaners_on_card(self) -> list:
+        """
+        The same Cleaners as other_cleaners_in_week_for_schedule(), from the Assignments prefetched by
+        AssignmentQuerySet.with_card_data()
+        """
+        return [x.cleaner for x in self.cleaning_week.assignments_with_cleaners if x.cleaner_id != self.cleaner_id]
+
+    def all_tasks_are_completed_on_card(self) -> bool:
+        """Like CleaningWeek.all_tasks_are_completed(), from the counts annotated by with_card_data()"""
+        return self.nr_tasks > 0 and self.nr_completed_tasks == self.nr_tasks
+
     def switch_requested(self):
         duty_switch = DutySwitch.objects.filter(requester_assignment=self).filter(acceptor_assignment__isnull=True)
         if duty_switch.exists():
@@ -677,11 +952,184 @@ class Assignment(models.Model):
             return None
 
 
+class AssignmentLedgerQuerySet(models.QuerySet):
+    def cumulative_count(self, schedule, cleaner, week: int) -> int:
+        """
+        Number of Assignments of cleaner in schedule up to and including week, counting only enabled
+        CleaningWeeks with valid Assignments. If cleaner is None, the Assignments of all Cleaners are counted.
+        """
+        cumulative = self.filter(schedule=schedule, cleaner=cleaner, week__lte=week).\
+            order_by('-week').values_list('cumulative', flat=True).first()
+        return cumulative or 0
+
+    def count_in_timespan(self, schedule, cleaner, from_week: int, to_week: int) -> int:
+        return self.cumulative_count(schedule, cleaner, to_week) - \
+            self.cumulative_count(schedule, cleaner, from_week - 1)
+
+    def refresh(self, schedule, weeks) -> None:
+        """
+        Recounts the Assignments of schedule in the given weeks and carries the differences to the cumulative
+        counts of all later weeks. Must be called whenever Assignments or the disabled or assignments_valid fields
+        of CleaningWeeks change.
+
+        :param schedule: Schedule or its pk
+        :param weeks: Iterable of epoch week numbers
+        """
+        schedule_pk = schedule.pk if isinstance(schedule, Schedule) else schedule
+        weeks = set(weeks)
+        if not weeks:
+            return
+
+        counts = {}
+        for x in Assignment.objects.filter(
+                schedule=schedule_pk, cleaning_week__week__in=weeks,
+                cleaning_week__disabled=False, cleaning_week__assignments_valid=True).order_by().\
+                values('cleaner', 'cleaning_week__week').annotate(count=Count('pk')):
+            for cleaner_pk in [x['cleaner'], None]:
+                counts.setdefault(cleaner_pk, {})
+                counts[cleaner_pk][x['cleaning_week__week']] = \
+                    counts[cleaner_pk].get(x['cleaning_week__week'], 0) + x['count']
+
+        with transaction.atomic():
+            rows = {}
+            for row in self.filter(schedule=schedule_pk, week__gte=min(weeks)).order_by('week'):
+                rows.setdefault(row.cleaner_id, []).append(row)
+
+            to_create, to_update, to_delete = [], [], []
+            for cleaner_pk in set(counts) | set(rows):
+                cleaner_rows = rows.get(cleaner_pk, [])
+                if cleaner_rows:
+                    cumulative = cleaner_rows[0].cumulative - cleaner_rows[0].count
+                else:
+                    cumulative = self.cumulative_count(schedule_pk, cleaner_pk, min(weeks) - 1)
+
+                week_counts = {x.week: x.count for x in cleaner_rows}
+                week_counts.update({x: counts.get(cleaner_pk, {}).get(x, 0) for x in weeks})
+                cleaner_rows = {x.week: x for x in cleaner_rows}
+
+                for week in sorted(week_counts):
+                    cumulative += week_counts[week]
+                    row = cleaner_rows.get(week)
+                    if row is None:
+                        if week_counts[week] != 0:
+                            to_create.append(AssignmentLedger(schedule_id=schedule_pk, cleaner_id=cleaner_pk,
+                                                              week=week, count=week_counts[week],
+                                                              cumulative=cumulative))
+                    elif week_counts[week] == 0:
+                        to_delete.append(row.pk)
+                    elif row.count != week_counts[week] or row.cumulative != cumulative:
+                        row.count = week_counts[week]
+                        row.cumulative = cumulative
+                        to_update.append(row)
+
+            self.filter(pk__in=to_delete).delete()
+            self.bulk_update(to_update, ['count', 'cumulative'])
+            self.bulk_create(to_create)
+
+        AnalyticsPlot.objects.of_schedules([schedule_pk]).invalidate()
+
+    def rebuild(self) -> None:
+        """Recreates the whole ledger from the Assignments in the database"""
+        with transaction.atomic():
+            self.all().delete()
+
+            counts = {}
+            for x in Assignment.objects.filter(cleaning_week__disabled=False, cleaning_week__assignments_valid=True).\
+                    order_by().values('schedule', 'cleaner', 'cleaning_week__week').annotate(count=Count('pk')):
+                for cleaner_pk in [x['cleaner'], None]:
+                    key = (x['schedule'], cleaner_pk, x['cleaning_week__week'])
+                    counts[key] = counts.get(key, 0) + x['count']
+
+            rows = []
+            cumulative = {}
+            for (schedule_pk, cleaner_pk, week), count in sorted(counts.items(), key=lambda x: x[0][2]):
+                cumulative[(schedule_pk, cleaner_pk)] = cumulative.get((schedule_pk, cleaner_pk), 0) + count
+                rows.append(AssignmentLedger(schedule_id=schedule_pk, cleaner_id=cleaner_pk, week=week, count=count,
+                                             cumulative=cumulative[(schedule_pk, cleaner_pk)]))
+            self.bulk_create(rows)
+
+
+class AssignmentLedger(models.Model):
+    """
+    The AssignmentLedger counts the Assignments per Schedule, Cleaner and week in enabled CleaningWeeks with
+    valid Assignments, which are the Assignments regarded by Cleaner.deployment_ratio().
+
+    Next to the count of each week, a row stores the cumulative count up to and including its week, so the number
+    of Assignments in any timespan is the difference of two cumulative counts. Rows with cleaner=None count the
+    Assignments of all Cleaners of the Schedule. Weeks without Assignments have no row.
+    """
+    class Meta:
+        unique_together = ('schedule', 'cleaner', 'week')
+
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, editable=False)
+    cleaner = models.ForeignKey(Cleaner, on_delete=models.CASCADE, null=True, editable=False)
+    week = models.IntegerField(editable=False)
+    count = models.IntegerField(default=0)
+    cumulative = models.IntegerField(default=0)
+
+    objects = AssignmentLedgerQuerySet.as_manager()
+
+    def __str__(self):
+        return "{}: {} Assignments of {} in week {} ({} up to this week)".format(
+            self.schedule.name, self.count, self.cleaner.name if self.cleaner else "all Cleaners", self.week,
+            self.cumulative)
+
+
+class AnalyticsPlotQuerySet(models.QuerySet):
+    def of_schedules(self, schedules):
+        """The plots of the given Schedules (or pks) and the cleaner analytics plot, which covers all Schedules"""
+        return self.filter(Q(schedule__in=schedules) | Q(schedule__isnull=True))
+
+    def invalidate(self) -> int:
+        return self.update(data_version=F('data_version') + 1)
+
+    def for_schedule(self, schedule=None):
+        """
+        :param schedule: The Schedule whose deployment ratio plot is requested. None for the cleaner analytics plot.
+        """
+        plot = self.filter(schedule=schedule).first()
+        if plot is None:
+            plot = self.create(schedule=schedule)
+        return plot
+
+
+class AnalyticsPlot(models.Model):
+    """
+    Tracks whether the plot file of a Schedule's analytics (or the cleaner analytics, if schedule is None) is
+    up to date.
+
+    data_version is increased whenever data shown in the plot changes. A plot that was rendered for the
+    current data version in the current week (see key()) is fresh, all others are rebuilt by webinterface.plot_cache.
+    """
+    schedule = models.OneToOneField(Schedule, on_delete=models.CASCADE, null=True, editable=False)
+    data_version = models.IntegerField(default=0)
+    rendered_key = models.CharField(max_length=32, blank=True, default='')
+
+    objects = AnalyticsPlotQuerySet.as_manager()
+
+    def __str__(self):
+        return "Plot of {} (version {})".format(
+            self.schedule.name if self.schedule else "all Cleaners", self.data_version)
+
+    def key(self) -> str:
+        # The plots show a timespan around the current week, so they also go stale when the week changes
+        return "{}:{}".format(current_epoch_week(), self.data_version)
+
+    def path(self) -> str:
+        return self.schedule.analytics_plot_path() if self.schedule else CLEANER_ANALYTICS_FILE
+
+    def is_fresh(self) -> bool:
+        return self.rendered_key == self.key() and os.path.isfile(self.path())
+
+
 class TaskTemplate(models.Model):
     name = models.CharField(max_length=20)
     help_text = models.CharField(max_length=200, default="", null=True)
-    start_days_before = models.IntegerField(choices=[(0, ''), (1, ''), (2, ''), (3, ''), (4, ''), (5, ''), (6, '')])
-    end_days_after = models.IntegerField(choices=[(0, ''), (1, ''), (2, ''), (3, ''), (4, ''), (5, ''), (6, '')])
+    DAYS_CHOICES = [(0, ''), (1, ''), (2, ''), (3, ''), (4, ''), (5, ''), (6, '')]
+    MAX_END_DAYS_AFTER = max(x for x, _ in DAYS_CHOICES)
+    start_days_before = models.IntegerField(choices=DAYS_CHOICES)
+    end_days_after = models.IntegerField(choices=DAYS_CHOICES)
+    modified = models.DateTimeField(auto_now=True)
 
     schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, editable=False)
 
@@ -714,9 +1162,13 @@ class TaskQuerySet(models.QuerySet):
 
 
 class Task(models.Model):
+    class Meta:
+        indexes = [models.Index(fields=['cleaning_week', 'cleaned_by'])]
+
     cleaning_week = models.ForeignKey(CleaningWeek, on_delete=models.CASCADE, editable=False)
     cleaned_by = models.ForeignKey(Cleaner, null=True, on_delete=models.PROTECT)
     template = models.ForeignKey(TaskTemplate, on_delete=models.CASCADE, editable=False)
+    modified = models.DateTimeField(auto_now=True)
 
     objects = TaskQuerySet.as_manager()
 
@@ -724,14 +1176,10 @@ class Task(models.Model):
         return self.template.name
 
     def start_date(self):
-        return self.cleaning_week.week_start() \
-               + datetime.timedelta(days=self.cleaning_week.schedule.weekday) \
-               - datetime.timedelta(days=self.template.start_days_before)
+        return self.cleaning_week.assignment_date() - datetime.timedelta(days=self.template.start_days_before)
 
     def end_date(self):
-        return self.cleaning_week.week_start() \
-               + datetime.timedelta(days=self.cleaning_week.schedule.weekday) \
-               + datetime.timedelta(days=self.template.end_days_after)
+        return self.cleaning_week.assignment_date() + datetime.timedelta(days=self.template.end_days_after)
 
     def is_active_on_date(self, date):
         return self.start_date() <= date <= self.end_date()
@@ -772,10 +1220,27 @@ class DutySwitchQuerySet(models.QuerySet):
         else:
             return base_filter
 
+    def proposed_acceptors(self):
+        """The pks of the Assignments which are proposed as acceptors of these DutySwitches"""
+        return self.filter(proposed_acceptor__isnull=False).order_by().values('proposed_acceptor')
+
+    def acceptable_by(self, cleaner: Cleaner):
+        """The open DutySwitches the Cleaner can accept with one of his/her Assignments"""
+        return self.open().filter(
+            Exists(DutySwitchCandidate.objects.filter(dutyswitch=OuterRef('pk'), cleaner=cleaner,
+                                                      assignment__in=Assignment.objects.not_passed())),
+            requester_assignment__in=Assignment.objects.not_passed())
+
 
 class DutySwitch(models.Model):
     class Meta:
         ordering = ('created',)
+        indexes = [
+            models.Index(fields=['created'], condition=Q(acceptor_assignment__isnull=True),
+                         name='dutyswitch_open_idx'),
+            models.Index(fields=['execute_proposal'], condition=Q(proposed_acceptor__isnull=False),
+                         name='dutyswitch_proposed_idx'),
+        ]
     created = models.DateField(auto_now_add=timezone.now().date())
 
     requester_assignment = models.OneToOneField(Assignment, on_delete=models.CASCADE, related_name="requester",
@@ -789,6 +1254,10 @@ class DutySwitch(models.Model):
 
     message = models.CharField(max_length=100)
 
+    # Days the proposed acceptor has to object to a proposal before it becomes executable.
+    # Used by set_new_proposal() and by the DutySwitchProcessor.
+    PROPOSAL_OBJECTION_DAYS = 2
+
     objects = DutySwitchQuerySet.as_manager()
 
     def update_previous(self):
@@ -818,39 +1287,51 @@ class DutySwitch(models.Model):
             exclude(excluded=requester_assignment.cleaner)
 
     @staticmethod
-    def possible_acceptors_of_assignment(assignment: Assignment, acceptor_weeks=None):
-        if assignment.has_passed():
-            return Assignment.objects.none()
+    def eligible_acceptors_of_assignment(assignment: Assignment, acceptor_weeks=None):
+        """
+        The Assignments the given Assignment could be switched with, regardless of whether any of them have passed.
+        These are the Assignments stored in the DutySwitchCandidate table.
 
-        if not acceptor_weeks:
+        :param acceptor_weeks: The CleaningWeeks the acceptor Assignments can be in. Defaults to
+        DutySwitch.default_acceptor_weeks().
+        """
+        if acceptor_weeks is None:
             acceptor_weeks = DutySwitch.default_acceptor_weeks(assignment)
 
-        active_affiliations = Affiliation.objects.active_in_week(assignment.cleaning_week.week)
-        active_cleaners = [x.cleaner for x in active_affiliations.all()]
+        return Assignment.objects.in_enabled_cleaning_weeks().filter(
+            Exists(Affiliation.objects.active_in_week(assignment.cleaning_week.week).
+                   filter(cleaner=OuterRef('cleaner'))),
+            schedule=assignment.schedule_id,
+            cleaning_week__in=acceptor_weeks.all()).\
+            exclude(cleaner=assignment.cleaner_id).\
+            exclude(cleaning_week__excluded=assignment.cleaner_id)
 
-        p_a_set = Assignment.objects.in_enabled_cleaning_weeks()
-        p_a_set = p_a_set.filter(schedule=assignment.schedule)
-        p_a_set = p_a_set.filter(cleaning_week__in=acceptor_weeks.all())
-        p_a_set = p_a_set.filter(cleaner__in=active_cleaners)
-        p_a_set = p_a_set.exclude(cleaner=assignment.cleaner)
-        p_a_set = p_a_set.exclude(cleaning_week__excluded=assignment.cleaner)
+    @staticmethod
+    def possible_acceptors_of_assignment(assignment: Assignment, acceptor_weeks=None):
+        """
+        The Assignments the given Assignment can be switched with. This is a single query, which is empty if the
+        given Assignment has passed.
 
-        for could_have_passed in p_a_set.filter(
-                cleaning_week__week__range=(current_epoch_week() - 1, current_epoch_week())).all():
-            if could_have_passed.has_passed():
-                p_a_set = p_a_set.exclude(pk=could_have_passed.pk)
+        :param acceptor_weeks: The CleaningWeeks the acceptor Assignments can be in. Defaults to
+        DutySwitch.default_acceptor_weeks().
+        """
+        return DutySwitch.eligible_acceptors_of_assignment(assignment, acceptor_weeks).not_passed().\
+            filter(Exists(Assignment.objects.filter(pk=assignment.pk).not_passed())).\
+            select_related('cleaner', 'cleaning_week__schedule')
 
-        return p_a_set
+    def eligible_acceptors(self):
+        return DutySwitch.eligible_acceptors_of_assignment(self.requester_assignment, self.acceptor_weeks)
 
     def possible_acceptors(self):
         return DutySwitch.possible_acceptors_of_assignment(self.requester_assignment, self.acceptor_weeks)
 
     def set_new_proposal(self):
         self.dont_propose.add(self.proposed_acceptor)
-        choices = set(self.possible_acceptors()) ^ set(self.dont_propose.all())
+        choices = list(self.possible_acceptors().exclude(pk__in=self.dont_propose.all()).
+                       exclude(pk__in=DutySwitch.objects.open().exclude(pk=self.pk).proposed_acceptors()))
         if choices:
-            self.proposed_acceptor = random.choice(list(choices))
-            self.execute_proposal = timezone.now().date() + timezone.timedelta(days=2)
+            self.proposed_acceptor = random.choice(choices)
+            self.execute_proposal = timezone.now().date() + timezone.timedelta(days=self.PROPOSAL_OBJECTION_DAYS)
             email_sending.send_email__dutyswitch_proposal(self)
         else:
             self.proposed_acceptor = None
@@ -865,6 +1346,7 @@ class DutySwitch(models.Model):
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
+        created = self.pk is None
         delete_self = False
         if self.__previous_acceptor is None and self.acceptor_assignment is not None:
             self.requester_assignment.cleaning_week.excluded.add(self.requester_assignment.cleaner)
@@ -893,4 +1375,165 @@ class DutySwitch(models.Model):
 
         if delete_self:
             self.delete()
+        elif created:
+            DutySwitchCandidate.objects.refresh(DutySwitch.objects.filter(pk=self.pk))
+
+
+class DutySwitchCandidateQuerySet(models.QuerySet):
+    def refresh(self, dutyswitches: QuerySet) -> None:
+        """
+        Recomputes the candidates of the given DutySwitches. Closed DutySwitches and DutySwitches whose
+        requester is in a disabled CleaningWeek have no candidates.
+        """
+        open_dutyswitches = DutySwitch.objects.open().filter(pk__in=dutyswitches).\
+            select_related('requester_assignment__cleaning_week')
+        with transaction.atomic():
+            self.filter(dutyswitch__in=dutyswitches).delete()
+            self.bulk_create([DutySwitchCandidate(dutyswitch=dutyswitch, assignment_id=assignment_pk,
+                                                  cleaner_id=cleaner_pk)
+                              for dutyswitch in open_dutyswitches
+                              for assignment_pk, cleaner_pk in
+                              dutyswitch.eligible_acceptors().values_list('pk', 'cleaner')])
+
+    def refresh_for_cleaning_weeks(self, cleaning_weeks: QuerySet) -> None:
+        """Recomputes the candidates of the DutySwitches which the given CleaningWeeks can affect"""
+        self.refresh(DutySwitch.objects.filter(Q(acceptor_weeks__in=cleaning_weeks) |
+                                               Q(requester_assignment__cleaning_week__in=cleaning_weeks)))
+
+    def refresh_for_weeks(self, first_week: int, last_week: int) -> None:
+        """Recomputes the candidates of the DutySwitches whose requester is in the given range of weeks"""
+        self.refresh(DutySwitch.objects.filter(
+            requester_assignment__cleaning_week__week__range=(first_week, last_week)))
+
+    def rebuild(self) -> None:
+        self.all().delete()
+        self.refresh(DutySwitch.objects.all())
+
+
+class DutySwitchCandidate(models.Model):
+    """
+    The DutySwitchCandidate table maps each open DutySwitch to the Assignments it can be accepted with, as
+    given by DutySwitch.eligible_acceptors(). It answers which DutySwitches a Cleaner can accept with one
+    indexed lookup (see DutySwitchQuerySet.acceptable_by()).
+
+    Whether an Assignment has passed changes with the date alone, so that check is made when the table is read.
+    The table is kept up to date by DutySwitch, CleaningWeek and Affiliation and by the signals in signals.py.
+    """
+    class Meta:
+        unique_together = ('dutyswitch', 'assignment')
+        indexes = [models.Index(fields=['cleaner', 'dutyswitch'])]
+
+    dutyswitch = models.ForeignKey(DutySwitch, on_delete=models.CASCADE, editable=False)
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, editable=False)
+    cleaner = models.ForeignKey(Cleaner, on_delete=models.CASCADE, editable=False)
+
+    objects = DutySwitchCandidateQuerySet.as_manager()
+
+    def __str__(self):
+        return "{} can accept DutySwitch {} with {}".format(self.cleaner.name, self.dutyswitch_id, self.assignment)
 
+
+class QueuedEmailQuerySet(models.QuerySet):
+    def pending(self):
+        return self.filter(sent__isnull=True, attempts__lt=QueuedEmail.MAX_ATTEMPTS)
+
+    def due(self, now=None):
+        return self.pending().filter(next_attempt__lte=now or timezone.now())
+
+    def failed(self):
+        return self.filter(sent__isnull=True, attempts__gte=QueuedEmail.MAX_ATTEMPTS)
+
+    def enqueue(self, messages) -> list:
+        """
+        :param messages: EmailMessages (or EmailMultiAlternatives) to be sent by the delivery worker
+        :return: List of the created QueuedEmails
+        """
+        return self.bulk_create([QueuedEmail.from_message(x) for x in messages])
+
+    def claim(self, limit: int) -> list:
+        """
+        Takes up to limit due QueuedEmails for delivery. Their next_attempt is moved behind the lease, so a
+        second worker running at the same time doesn't send them as well. If the worker dies during delivery,
+        the QueuedEmails become due again when the lease has run out.
+        """
+        now = timezone.now()
+        lease_until = now + datetime.timedelta(minutes=QueuedEmail.LEASE_MINUTES)
+        pks = list(self.due(now).order_by('next_attempt', 'pk').values_list('pk', flat=True)[:limit])
+        self.filter(pk__in=pks, next_attempt__lte=now).update(next_attempt=lease_until)
+        return list(self.filter(pk__in=pks, next_attempt=lease_until))
+
+    def delete_sent(self, older_than: datetime.timedelta) -> int:
+        """
+        Deletes the QueuedEmails which were sent more than older_than ago. Failed QueuedEmails are kept.
+
+        :return: Number of deleted QueuedEmails
+        """
+        nr_deleted, _ = self.filter(sent__lt=timezone.now() - older_than).delete()
+        return nr_deleted
+
+
+class QueuedEmail(models.Model):
+    """
+    An email in the outbox. The request path only creates QueuedEmails (see email_sending.queue_emails()),
+    they are delivered by the send_queued_emails command, which retries failed deliveries with an
+    exponential backoff of RETRY_DELAY_MINUTES * 2^(attempts-1) until MAX_ATTEMPTS is reached.
+    """
+    class Meta:
+        ordering = ('created',)
+        indexes = [models.Index(fields=['next_attempt'], condition=Q(sent__isnull=True),
+                                name='queuedemail_unsent_idx')]
+
+    MAX_ATTEMPTS = 5
+    RETRY_DELAY_MINUTES = 5
+    LEASE_MINUTES = 15
+    KEEP_SENT_DAYS = 30
+
+    created = models.DateTimeField(auto_now_add=True)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    html = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254)
+    # Addresses are stored separated by newlines, as "Max Mustermann <max@cleansys.headquarters>" contains spaces
+    to = models.TextField()
+    bcc = models.TextField(blank=True)
+    reply_to = models.TextField(blank=True)
+
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True)
+
+    objects = QueuedEmailQuerySet.as_manager()
+
+    def __str__(self):
+        if self.sent:
+            state = "sent"
+        elif self.attempts >= self.MAX_ATTEMPTS:
+            state = "failed"
+        else:
+            state = "queued"
+        return "{} to {} ({})".format(self.subject, ", ".join(self.addresses(self.to)), state)
+
+    @staticmethod
+    def from_message(message):
+        html = next((content for content, mimetype in getattr(message, 'alternatives', [])
+                     if mimetype == "text/html"), '')
+        return QueuedEmail(subject=message.subject, body=message.body, html=html, from_email=message.from_email,
+                           to="\n".join(message.to), bcc="\n".join(message.bcc),
+                           reply_to="\n".join(message.reply_to))
+
+    @staticmethod
+    def addresses(field: str) -> list:
+        return [x for x in field.split("\n") if x]
+
+    def as_message(self):
+        from django.core import mail
+        message = mail.EmailMultiAlternatives(subject=self.subject, body=self.body, from_email=self.from_email,
+                                              to=self.addresses(self.to), bcc=self.addresses(self.bcc),
+                                              reply_to=self.addresses(self.reply_to))
+        if self.html:
+            message.attach_alternative(self.html, "text/html")
+        return message
+
+    def retry_delay(self) -> datetime.timedelta:
+        return datetime.timedelta(minutes=self.RETRY_DELAY_MINUTES * 2 ** max(self.attempts - 1, 0))
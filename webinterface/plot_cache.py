@@ -0,0 +1,66 @@
+import tempfile
+from webinterface.models import *
+
+
+def write_plot_file(path: str, plot_html: str) -> None:
+    """
+    Writes the plot to a temporary file in the same directory and moves it over path, so that a request never
+    reads a missing or half-written plot file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.html.tmp')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(plot_html)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.isfile(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def rebuild_plot(plot: AnalyticsPlot) -> None:
+    """
+    Renders the plot file and marks it as fresh for the data version it was rendered from. If the data changes
+    while rendering, the plot stays stale and is rebuilt by the next run of rebuild_stale_plots().
+    """
+    # The plots are created by the analytics functions in views.py, which in turn imports this module
+    from webinterface.views import create_cleaner_analytics, create_schedule_analytics
+
+    key = plot.key()
+    if plot.schedule is None:
+        create_cleaner_analytics(recreate=True)
+    else:
+        create_schedule_analytics(only=[plot.path()], recreate=True)
+    AnalyticsPlot.objects.filter(pk=plot.pk, data_version=plot.data_version).update(rendered_key=key)
+
+
+def get_plot(schedule: Schedule = None):
+    """
+    Returns the cached plot of the Schedule (or the cleaner analytics plot, if schedule is None) without waiting
+    for plotly. A stale plot is returned as is until the create_plots command has rebuilt it.
+
+    :return: The html of the plot or None, if the plot hasn't been rendered yet
+    """
+    path = AnalyticsPlot(schedule=schedule).path()
+    if os.path.isfile(path):
+        with open(path, 'r') as file:
+            return file.read()
+    return None
+
+
+def rebuild_stale_plots(force=False) -> int:
+    """
+    Renders all plots which are out of date
+
+    :param force: If True, all plots are rendered
+    :return: Number of rendered plots
+    """
+    plots = [AnalyticsPlot.objects.for_schedule(None)] + \
+            [AnalyticsPlot.objects.for_schedule(x) for x in Schedule.objects.enabled()]
+    rebuilt = 0
+    for plot in plots:
+        if force or not plot.is_fresh():
+            rebuild_plot(plot)
+            rebuilt += 1
+    return rebuilt
@@ -0,0 +1,119 @@
+import re
+from django.db.models import Count
+from django.apps import apps
+from webinterface.models import *
+from webinterface.api_filters import AssignmentFilter, CleaningWeekFilter, TaskFilter
+
+# Tables which hold a few dozen rows at most and are fine to scan
+SMALL_TABLES = {'webinterface_schedule', 'webinterface_schedulegroup', 'webinterface_schedulegroup_schedules',
+                'webinterface_cleaner', 'webinterface_tasktemplate', 'webinterface_analyticsplot', 'auth_user'}
+
+# SQLite: "SCAN webinterface_task" or "SCAN TABLE webinterface_task AS T3", PostgreSQL: "Seq Scan on webinterface_task"
+SCAN_PATTERN = re.compile(r'\b(?:SCAN(?: TABLE)?|Seq Scan on) "?(\w+)"?')
+
+
+def query_catalogue() -> list:
+    """
+    The queries of the views and commands which run most often, with sample arguments taken from the database.
+
+    :return: List of (name, QuerySet) tuples
+    """
+    week = current_epoch_week()
+    schedule = Schedule.objects.first()
+    cleaner = Cleaner.objects.first()
+    cleaning_week = CleaningWeek.objects.first()
+    assignment = Assignment.objects.first()
+    today = timezone.now().date()
+    week_range = '{},{}'.format(week, week + 4)
+
+    catalogue = [
+        ('Cleaner.objects.active()', Cleaner.objects.active()),
+        ('Affiliation.objects.active_in_week()', Affiliation.objects.active_in_week(week)),
+        ('ScheduleOverView: CleaningWeeks with task counts',
+         CleaningWeek.objects.with_task_counts().filter(week__range=(week - 5, week + 5))),
+        ('Cleaner analytics: assignment counts',
+         Assignment.objects.in_enabled_cleaning_weeks().filter(cleaning_week__week__range=(week - 30, week + 30)).
+         order_by().values('cleaner', 'cleaning_week__week').annotate(count=Count('pk'))),
+        ('CleaningWeek.objects.in_future()', CleaningWeek.objects.in_future()),
+        ('DutySwitch.objects.open()', DutySwitch.objects.open()),
+        ('process_dutyswitch_proposals: DutySwitches which need a proposal',
+         DutySwitch.objects.open().filter(created__lt=today - datetime.timedelta(days=2),
+                                          proposed_acceptor__isnull=True)),
+        ('process_dutyswitch_proposals: proposals to execute',
+         DutySwitch.objects.filter(execute_proposal__lt=today - datetime.timedelta(days=2),
+                                   proposed_acceptor__isnull=False)),
+        ('send_queued_emails: due QueuedEmails', QueuedEmail.objects.due()),
+        ('send_daily_emails: Assignments coming up',
+         Assignment.objects.filter(cleaning_week__week=week, cleaning_week__disabled=False,
+                                   cleaner__email_pref_assignment_coming_up=True)),
+        ('API: CleaningWeeks of a week range',
+         CleaningWeekFilter({'week__range': week_range}, queryset=CleaningWeek.objects.all()).qs),
+        ('API: Assignments of a week range',
+         AssignmentFilter({'cleaning_week__week__range': week_range}, queryset=Assignment.objects.all()).qs),
+        ('API: open Tasks of a week range',
+         TaskFilter({'cleaning_week__week__range': week_range, 'cleaned_by__isnull': 'true'},
+                    queryset=Task.objects.all()).qs),
+    ]
+    if schedule:
+        catalogue += [
+            ('ScheduleView: CleaningWeeks', schedule.cleaningweek_set.with_listing_data()),
+            ('AssignmentPlanner: CleaningWeeks with invalid Assignments',
+             schedule.cleaningweek_set.filter(week__range=(week, week + 10)).assignments_invalid()),
+            ('ScheduleView: page of the current week', schedule.cleaningweek_set.filter(week__lt=week)),
+            ('Schedule.deployment_ratio_series(): Affiliations',
+             Affiliation.objects.of_schedule(schedule).filter(beginning__lte=week, end__gte=week - 30)),
+            ('Affiliation.objects.active_in_week_for_schedule()',
+             Affiliation.objects.active_in_week_for_schedule(week, schedule)),
+            ('Cleaner.objects.active() of a Schedule', Cleaner.objects.active(schedule=schedule)),
+            ('AssignmentLedger.objects.count_in_timespan()',
+             AssignmentLedger.objects.filter(schedule=schedule, cleaner__isnull=True, week__lte=week)),
+        ]
+    if cleaner:
+        catalogue += [
+            ('CleanerView: Assignments', cleaner.assignment_set.in_enabled_cleaning_weeks()),
+            ('Cleaner.current_affiliation()', cleaner.affiliation_set.filter(beginning__lte=week, end__gte=week)),
+            ('DutySwitch.objects.acceptable_by()', DutySwitch.objects.acceptable_by(cleaner)),
+        ]
+    if cleaning_week:
+        catalogue += [
+            ('AssignmentTasksView: open Tasks', cleaning_week.task_set.filter(cleaned_by__isnull=True)),
+            ('CleaningWeek.assigned_cleaners(): Assignments', cleaning_week.assignment_set.all()),
+        ]
+    if assignment:
+        catalogue += [
+            ('DutySwitch.possible_acceptors_of_assignment()', DutySwitch.possible_acceptors_of_assignment(assignment)),
+        ]
+    return catalogue
+
+
+def partial_indexes() -> set:
+    """
+    :return: Names of the indexes with a condition. Scanning them only reads the rows which match the condition.
+    """
+    return set(index.name for model in apps.get_app_config('webinterface').get_models()
+               for index in model._meta.indexes if index.condition is not None)
+
+
+def full_scans(plan: str) -> list:
+    """
+    :return: The tables the query plan reads in full, apart from SMALL_TABLES and scans of partial indexes
+    """
+    partial = partial_indexes()
+    scans = set()
+    for line in plan.splitlines():
+        index = re.search(r'USING (?:COVERING )?INDEX (\w+)', line)
+        if index and index.group(1) in partial:
+            continue
+        scans.update(x for x in SCAN_PATTERN.findall(line) if x not in SMALL_TABLES)
+    return sorted(scans)
+
+
+def explain_catalogue() -> list:
+    """
+    :return: List of (name, plan, full_scans) tuples for the queries of query_catalogue()
+    """
+    report = []
+    for name, queryset in query_catalogue():
+        plan = queryset.explain()
+        report.append((name, plan, full_scans(plan)))
+    return report
@@ -32,26 +32,31 @@ class ScheduleSerializer(HyperlinkedModelSerializer):
 class ScheduleGroupSerializer(HyperlinkedModelSerializer):
     class Meta:
         model = ScheduleGroup
-        fields = ['url', 'id', 'name', 'schedules', 'affiliation_set']
+        fields = ['url', 'id', 'name', 'schedules', 'affiliations']
         ref = api_view_reference()
         extra_kwargs = {
             'url': ref['schedulegroup'],
             'schedules': ref['schedule'],
-            'affiliation_set': ref['affiliation'],
         }
 
+    # The Affiliations of a ScheduleGroup pile up over the years, so they are a paginated sub-resource
+    affiliations = HyperlinkedIdentityField(view_name='webinterface:api:schedulegroup-affiliations',
+                                            lookup_field='slug')
+
 
 class CleanerSerializer(HyperlinkedModelSerializer):
     class Meta:
         model = Cleaner
-        fields = ['url', 'id', 'name', 'affiliation_set', 'assignment_set']
+        fields = ['url', 'id', 'name', 'affiliation_set', 'assignments']
         ref = api_view_reference()
         extra_kwargs = {
             'url': ref['cleaner'],
             'affiliation_set': ref['affiliation'],
-            'assignment_set': ref['assignment'],
         }
 
+    # The Assignments of a Cleaner pile up over the years, so they are a paginated sub-resource
+    assignments = HyperlinkedIdentityField(view_name='webinterface:api:cleaner-assignments', lookup_field='slug')
+
 
 class AffiliationSerializer(HyperlinkedModelSerializer):
     class Meta:
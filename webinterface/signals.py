@@ -1,6 +1,58 @@
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
 from webinterface.models import *
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_assignment_changes = ContextVar('assignment_changes', default=None)
+
+
+class AssignmentChanges:
+    """The CleaningWeeks of the Assignments which were saved or deleted inside batched_assignment_signals()"""
+    def __init__(self):
+        # {schedule_pk: {cleaning_week_pk}}
+        self.cleaning_weeks = {}
+
+    def add(self, schedule_pk: int, cleaning_week_pk: int) -> None:
+        self.cleaning_weeks.setdefault(schedule_pk, set()).add(cleaning_week_pk)
+
+    def apply(self) -> None:
+        """Does the work of assignment_changed() once for all changed Assignments"""
+        cleaning_week_pks = set().union(*self.cleaning_weeks.values())
+        weeks = dict(CleaningWeek.objects.filter(pk__in=cleaning_week_pks).values_list('pk', 'week'))
+        for schedule_pk, schedule_cleaning_week_pks in self.cleaning_weeks.items():
+            schedule_weeks = {weeks[x] for x in schedule_cleaning_week_pks if x in weeks}
+            if not schedule_cleaning_week_pks.issubset(weeks):
+                # Some CleaningWeeks were deleted along with their Assignments, which leaves ledger rows
+                # in weeks that no longer have a CleaningWeek
+                existing_weeks = CleaningWeek.objects.filter(schedule=schedule_pk).values('week')
+                schedule_weeks |= set(AssignmentLedger.objects.filter(schedule=schedule_pk).
+                                      exclude(week__in=existing_weeks).values_list('week', flat=True))
+            AssignmentLedger.objects.refresh(schedule=schedule_pk, weeks=schedule_weeks)
+        DutySwitchCandidate.objects.refresh_for_cleaning_weeks(CleaningWeek.objects.filter(pk__in=cleaning_week_pks))
+
+
+@contextmanager
+def batched_assignment_signals():
+    """
+    Defers the work of assignment_changed() for the Assignments saved or deleted inside the block and does it
+    once at its end. Meant for bulk changes like those of the AssignmentPlanner, where a queryset delete() would
+    otherwise refresh the AssignmentLedger and DutySwitchCandidates row by row.
+    Assignments written with bulk_create() send no signal and must be added to the yielded AssignmentChanges.
+    In nested blocks, the outermost block does the work.
+    """
+    changes = _assignment_changes.get()
+    if changes is not None:
+        yield changes
+        return
+
+    changes = AssignmentChanges()
+    token = _assignment_changes.set(changes)
+    try:
+        yield changes
+    finally:
+        _assignment_changes.reset(token)
+    changes.apply()
 
 
 @receiver(signal=m2m_changed, sender=ScheduleGroup.schedules.through)
@@ -8,11 +60,55 @@ def schedule_group_changed(instance, action, model, pk_set, **kwargs):
     if action == 'post_add' or action == 'post_remove':
         if model == Schedule:
             schedules = Schedule.objects.filter(pk__in=pk_set)
+            schedule_groups = [instance.pk]
         else:
             schedules = Schedule.objects.filter(pk=instance.pk)
-        if schedules.exists():
-            for schedule in schedules.all():
-                [x.set_assignments_valid_field(False) for x in schedule.cleaningweek_set.in_future()]
+            schedule_groups = pk_set
+        CleaningWeek.objects.filter(schedule__in=schedules).in_future().invalidate_assignments()
+        ScheduleMembership.objects.refresh_for_schedule_groups(schedule_groups)
+    elif action == 'post_clear':
+        if model == Schedule:
+            ScheduleMembership.objects.refresh_for_schedule_groups([instance.pk])
+        else:
+            ScheduleMembership.objects.filter(schedule=instance).delete()
+    return
+
+
+@receiver(signal=post_save, sender=Assignment)
+@receiver(signal=post_delete, sender=Assignment)
+def assignment_changed(instance, **kwargs):
+    changes = _assignment_changes.get()
+    if changes is not None:
+        changes.add(instance.schedule_id, instance.cleaning_week_id)
+        return
+
+    week = CleaningWeek.objects.filter(pk=instance.cleaning_week_id).values_list('week', flat=True).first()
+    if week is not None:
+        AssignmentLedger.objects.refresh(schedule=instance.schedule_id, weeks=[week])
+    DutySwitchCandidate.objects.refresh_for_cleaning_weeks(CleaningWeek.objects.filter(pk=instance.cleaning_week_id))
+
+
+@receiver(signal=m2m_changed, sender=DutySwitch.acceptor_weeks.through)
+def acceptor_weeks_changed(instance, action, reverse, pk_set, **kwargs):
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        if reverse:
+            DutySwitchCandidate.objects.refresh_for_cleaning_weeks(CleaningWeek.objects.filter(pk=instance.pk))
+        else:
+            DutySwitchCandidate.objects.refresh(DutySwitch.objects.filter(pk=instance.pk))
+    return
+
+
+@receiver(signal=m2m_changed, sender=CleaningWeek.excluded.through)
+def excluded_cleaners_changed(instance, action, reverse, pk_set, **kwargs):
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        if reverse:
+            if pk_set is None:
+                cleaning_weeks = CleaningWeek.objects.all()
+            else:
+                cleaning_weeks = CleaningWeek.objects.filter(pk__in=pk_set)
+        else:
+            cleaning_weeks = CleaningWeek.objects.filter(pk=instance.pk)
+        DutySwitchCandidate.objects.refresh_for_cleaning_weeks(cleaning_weeks)
     return
 
 
@@ -0,0 +1,157 @@
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.affiliation_import import AffiliationImport, parse_week
+from webinterface.epoch_calendar import frozen_epoch_week
+from webinterface.tests.unit_tests.fixtures import BaseFixture
+
+import io
+import json
+import os
+import tempfile
+from unittest.mock import *
+
+
+class AffiliationImportTest(BaseFixture, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.eve = Cleaner.objects.create(name="eve")
+        cls.frank = Cleaner.objects.create(name="frank")
+        cls.superuser = User.objects.create_superuser(username="admin", password="admin")
+
+    def test__parse_week(self):
+        self.assertEqual(parse_week(2500), 2500)
+        self.assertEqual(parse_week(" 2500 "), 2500)
+        self.assertEqual(parse_week(epoch_week_to_sunday(2500).isoformat()), 2500)
+        with self.assertRaises(ValidationError):
+            parse_week("next week")
+
+    def test__run(self):
+        rows = [{'cleaner': "eve", 'group': "upper", 'beginning': 2510, 'end': 2520},
+                {'cleaner': "Eve", 'group': "lower", 'beginning': 2521, 'end': 2530},
+                {'cleaner': "frank", 'group': "Upper",
+                 'beginning': epoch_week_to_monday(2510).isoformat(), 'end': "2515"}]
+        self.assertEqual(AffiliationImport(rows).run(), 3)
+
+        self.assertListEqual(list(self.eve.affiliation_set.order_by('beginning').values_list(
+            'group__name', 'beginning', 'end')), [("upper", 2510, 2520), ("lower", 2521, 2530)])
+        self.assertListEqual(list(self.frank.affiliation_set.values_list('group__name', 'beginning', 'end')),
+                             [("upper", 2510, 2515)])
+        self.assertEqual(ScheduleMembership.objects.filter(cleaner=self.eve).count(), 6)
+        self.assertIn(self.frank, Cleaner.objects.active(schedule=self.bathroom_schedule, week=2512))
+
+    def test__overlap_within_rows(self):
+        rows = [{'cleaner': "eve", 'group': "upper", 'beginning': 2510, 'end': 2530},
+                {'cleaner': "eve", 'group': "lower", 'beginning': 2515, 'end': 2518},
+                {'cleaner': "eve", 'group': "lower", 'beginning': 2525, 'end': 2540}]
+        affiliation_import = AffiliationImport(rows)
+        self.assertFalse(affiliation_import.validate())
+        self.assertListEqual(affiliation_import.errors,
+                             ["Zeile 2: Die Zugehörigkeit überlappt mit Zeile 1.",
+                              "Zeile 3: Die Zugehörigkeit überlappt mit Zeile 1."])
+        with self.assertRaises(ValidationError):
+            affiliation_import.run()
+        self.assertFalse(self.eve.affiliation_set.exists())
+
+    def test__overlap_with_existing_affiliation(self):
+        rows = [{'cleaner': "frank", 'group': "upper", 'beginning': 2490, 'end': 2499},
+                {'cleaner': "angie", 'group': "lower", 'beginning': self.end_week, 'end': self.end_week + 5}]
+        affiliation_import = AffiliationImport(rows)
+        self.assertFalse(affiliation_import.validate())
+        self.assertListEqual(affiliation_import.errors,
+                             ["Zeile 2: Die Zugehörigkeit überlappt mit einer vorhandenen Zugehörigkeit."])
+
+    def test__adjacent_affiliations(self):
+        rows = [{'cleaner': "angie", 'group': "lower", 'beginning': self.end_week + 1, 'end': self.end_week + 5},
+                {'cleaner': "angie", 'group': "upper", 'beginning': self.end_week + 6, 'end': self.end_week + 9}]
+        self.assertTrue(AffiliationImport(rows).validate())
+
+    def test__invalid_rows(self):
+        rows = [{'cleaner': "nobody", 'group': "upper", 'beginning': 2510, 'end': 2520},
+                {'cleaner': "eve", 'group': "attic", 'beginning': 2510, 'end': 2520},
+                {'cleaner': "eve", 'group': "upper", 'beginning': 2520, 'end': 2510},
+                {'cleaner': "eve", 'group': "upper", 'beginning': "soon", 'end': 2510},
+                {'cleaner': "eve", 'group': "upper", 'beginning': 2510}]
+        affiliation_import = AffiliationImport(rows)
+        self.assertFalse(affiliation_import.validate())
+        self.assertEqual([x.split(":")[0] for x in affiliation_import.errors],
+                         ["Zeile 1", "Zeile 2", "Zeile 3", "Zeile 4", "Zeile 5"])
+        self.assertFalse(AffiliationImport({'cleaner': "eve"}).validate())
+
+    def test__invalidates_affected_cleaning_weeks_once(self):
+        rows = [{'cleaner': "eve", 'group': "upper", 'beginning': self.start_week + 2, 'end': self.end_week + 5},
+                {'cleaner': "frank", 'group': "upper", 'beginning': self.start_week, 'end': self.start_week + 1}]
+        with frozen_epoch_week(self.start_week):
+            with patch.object(CleaningWeekQuerySet, 'invalidate_assignments', autospec=True,
+                              side_effect=CleaningWeekQuerySet.invalidate_assignments) as mock_invalidate:
+                AffiliationImport(rows).run()
+        self.assertEqual(mock_invalidate.call_count, 1)
+
+        # The current week and the garage Schedule, which only belongs to the lower ScheduleGroup, aren't affected
+        self.assertSetEqual(set(CleaningWeek.objects.filter(assignments_valid=False).values_list(
+            'schedule__name', 'week')), {("kitchen", 2502), ("bathroom", 2501), ("bathroom", 2502),
+                                         ("bathroom", 2503), ("bedroom", 2501), ("bedroom", 2503)})
+
+    def test__same_invalidation_as_save(self):
+        rows = [{'cleaner': "eve", 'group': "lower", 'beginning': self.start_week + 2, 'end': self.end_week + 5},
+                {'cleaner': "frank", 'group': "upper", 'beginning': self.start_week, 'end': self.start_week + 1}]
+        with frozen_epoch_week(self.start_week - 1):
+            AffiliationImport(rows).run()
+        imported = set(CleaningWeek.objects.filter(assignments_valid=False).values_list('pk', flat=True))
+
+        self.assertTrue(imported)
+
+        Affiliation.objects.filter(cleaner__in=[self.eve, self.frank]).delete()
+        CleaningWeek.objects.update(assignments_valid=True)
+        with frozen_epoch_week(self.start_week - 1):
+            for row in rows:
+                Affiliation.objects.create(cleaner=Cleaner.objects.get(name=row['cleaner']),
+                                           group=ScheduleGroup.objects.get(name=row['group']),
+                                           beginning=row['beginning'], end=row['end'])
+        self.assertSetEqual(imported, set(CleaningWeek.objects.filter(assignments_valid=False).
+                                          values_list('pk', flat=True)))
+
+    def test__from_csv_and_json(self):
+        csv_file = io.StringIO("cleaner,group,beginning,end\neve,upper,2510,2520\nfrank,lower,2020-01-06,2700\n")
+        json_file = io.StringIO(json.dumps([{'cleaner': "eve", 'group': "upper", 'beginning': 2510, 'end': 2520},
+                                            {'cleaner': "frank", 'group': "lower", 'beginning': "2020-01-06",
+                                             'end': 2700}]))
+        for affiliation_import in [AffiliationImport.from_csv(csv_file), AffiliationImport.from_json(json_file)]:
+            self.assertTrue(affiliation_import.validate())
+            self.assertListEqual([(x.cleaner, x.group, x.beginning, x.end) for x in affiliation_import.affiliations],
+                                 [(self.eve, self.upper_group, 2510, 2520),
+                                  (self.frank, self.lower_group, date_to_epoch_week(datetime.date(2020, 1, 6)),
+                                   2700)])
+
+    def test__command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "affiliations.csv")
+            with open(path, 'w') as file:
+                file.write("cleaner,group,beginning,end\neve,upper,2510,2520\n")
+
+            out = io.StringIO()
+            call_command('import_affiliations', path, '--dry-run', stdout=out)
+            self.assertIn("1 Affiliations can be imported", out.getvalue())
+            self.assertFalse(self.eve.affiliation_set.exists())
+
+            call_command('import_affiliations', path, stdout=out)
+            self.assertTrue(self.eve.affiliation_set.exists())
+
+            with self.assertRaisesMessage(CommandError, "Zeile 1"):
+                call_command('import_affiliations', path, stdout=out)
+
+    def test__api(self):
+        url = reverse('webinterface:api:affiliation-bulk-import')
+        rows = [{'cleaner': "eve", 'group': "upper", 'beginning': 2510, 'end': 2520}]
+        self.assertEqual(self.client.post(url, rows, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.superuser)
+        response = self.client.post(url, rows, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 1})
+
+        response = self.client.post(url, rows, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 1)
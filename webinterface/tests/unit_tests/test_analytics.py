@@ -0,0 +1,16 @@
+from django.test import TestCase
+from webinterface.models import *
+from webinterface.views import assignment_count_matrix
+from webinterface.tests.unit_tests.fixtures import BaseFixture
+
+
+class AnalyticsTest(BaseFixture, TestCase):
+    def test__assignment_count_matrix(self):
+        cleaners = list(Cleaner.objects.all())
+        weeks = list(range(self.start_week - 1, self.end_week + 2))
+        with self.assertNumQueries(1):
+            matrix = assignment_count_matrix(cleaners=cleaners, weeks=weeks)
+
+        for cleaner, row in zip(cleaners, matrix):
+            self.assertListEqual(row.tolist(), [cleaner.nr_assignments_in_week(week) for week in weeks])
+        self.assertEqual(sum(sum(row) for row in matrix), Assignment.objects.in_enabled_cleaning_weeks().count())
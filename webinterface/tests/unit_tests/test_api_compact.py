@@ -0,0 +1,54 @@
+from django.test import TestCase
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.api_compact import msgpack, MessagePackRenderer, columns
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithTasks
+
+import unittest
+
+
+class APICompactTest(BaseFixtureWithTasks, TestCase):
+    def test__columns(self):
+        self.assertDictEqual(columns([{'id': 1, 'week': 2500}, {'id': 2, 'week': 2501}], ('id', 'week')),
+                             {'id': [1, 2], 'week': [2500, 2501]})
+        self.assertDictEqual(columns([], ('id',)), {'id': []})
+
+    def test__compact_assignments(self):
+        url = reverse('webinterface:api:assignment-list')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'format': 'compact', 'page_size': 1000})
+        self.assertEqual(response['Content-Type'], 'application/vnd.cleansys.compact+json')
+        results = response.json()['results']
+        assignments = Assignment.objects.in_enabled_cleaning_weeks().order_by('cleaning_week__week', 'pk')
+        self.assertListEqual(results['id'], [x.pk for x in assignments])
+        self.assertListEqual(results['week'], [x.cleaning_week.week for x in assignments])
+        self.assertListEqual(results['schedule_id'], [x.schedule_id for x in assignments])
+        self.assertListEqual(results['cleaner_id'], [x.cleaner_id for x in assignments])
+
+    def test__compact_pages_follow_cursor(self):
+        url = reverse('webinterface:api:task-list') + "?format=compact&page_size=3"
+        ids = []
+        while url:
+            response = self.client.get(url).json()
+            self.assertLessEqual(len(response['results']['id']), 3)
+            ids += response['results']['id']
+            url = response['next']
+        self.assertListEqual(ids, list(Task.objects.order_by('cleaning_week__week', 'pk').values_list('pk', flat=True)))
+
+    def test__accept_header(self):
+        response = self.client.get(reverse('webinterface:api:cleaningweek-list'),
+                                   HTTP_ACCEPT='application/vnd.cleansys.compact+json')
+        self.assertSetEqual(set(response.json()['results'].keys()),
+                            {'id', 'week', 'schedule_id', 'assignments_valid', 'disabled'})
+
+    def test__default_format_unchanged(self):
+        response = self.client.get(reverse('webinterface:api:assignment-list'), HTTP_ACCEPT='application/json')
+        self.assertIsInstance(response.json()['results'], list)
+        self.assertIn('url', response.json()['results'][0])
+
+    @unittest.skipIf(msgpack is None, "msgpack is not installed")
+    def test__msgpack(self):
+        response = self.client.get(reverse('webinterface:api:schedule-list'), {'format': 'msgpack'})
+        self.assertEqual(response['Content-Type'], MessagePackRenderer.media_type)
+        data = msgpack.unpackb(response.content, raw=False)
+        self.assertListEqual(sorted(data['results']['slug']), sorted(Schedule.objects.values_list('slug', flat=True)))
@@ -0,0 +1,55 @@
+from django.test import TestCase
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithDutySwitch, BaseFixtureWithTasks
+
+
+class APIFiltersTest(BaseFixtureWithDutySwitch, BaseFixtureWithTasks, TestCase):
+    def get_ids(self, endpoint: str, params: dict) -> list:
+        response = self.client.get(reverse('webinterface:api:{}-list'.format(endpoint)),
+                                   {'format': 'compact', 'page_size': 1000, **params})
+        self.assertEqual(response.status_code, 200, msg=response.content)
+        return response.json()['results']['id']
+
+    def test__cleaning_week_range(self):
+        ids = self.get_ids('cleaningweek', {'week__range': '{},{}'.format(self.start_week + 1, self.start_week + 2),
+                                            'schedule': self.bathroom_schedule.pk})
+        self.assertListEqual(ids, list(self.bathroom_schedule.cleaningweek_set.filter(
+            week__range=(self.start_week + 1, self.start_week + 2)).values_list('pk', flat=True)))
+
+        CleaningWeek.objects.filter(week=self.start_week).update(disabled=True)
+        self.assertSetEqual(set(self.get_ids('cleaningweek', {'disabled': 'true'})),
+                            set(CleaningWeek.objects.filter(week=self.start_week).values_list('pk', flat=True)))
+        self.assertSetEqual(set(self.get_ids('cleaningweek', {'week__gte': self.end_week})),
+                            set(CleaningWeek.objects.filter(week=self.end_week).values_list('pk', flat=True)))
+
+    def test__assignment_range(self):
+        ids = self.get_ids('assignment', {'cleaning_week__week__range': '{},{}'.format(self.start_week,
+                                                                                      self.start_week + 1),
+                                          'cleaner': self.angie.pk})
+        self.assertSetEqual(set(ids), set(self.angie.assignment_set.filter(
+            cleaning_week__week__lte=self.start_week + 1).values_list('pk', flat=True)))
+        self.assertTrue(ids)
+
+        ids = self.get_ids('assignment', {'schedule': self.garage_schedule.pk})
+        self.assertSetEqual(set(ids), set(Assignment.objects.filter(schedule=self.garage_schedule).
+                                          values_list('pk', flat=True)))
+
+    def test__open_tasks(self):
+        ids = self.get_ids('task', {'cleaning_week__week__lte': self.start_week + 1, 'cleaned_by__isnull': 'true'})
+        self.assertSetEqual(set(ids), set(Task.objects.filter(cleaning_week__week__lte=self.start_week + 1,
+                                                              cleaned_by__isnull=True).values_list('pk', flat=True)))
+        self.assertTrue(ids)
+        self.assertSetEqual(set(self.get_ids('task', {'cleaned_by': self.angie.pk})),
+                            set(Task.objects.filter(cleaned_by=self.angie).values_list('pk', flat=True)))
+
+    def test__affiliations_and_dutyswitches(self):
+        ids = self.get_ids('affiliation', {'end__lte': self.mid_week})
+        self.assertSetEqual(set(ids), set(Affiliation.objects.filter(end__lte=self.mid_week).
+                                          values_list('pk', flat=True)))
+        ids = self.get_ids('dutyswitch', {'requester_assignment__cleaner': self.bob.pk})
+        self.assertSetEqual(set(ids), {self.bob_bedroom_dutyswitch_2503.pk, self.bob_garage_dutyswitch_2503.pk})
+
+    def test__invalid_filter(self):
+        response = self.client.get(reverse('webinterface:api:cleaningweek-list'), {'week__gte': 'soon'})
+        self.assertEqual(response.status_code, 400)
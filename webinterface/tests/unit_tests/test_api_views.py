@@ -0,0 +1,81 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.epoch_calendar import frozen_epoch_week
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithDutySwitch, BaseFixtureWithTasks
+
+
+class APIViewsTest(BaseFixtureWithDutySwitch, BaseFixtureWithTasks, TestCase):
+    list_endpoints = ['schedule', 'schedulegroup', 'cleaner', 'affiliation', 'cleaningweek', 'assignment',
+                      'tasktemplate', 'task', 'dutyswitch']
+
+    def get_pages(self, url: str) -> list:
+        """
+        :return: List of the results and the number of queries of each page, following the next links
+        """
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, msg=url)
+            pages.append((response.json()['results'], len(queries.captured_queries)))
+            url = response.json()['next']
+        return pages
+
+    def test__query_count_independent_of_rows(self):
+        nr_queries = {}
+        for endpoint in self.list_endpoints:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('webinterface:api:{}-list'.format(endpoint)))
+            self.assertEqual(response.status_code, 200, msg=endpoint)
+            nr_queries[endpoint] = len(queries.captured_queries)
+            # The page and one query per prefetched relation
+            self.assertLessEqual(nr_queries[endpoint], 4, msg=endpoint)
+
+        # More rows on each page and more related rows don't cost more queries
+        eve = Cleaner.objects.create(name="eve")
+        Affiliation.objects.create(cleaner=eve, group=self.upper_group, beginning=self.start_week, end=self.end_week)
+        for schedule in Schedule.objects.all():
+            schedule.create_assignments_over_timespan(self.end_week + 1, self.end_week + 8)
+            template = schedule.tasktemplate_set.create(name="extra", start_days_before=1, end_days_after=1)
+            for cleaning_week in schedule.cleaningweek_set.all():
+                cleaning_week.task_set.create(template=template)
+        for endpoint in self.list_endpoints:
+            with self.assertNumQueries(nr_queries[endpoint]):
+                self.client.get(reverse('webinterface:api:{}-list'.format(endpoint)))
+
+    def test__cursor_pagination_in_week_order(self):
+        pages = self.get_pages(reverse('webinterface:api:assignment-list'))
+        self.assertGreater(len(pages), 1)
+        self.assertEqual(len(set(x[1] for x in pages)), 1)
+        ids = [y['id'] for x in pages for y in x[0]]
+        self.assertListEqual(ids, list(Assignment.objects.in_enabled_cleaning_weeks().
+                                       order_by('cleaning_week__week', 'pk').values_list('pk', flat=True)))
+
+        pages = self.get_pages(reverse('webinterface:api:cleaningweek-list'))
+        weeks = [y['week'] for x in pages for y in x[0]]
+        self.assertListEqual(weeks, sorted(weeks))
+        self.assertEqual(len(weeks), CleaningWeek.objects.count())
+
+    def test__cleaner_assignments_sub_resource(self):
+        with frozen_epoch_week(self.start_week):
+            response = self.client.get(reverse('webinterface:api:cleaner-detail', kwargs={'slug': self.angie.slug}))
+        self.assertNotIn('assignment_set', response.json())
+        url = reverse('webinterface:api:cleaner-assignments', kwargs={'slug': self.angie.slug})
+        self.assertTrue(response.json()['assignments'].endswith(url))
+
+        pages = self.get_pages(url)
+        self.assertListEqual([y['id'] for x in pages for y in x[0]],
+                             list(self.angie.assignment_set.order_by('cleaning_week__week', 'pk').
+                                  values_list('pk', flat=True)))
+
+    def test__schedulegroup_affiliations_sub_resource(self):
+        response = self.client.get(reverse('webinterface:api:schedulegroup-detail',
+                                           kwargs={'slug': self.upper_group.slug}))
+        self.assertNotIn('affiliation_set', response.json())
+        pages = self.get_pages(response.json()['affiliations'])
+        self.assertListEqual([y['id'] for x in pages for y in x[0]],
+                             list(self.upper_group.affiliation_set.order_by('beginning', 'pk').
+                                  values_list('pk', flat=True)))
@@ -0,0 +1,118 @@
+from django.test import TestCase
+from django.db import transaction
+from webinterface.models import *
+from webinterface.assignment_planner import AssignmentPlanner
+
+from unittest.mock import *
+
+
+class Rollback(Exception):
+    pass
+
+
+class AssignmentPlannerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.start_week = 2500
+        cls.end_week = 2520
+
+        cls.kitchen = Schedule.objects.create(name="kitchen", cleaners_per_date=2, frequency=1)
+        cls.bathroom = Schedule.objects.create(name="bathroom", cleaners_per_date=1, frequency=2)
+        cls.group = ScheduleGroup.objects.create(name="group")
+        cls.group.schedules.add(cls.kitchen, cls.bathroom)
+        cls.other_group = ScheduleGroup.objects.create(name="other_group")
+        cls.other_group.schedules.add(cls.kitchen)
+
+        TaskTemplate.objects.create(name="task", start_days_before=1, end_days_after=1, schedule=cls.kitchen)
+
+        cls.cleaners = [Cleaner.objects.create(name="cleaner{}".format(i)) for i in range(5)]
+        for i, cleaner in enumerate(cls.cleaners):
+            Affiliation.objects.create(cleaner=cleaner, group=cls.group,
+                                       beginning=cls.start_week - 4 + 2 * i, end=cls.start_week + 10 + i)
+        Affiliation.objects.create(cleaner=cls.cleaners[0], group=cls.other_group,
+                                   beginning=cls.start_week + 11, end=cls.end_week + 5)
+
+        for week in range(cls.start_week - 4, cls.start_week + 4):
+            cleaning_week = cls.kitchen.cleaningweek_set.create(week=week, assignments_valid=week != cls.start_week+2)
+            cls.kitchen.assignment_set.create(cleaner=cls.cleaners[week % 2], cleaning_week=cleaning_week)
+
+        cls.kitchen.cleaningweek_set.get(week=cls.start_week + 3).excluded.add(*cls.cleaners[2:4])
+        cls.kitchen.cleaningweek_set.create(week=cls.start_week + 5, disabled=True, assignments_valid=True)
+        cls.bathroom.cleaningweek_set.create(week=cls.start_week + 1, assignments_valid=True)
+
+    def create_assignments(self, in_memory: bool, seed: int) -> list:
+        random.seed(seed)
+        for schedule in [self.kitchen, self.bathroom]:
+            schedule.create_assignments_over_timespan(self.start_week, self.end_week, in_memory=in_memory)
+        return list(Assignment.objects.order_by('schedule__name', 'cleaning_week__week', 'pk').
+                    values_list('schedule__name', 'cleaning_week__week', 'cleaner__name'))
+
+    def test__same_assignments_as_create_assignment(self):
+        for seed in range(5):
+            try:
+                with transaction.atomic():
+                    expected = self.create_assignments(in_memory=False, seed=seed)
+                    raise Rollback
+            except Rollback:
+                pass
+
+            with transaction.atomic():
+                self.assertListEqual(self.create_assignments(in_memory=True, seed=seed), expected)
+                transaction.set_rollback(True)
+
+    def test__cleaning_weeks_and_tasks(self):
+        AssignmentPlanner(self.kitchen, self.start_week, self.end_week).run()
+        cleaning_weeks = self.kitchen.cleaningweek_set.filter(week__range=(self.start_week, self.end_week))
+        self.assertEqual(cleaning_weeks.count(), self.end_week - self.start_week + 1)
+        self.assertFalse(cleaning_weeks.assignments_invalid().exists())
+        self.assertFalse(any(x.task_templates_missing().exists() for x in cleaning_weeks))
+
+        AssignmentPlanner(self.bathroom, self.start_week, self.end_week).run()
+        self.assertFalse(self.bathroom.cleaningweek_set.filter(week=self.start_week + 1).exists())
+
+    def test__disabled_schedule(self):
+        kitchen = Schedule.objects.get(pk=self.kitchen.pk)
+        kitchen.disabled = True
+        self.assertListEqual(AssignmentPlanner(kitchen, self.start_week, self.end_week).run(), [])
+
+    def test__signal_work_is_done_once(self):
+        # The Assignment of the invalid CleaningWeek start_week+2 is deleted row by row by the cascade
+        original_refresh = AssignmentLedgerQuerySet.refresh
+        with patch.object(AssignmentLedgerQuerySet, 'refresh', autospec=True, side_effect=original_refresh) as \
+                mock_refresh, patch.object(DutySwitchCandidateQuerySet, 'refresh_for_cleaning_weeks',
+                                           autospec=True) as mock_candidates:
+            AssignmentPlanner(self.kitchen, self.start_week, self.end_week).run()
+        mock_refresh.assert_called_once()
+        mock_candidates.assert_called_once()
+
+        state = sorted(AssignmentLedger.objects.values_list('schedule', 'cleaner', 'week', 'count', 'cumulative'),
+                       key=lambda x: (x[0], x[1] or 0, x[2]))
+        AssignmentLedger.objects.rebuild()
+        self.assertListEqual(state, sorted(AssignmentLedger.objects.values_list(
+            'schedule', 'cleaner', 'week', 'count', 'cumulative'), key=lambda x: (x[0], x[1] or 0, x[2])))
+
+    def test__cleaner_week_counts_across_weekdays(self):
+        # Django adds Meta.ordering of Assignment (which includes the weekday) to the GROUP BY of grouped queries,
+        # which must not split the count of a Cleaner with Assignments on different weekdays of one week
+        week = self.start_week
+        garage = Schedule.objects.create(name="garage", cleaners_per_date=1, frequency=1,
+                                         weekday=(self.kitchen.weekday + 3) % 7)
+        garage.assignment_set.create(cleaner=self.cleaners[week % 2],
+                                     cleaning_week=garage.cleaningweek_set.create(week=week))
+
+        planner = AssignmentPlanner(self.kitchen, week, week)
+        planner.load_counts()
+        self.assertEqual(planner.cleaner_week_counts[week][self.cleaners[week % 2].pk], 2)
+
+        self.group.schedules.add(garage)
+        for seed in range(5):
+            try:
+                with transaction.atomic():
+                    expected = self.create_assignments(in_memory=False, seed=seed)
+                    raise Rollback
+            except Rollback:
+                pass
+
+            with transaction.atomic():
+                self.assertListEqual(self.create_assignments(in_memory=True, seed=seed), expected)
+                transaction.set_rollback(True)
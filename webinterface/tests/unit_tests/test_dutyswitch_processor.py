@@ -0,0 +1,116 @@
+from django.test import TestCase
+from webinterface.models import *
+from webinterface.dutyswitch_processor import DutySwitchProcessor
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithDutySwitch
+
+from unittest.mock import *
+
+
+class DutySwitchProcessorTest(BaseFixtureWithDutySwitch, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User.objects.create_superuser(username="admin", password="admin", email="admin@cleansys.headquarters")
+        cls.today = epoch_week_to_monday(cls.start_week)
+        DutySwitch.objects.update(created=cls.today - datetime.timedelta(days=10))
+
+    def setUp(self) -> None:
+        patcher = patch('webinterface.models.timezone.now', autospec=True,
+                        return_value=timezone.make_aware(datetime.datetime.combine(self.today, datetime.time(12))))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test__propose(self):
+        expected_choices = {x.pk: set(x.possible_acceptors()) for x in DutySwitch.objects.open()}
+
+        self.assertEqual(DutySwitchProcessor().run(), (4, 0))
+
+        proposed = [x.proposed_acceptor for x in DutySwitch.objects.open()]
+        self.assertEqual(len(proposed), len(set(proposed)))
+        for dutyswitch in DutySwitch.objects.open():
+            self.assertIn(dutyswitch.proposed_acceptor, expected_choices[dutyswitch.pk])
+            self.assertEqual(dutyswitch.execute_proposal,
+                             self.today + datetime.timedelta(days=DutySwitch.PROPOSAL_OBJECTION_DAYS))
+        self.assertEqual(QueuedEmail.objects.count(), 4)
+
+    def test__propose__query_count_doesnt_grow_with_dutyswitches(self):
+        with self.assertNumQueries(7):
+            DutySwitchProcessor().propose()
+
+    def test__propose__too_young(self):
+        self.assertEqual(DutySwitchProcessor(days_until_proposal=10).run(), (0, 0))
+        self.assertFalse(DutySwitch.objects.filter(proposed_acceptor__isnull=False).exists())
+
+    def test__propose__dont_propose(self):
+        dutyswitch = DutySwitch.objects.get(pk=self.dave_garage_dutyswitch_2500.pk)
+        dutyswitch.dont_propose.add(*dutyswitch.possible_acceptors())
+        DutySwitchProcessor().run()
+        self.assertIsNone(DutySwitch.objects.get(pk=dutyswitch.pk).proposed_acceptor)
+
+    def test__propose__no_conflicts(self):
+        garage = {x.cleaning_week.week: x for x in self.garage_schedule.assignment_set.all()}
+        chris_assignment = Assignment.objects.create(
+            cleaner=self.chris, schedule=self.garage_schedule, cleaning_week=garage[self.start_week+3].cleaning_week)
+        other_dutyswitch = DutySwitch.objects.create(requester_assignment=chris_assignment)
+        other_dutyswitch.acceptor_weeks.set(self.garage_schedule.cleaningweek_set.all())
+        DutySwitch.objects.filter(pk=other_dutyswitch.pk).update(created=self.today - datetime.timedelta(days=10))
+
+        # Both DutySwitches can only be accepted with dave's garage duty in start_week
+        other_dutyswitch.dont_propose.add(garage[self.start_week+1], garage[self.start_week+2],
+                                          garage[self.start_week+3])
+        self.bob_garage_dutyswitch_2503.dont_propose.add(garage[self.start_week+1], garage[self.start_week+2],
+                                                         chris_assignment)
+
+        DutySwitchProcessor().run()
+        proposals = [DutySwitch.objects.get(pk=x.pk).proposed_acceptor
+                     for x in [other_dutyswitch, self.bob_garage_dutyswitch_2503]]
+        self.assertIn(None, proposals)
+        self.assertIn(garage[self.start_week], proposals)
+
+    def test__propose__same_deadline_as_set_new_proposal(self):
+        deadline = self.today + datetime.timedelta(days=5)
+        with patch.object(DutySwitch, 'PROPOSAL_OBJECTION_DAYS', 5):
+            dutyswitch = DutySwitch.objects.open().first()
+            self.assertIsNotNone(dutyswitch.set_new_proposal())
+            self.assertEqual(DutySwitch.objects.get(pk=dutyswitch.pk).execute_proposal, deadline)
+
+            self.assertGreater(DutySwitchProcessor().run()[0], 0)
+            self.assertSetEqual(set(DutySwitch.objects.open().filter(proposed_acceptor__isnull=False).
+                                    values_list('execute_proposal', flat=True)), {deadline})
+
+    def test__propose__already_proposed_assignment_is_taken(self):
+        garage_2503 = self.garage_schedule.assignment_set.get(cleaning_week__week=self.start_week+3)
+        DutySwitch.objects.filter(pk=self.bob_garage_dutyswitch_2503.pk).update(
+            proposed_acceptor=garage_2503, execute_proposal=self.today)
+        DutySwitchProcessor().run()
+        # garage_2503 is the only possible acceptor of dave's DutySwitch
+        self.assertIsNone(DutySwitch.objects.get(pk=self.dave_garage_dutyswitch_2500.pk).proposed_acceptor)
+
+    def test__execute(self):
+        requester = self.dave_garage_dutyswitch_2500.requester_assignment
+        acceptor = self.garage_schedule.assignment_set.get(cleaning_week__week=self.start_week+3)
+        DutySwitch.objects.filter(pk=self.dave_garage_dutyswitch_2500.pk).update(
+            proposed_acceptor=acceptor, execute_proposal=self.today - datetime.timedelta(days=3))
+
+        self.assertEqual(DutySwitchProcessor().execute(), 1)
+        self.assertEqual(Assignment.objects.get(pk=requester.pk).cleaner, self.bob)
+        self.assertEqual(Assignment.objects.get(pk=acceptor.pk).cleaner, self.dave)
+        self.assertFalse(DutySwitch.objects.filter(pk=self.dave_garage_dutyswitch_2500.pk).exists())
+
+    def test__execute__not_yet(self):
+        acceptor = self.garage_schedule.assignment_set.get(cleaning_week__week=self.start_week+3)
+        DutySwitch.objects.filter(pk=self.dave_garage_dutyswitch_2500.pk).update(
+            proposed_acceptor=acceptor, execute_proposal=self.today - datetime.timedelta(days=2))
+        self.assertEqual(DutySwitchProcessor().execute(), 0)
+
+    def test__execute__same_assignment_twice(self):
+        acceptor = self.garage_schedule.assignment_set.get(cleaning_week__week=self.start_week+1)
+        execute_proposal = self.today - datetime.timedelta(days=3)
+        DutySwitch.objects.filter(pk__in=[self.dave_garage_dutyswitch_2500.pk, self.bob_garage_dutyswitch_2503.pk]).\
+            update(proposed_acceptor=acceptor, execute_proposal=execute_proposal)
+
+        self.assertEqual(DutySwitchProcessor().execute(), 1)
+        remaining = DutySwitch.objects.filter(
+            pk__in=[self.dave_garage_dutyswitch_2500.pk, self.bob_garage_dutyswitch_2503.pk])
+        self.assertEqual(remaining.count(), 1)
+        self.assertIsNone(remaining.get().proposed_acceptor)
@@ -0,0 +1,149 @@
+from django.test import TestCase
+from django.core import mail
+from webinterface.models import *
+from webinterface.email_sending import send_email__assignment_coming_up, deliver_queued_emails, queue_emails, \
+    create_email_message, send_messages_in_batches
+from django.core.management import call_command
+from io import StringIO
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithTasks
+
+from unittest.mock import *
+
+
+class EmailSendingTest(BaseFixtureWithTasks, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User.objects.create_superuser(username="admin", password="admin", email="admin@cleansys.headquarters")
+        for cleaner in [cls.angie, cls.bob, cls.chris, cls.dave]:
+            cleaner.user.email = "{}@cleansys.headquarters".format(cleaner.name)
+            cleaner.user.save()
+        cls.kitchen_schedule.assignment_set.create(
+            cleaner=cls.angie, cleaning_week=cls.kitchen_schedule.cleaningweek_set.get(week=cls.start_week))
+
+    def send_on_date(self, date: datetime.date, **kwargs):
+        with patch('webinterface.email_sending.timezone.now', autospec=True) as mock_now:
+            mock_now.return_value = timezone.make_aware(datetime.datetime.combine(date, datetime.time(hour=12)))
+            return send_email__assignment_coming_up(**kwargs)
+
+    def test__assignment_coming_up(self):
+        assignment_date = self.kitchen_schedule.cleaningweek_set.get(week=self.start_week).assignment_date()
+        with self.assertNumQueries(5):
+            queued = self.send_on_date(assignment_date - datetime.timedelta(days=5), notify_days_before=5)
+        self.assertEqual(queued, 2)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(deliver_queued_emails(), (2, 0))
+        self.assertSetEqual(set(x.to[0] for x in mail.outbox),
+                            {"angie@cleansys.headquarters", "bob@cleansys.headquarters"})
+        bobs_mail = next(x for x in mail.outbox if x.to[0] == "bob@cleansys.headquarters")
+        self.assertIn("**angie**", bobs_mail.body)
+        self.assertEqual(bobs_mail.reply_to, ["admin@cleansys.headquarters"])
+        self.assertEqual(bobs_mail.alternatives[0][1], "text/html")
+
+    def test__assignment_coming_up__email_pref(self):
+        Cleaner.objects.filter(pk=self.bob.pk).update(email_pref_assignment_coming_up=False)
+        assignment_date = self.kitchen_schedule.cleaningweek_set.get(week=self.start_week).assignment_date()
+        self.assertEqual(self.send_on_date(assignment_date - datetime.timedelta(days=5)), 1)
+
+    def test__assignment_coming_up__tasks_are_listed(self):
+        assignment_date = self.bathroom_schedule.cleaningweek_set.get(week=self.start_week).assignment_date()
+        self.assertEqual(self.send_on_date(assignment_date - datetime.timedelta(days=2), notify_days_before=2), 1)
+        self.assertIn("bathroom_task_1", QueuedEmail.objects.get().body)
+        self.assertIn("bathroom_task_2", QueuedEmail.objects.get().body)
+
+    def queue(self, nr_emails):
+        queue_emails([create_email_message(subject=str(i), rendered_markdown="Hi", to="x@cleansys.headquarters")
+                      for i in range(nr_emails)])
+
+    def test__deliver_queued_emails(self):
+        self.queue(5)
+        self.assertEqual(deliver_queued_emails(batch_size=2, nr_workers=2), (5, 0))
+        self.assertListEqual(sorted(x.subject for x in mail.outbox), ["0", "1", "2", "3", "4"])
+        self.assertFalse(QueuedEmail.objects.pending().filter(sent__isnull=True).exists())
+        self.assertEqual(deliver_queued_emails(), (0, 0))
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test__deliver_queued_emails__retry_with_backoff(self):
+        self.queue(3)
+        original_send = mail.get_connection().send_messages.__func__
+
+        def fail_subject_1(connection, messages):
+            if messages[0].subject == "1":
+                raise Exception("SMTP error")
+            return original_send(connection, messages)
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', autospec=True) as mock_send:
+            mock_send.side_effect = fail_subject_1
+            with patch('webinterface.email_sending.logging', autospec=True):
+                self.assertEqual(deliver_queued_emails(batch_size=2), (2, 1))
+
+        failed = QueuedEmail.objects.get(subject="1")
+        self.assertIsNone(failed.sent)
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn("SMTP error", failed.last_error)
+        self.assertAlmostEqual(failed.next_attempt - timezone.now(), datetime.timedelta(minutes=5),
+                               delta=datetime.timedelta(seconds=10))
+
+        # The failed email isn't due yet
+        self.assertEqual(deliver_queued_emails(), (0, 0))
+
+        QueuedEmail.objects.filter(pk=failed.pk).update(next_attempt=timezone.now())
+        self.assertEqual(deliver_queued_emails(), (1, 0))
+        self.assertListEqual(sorted(x.subject for x in mail.outbox), ["0", "1", "2"])
+
+    def test__deliver_queued_emails__gives_up(self):
+        self.queue(1)
+        QueuedEmail.objects.update(attempts=QueuedEmail.MAX_ATTEMPTS)
+        self.assertEqual(deliver_queued_emails(), (0, 0))
+        self.assertEqual(QueuedEmail.objects.failed().count(), 1)
+
+    def test__send_messages_in_batches(self):
+        outbox = [create_email_message(subject=str(i), rendered_markdown="Hi", to="x@cleansys.headquarters")
+                  for i in range(5)]
+        batches = []
+        self.assertEqual(send_messages_in_batches(outbox, batch_size=2,
+                                                  on_batch_sent=lambda *args: batches.append(args)), (5, 0))
+        self.assertListEqual([(len(batch), nr_sent, error) for batch, nr_sent, error in batches],
+                             [(2, 2, None), (2, 2, None), (1, 1, None)])
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test__deliver_queued_emails__display_names(self):
+        queue_emails([mail.EmailMessage(subject="subject", body="body", from_email="CleanSys <cleansys@x.de>",
+                                        to=["Max Mustermann <max@x.de>", "erika@x.de"],
+                                        reply_to=["Der Admin <admin@x.de>"])])
+        self.assertEqual(str(QueuedEmail.objects.get()),
+                         "subject to Max Mustermann <max@x.de>, erika@x.de (queued)")
+        self.assertEqual(deliver_queued_emails(), (1, 0))
+        self.assertListEqual(mail.outbox[0].to, ["Max Mustermann <max@x.de>", "erika@x.de"])
+        self.assertListEqual(mail.outbox[0].bcc, [])
+        self.assertListEqual(mail.outbox[0].reply_to, ["Der Admin <admin@x.de>"])
+
+    def test__send_queued_emails__deletes_old_sent_emails(self):
+        self.queue(3)
+        deliver_queued_emails()
+        QueuedEmail.objects.filter(subject="0").update(
+            sent=timezone.now() - datetime.timedelta(days=QueuedEmail.KEEP_SENT_DAYS + 1))
+        QueuedEmail.objects.filter(subject="1").update(
+            sent=None, attempts=QueuedEmail.MAX_ATTEMPTS,
+            created=timezone.now() - datetime.timedelta(days=QueuedEmail.KEEP_SENT_DAYS + 1))
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertListEqual(sorted(QueuedEmail.objects.values_list('subject', flat=True)), ["1", "2"])
+
+    def test__claim__skips_claimed_emails(self):
+        self.queue(3)
+        self.assertEqual(len(QueuedEmail.objects.claim(limit=2)), 2)
+        self.assertEqual(len(QueuedEmail.objects.claim(limit=2)), 1)
+        self.assertEqual(len(QueuedEmail.objects.claim(limit=2)), 0)
+
+    def test__dutyswitch_complete_is_queued(self):
+        requester = Assignment.objects.get(cleaner=self.angie, cleaning_week__week=self.start_week,
+                                           schedule=self.kitchen_schedule)
+        acceptor = self.kitchen_schedule.assignment_set.exclude(cleaner=self.angie).\
+            exclude(cleaning_week__week=self.start_week).first()
+        dutyswitch = DutySwitch.objects.create(requester_assignment=requester)
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', autospec=True) as mock_send:
+            dutyswitch.acceptor_assignment = acceptor
+            dutyswitch.save()
+        mock_send.assert_not_called()
+        self.assertEqual(QueuedEmail.objects.pending().count(), 2)
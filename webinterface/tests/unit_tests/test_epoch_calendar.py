@@ -0,0 +1,107 @@
+from django.test import TestCase, RequestFactory
+from webinterface.epoch_calendar import *
+
+import calendar
+import random
+import time
+from unittest.mock import *
+
+
+# The conversions as they were implemented before the epoch_calendar module
+def legacy_date_to_epoch_week(date: datetime.date) -> int:
+    epoch_seconds = calendar.timegm(date.timetuple())
+    return int(((epoch_seconds / 60 / 60 / 24) + 3) / 7)
+
+
+def legacy_epoch_week_to_monday(week: int) -> datetime.date:
+    epoch_seconds = ((week * 7) - 3) * 24 * 60 * 60
+    return datetime.date.fromtimestamp(time.mktime(time.gmtime(epoch_seconds)))
+
+
+def legacy_epoch_week_to_sunday(week: int) -> datetime.date:
+    epoch_seconds = ((week * 7) + 3) * 24 * 60 * 60
+    return datetime.date.fromtimestamp(time.mktime(time.gmtime(epoch_seconds)))
+
+
+class EpochCalendarTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.random = random.Random(1234)
+        # The legacy functions truncate instead of flooring, so they only agree from epoch week 0 onwards
+        cls.first_day = datetime.date(1969, 12, 29)
+        cls.weeks = [0, 1, 2500, 2600] + [cls.random.randrange(0, 5000) for _ in range(500)]
+        cls.dates = [cls.first_day + datetime.timedelta(days=cls.random.randrange(0, 35000)) for _ in range(2000)]
+
+    def test__date_to_epoch_week__agrees_with_legacy(self):
+        for date in self.dates:
+            self.assertEqual(date_to_epoch_week(date), legacy_date_to_epoch_week(date), msg=str(date))
+
+    def test__epoch_week_to_monday_and_sunday__agree_with_legacy(self):
+        for week in self.weeks:
+            self.assertEqual(epoch_week_to_monday(week), legacy_epoch_week_to_monday(week), msg=str(week))
+            self.assertEqual(epoch_week_to_sunday(week), legacy_epoch_week_to_sunday(week), msg=str(week))
+
+    def test__round_trip(self):
+        for week in self.weeks:
+            for weekday in range(7):
+                date = epoch_week_to_date(week, weekday)
+                self.assertEqual(date.weekday(), weekday)
+                self.assertEqual(date_to_epoch_week(date), week)
+
+        for date in self.dates:
+            week = date_to_epoch_week(date)
+            self.assertEqual(epoch_week_to_date(week, date.weekday()), date)
+
+    def test__date_to_epoch_day(self):
+        for date in self.dates:
+            self.assertEqual(date_to_epoch_day(date), (date - datetime.date(1970, 1, 1)).days)
+            self.assertEqual(date_to_epoch_day(epoch_week_to_monday(date_to_epoch_week(date))),
+                             7 * date_to_epoch_week(date) - 3)
+
+    def test__dates_before_week_zero(self):
+        self.assertEqual(date_to_epoch_week(datetime.date(1969, 12, 28)), -1)
+        self.assertEqual(epoch_week_to_monday(-1), datetime.date(1969, 12, 22))
+
+    def test__epoch_weeks_to_dates(self):
+        weeks = self.random.sample(self.weeks, 20)
+        self.assertListEqual(epoch_weeks_to_dates(weeks, weekday=6), [legacy_epoch_week_to_sunday(x) for x in weeks])
+
+    def test__epoch_week_range_to_dates(self):
+        for weekday in range(7):
+            self.assertListEqual(epoch_week_range_to_dates(2500, 2510, weekday=weekday),
+                                 [epoch_week_to_date(x, weekday) for x in range(2500, 2511)])
+        self.assertListEqual(epoch_week_range_to_dates(2500, 2499), [])
+
+    def test__epoch_week_range_to_days(self):
+        days = epoch_week_range_to_days(2500, 2502)
+        self.assertEqual(len(days), 21)
+        self.assertEqual(days[0], epoch_week_to_monday(2500))
+        self.assertEqual(days[-1], epoch_week_to_sunday(2502))
+        self.assertTrue(all(b - a == datetime.timedelta(days=1) for a, b in zip(days, days[1:])))
+
+    @patch('webinterface.epoch_calendar.datetime', wraps=datetime)
+    def test__current_epoch_week(self, mock_datetime):
+        mock_datetime.date.today.return_value = epoch_week_to_sunday(2500)
+        self.assertEqual(current_epoch_week(), 2500)
+
+        with frozen_epoch_week() as week:
+            self.assertEqual(week, 2500)
+            mock_datetime.date.today.return_value = epoch_week_to_monday(2501)
+            self.assertEqual(current_epoch_week(), 2500)
+        self.assertEqual(current_epoch_week(), 2501)
+
+        with frozen_epoch_week(2400):
+            self.assertEqual(current_epoch_week(), 2400)
+
+    @patch('webinterface.epoch_calendar.datetime', wraps=datetime)
+    def test__middleware(self, mock_datetime):
+        mock_datetime.date.today.return_value = epoch_week_to_sunday(2500)
+
+        def get_response(request):
+            # Midnight passes while the request is handled
+            mock_datetime.date.today.return_value = epoch_week_to_monday(2501)
+            return current_epoch_week()
+
+        self.assertEqual(CurrentEpochWeekMiddleware(get_response)(RequestFactory().get('/')), 2500)
+        self.assertEqual(current_epoch_week(), 2501)
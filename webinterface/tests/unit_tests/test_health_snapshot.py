@@ -0,0 +1,77 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.health_snapshot import HealthSnapshot
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithTasks
+
+from unittest.mock import *
+
+
+class HealthSnapshotTest(BaseFixtureWithTasks, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.eve = Cleaner.objects.create(name="eve")
+        cls.superuser = User.objects.create_superuser(username="admin", password="admin")
+
+    def test__same_as_model_methods(self):
+        for week in [self.start_week - 10, self.start_week, self.mid_week, self.end_week, self.end_week + 5]:
+            with patch('webinterface.models.current_epoch_week', autospec=True) as mock_current_epoch_week:
+                mock_current_epoch_week.return_value = week
+                snapshot = HealthSnapshot(week=week)
+
+                for schedule in snapshot.schedules:
+                    health = schedule.health
+                    self.assertEqual(health['templates_exist'], schedule.tasktemplate_set.exists())
+                    self.assertEqual(health['assignments_exist'], schedule.assignment_set.exists())
+                    self.assertEqual(health['groups_exist'], schedule.schedulegroup_set.exists())
+                    self.assertEqual(health['some_assignments_invalid'],
+                                     schedule.cleaningweek_set.assignments_invalid().exists())
+                    self.assertEqual(health['assignments_running_out'], schedule.assignments_are_running_out())
+                    self.assertEqual(health['nr_task_templates'], schedule.tasktemplate_set.count())
+                    self.assertEqual(health['nr_active_affiliations'],
+                                     schedule.currently_active_affiliations().count())
+                    if schedule.assignment_set.exists():
+                        self.assertEqual(health['last_assignment_date'],
+                                         schedule.assignment_set.last().assignment_date())
+
+                for cleaner in snapshot.cleaners:
+                    health = cleaner.health
+                    self.assertEqual(health['current_affiliation'], cleaner.current_affiliation())
+                    self.assertEqual(health['last_affiliation'], cleaner.affiliation_set.last())
+                    self.assertEqual(health['homeless_soon'], cleaner.is_homeless_soon())
+
+    def test__action_needed(self):
+        snapshot = HealthSnapshot(week=self.start_week - 10)
+        self.assertListEqual(snapshot.active_schedules, [self.bathroom_schedule])
+        self.assertSetEqual(set(snapshot.action_needed_schedules), {self.kitchen_schedule, self.bedroom_schedule})
+        self.assertListEqual(snapshot.action_needed_cleaners, [self.eve])
+        self.assertSetEqual(set(snapshot.inactive_cleaners), {self.angie, self.bob, self.chris, self.dave})
+
+        snapshot = HealthSnapshot(week=self.start_week)
+        self.assertListEqual(snapshot.active_schedules, [])
+        self.assertSetEqual(set(snapshot.action_needed_schedules),
+                            {self.bathroom_schedule, self.kitchen_schedule, self.bedroom_schedule})
+        self.assertListEqual(snapshot.disabled_schedules, [self.garage_schedule])
+
+        self.assertSetEqual(set(snapshot.action_needed_cleaners), {self.angie, self.dave, self.eve})
+        self.assertSetEqual(set(snapshot.active_cleaners), {self.bob, self.chris})
+        self.assertListEqual(snapshot.inactive_cleaners, [])
+
+    def test__admin_view_query_count_independent_of_object_count(self):
+        self.client.force_login(self.superuser)
+
+        def nr_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse('webinterface:admin')).status_code, 200)
+            return len(queries.captured_queries)
+
+        before = nr_queries()
+        for i in range(5):
+            cleaner = Cleaner.objects.create(name="cleaner{}".format(i))
+            Affiliation.objects.create(cleaner=cleaner, group=self.upper_group,
+                                       beginning=self.start_week, end=self.end_week)
+            Schedule.objects.create(name="schedule{}".format(i))
+        self.assertEqual(nr_queries(), before)
@@ -1,5 +1,8 @@
 from django.test import TestCase
 from webinterface.models import *
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithTasks
+
+from unittest.mock import *
 
 
 class AssignmentTest(TestCase):
@@ -55,3 +58,42 @@ class AssignmentTest(TestCase):
     def test__switch_requested(self):
         self.assertEqual(self.assignment1.switch_requested(), self.dutyswitch)
         self.assertEqual(self.assignment2.switch_requested(), None)
+
+
+class AssignmentQuerySetTest(BaseFixtureWithTasks, TestCase):
+    def test__not_passed__agrees_with_has_passed(self):
+        assignments = list(Assignment.objects.select_related('cleaning_week__schedule'))
+        first_day = epoch_week_to_monday(self.start_week - 1)
+        for date in [first_day + datetime.timedelta(days=x) for x in range(7 * 6)]:
+            with patch('webinterface.models.timezone.now', autospec=True) as mock_now:
+                mock_now.return_value = timezone.make_aware(datetime.datetime.combine(date, datetime.time(hour=12)))
+                self.assertSetEqual(set(Assignment.objects.not_passed(date)),
+                                    set(x for x in assignments if not x.has_passed()), msg=str(date))
+
+    def test__not_passed__uncleaned_task_is_ready_to_be_done(self):
+        # bathroom_task_1 of week 2501 can be done until two days after the bathroom Assignment
+        assignment = Assignment.objects.get(schedule=self.bathroom_schedule, cleaning_week__week=self.start_week+1)
+        date = assignment.assignment_date() + datetime.timedelta(days=2)
+        self.assertTrue(Assignment.objects.not_passed(date).filter(pk=assignment.pk).exists())
+
+        assignment.cleaning_week.task_set.update(cleaned_by=self.angie)
+        self.assertFalse(Assignment.objects.not_passed(date).filter(pk=assignment.pk).exists())
+
+    def test__not_passed__latest_possible_task_end(self):
+        # A Sunday Schedule with a Task which ends 6 days later is the latest an Assignment can stay not passed
+        schedule = Schedule.objects.create(name="latest", weekday=Schedule.MAX_WEEKDAY)
+        template = TaskTemplate.objects.create(name="latest_task", schedule=schedule, start_days_before=0,
+                                               end_days_after=TaskTemplate.MAX_END_DAYS_AFTER)
+        cleaning_week = CleaningWeek.objects.create(week=self.start_week, schedule=schedule)
+        cleaning_week.task_set.all().delete()
+        cleaning_week.task_set.create(template=template)
+        assignment = Assignment.objects.create(cleaner=self.angie, cleaning_week=cleaning_week, schedule=schedule)
+
+        last_day = assignment.assignment_date() + datetime.timedelta(days=TaskTemplate.MAX_END_DAYS_AFTER)
+        self.assertEqual(last_day, epoch_week_to_monday(self.start_week + 1) + datetime.timedelta(days=5))
+        self.assertEqual(AssignmentQuerySet.first_week_not_passed_on(date_to_epoch_day(last_day)), self.start_week)
+        self.assertEqual(AssignmentQuerySet.first_week_not_passed_on(
+            date_to_epoch_day(last_day + datetime.timedelta(days=1))), self.start_week + 1)
+        self.assertTrue(Assignment.objects.not_passed(last_day).filter(pk=assignment.pk).exists())
+        self.assertFalse(Assignment.objects.not_passed(
+            last_day + datetime.timedelta(days=1)).filter(pk=assignment.pk).exists())
@@ -0,0 +1,96 @@
+from django.test import TestCase
+from webinterface.models import *
+from webinterface.signals import batched_assignment_signals
+from webinterface.tests.unit_tests.fixtures import BaseFixture
+
+from unittest.mock import *
+
+
+class AssignmentLedgerTest(BaseFixture, TestCase):
+    def ledger_state(self):
+        return sorted(AssignmentLedger.objects.values_list('schedule', 'cleaner', 'week', 'count', 'cumulative'),
+                      key=lambda x: (x[0], x[1] or 0, x[2]))
+
+    def assert_ledger_is_consistent(self):
+        state = self.ledger_state()
+        AssignmentLedger.objects.rebuild()
+        self.assertListEqual(state, self.ledger_state())
+
+    def test__count_in_timespan(self):
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, None, self.start_week, self.end_week), 4)
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, self.angie, self.start_week+1, self.end_week), 2)
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, self.chris, self.start_week, self.start_week+2), 0)
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, self.angie, self.end_week+1, self.end_week+10), 0)
+
+    def test__consistent_after_fixture(self):
+        self.assert_ledger_is_consistent()
+
+    def test__assignment_save_and_delete(self):
+        cleaning_week = self.bathroom_schedule.cleaningweek_set.get(week=self.start_week+1)
+        assignment = self.bathroom_schedule.assignment_set.create(cleaner=self.bob, cleaning_week=cleaning_week)
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, None, self.start_week, self.end_week), 5)
+        self.assert_ledger_is_consistent()
+
+        assignment.cleaner = self.chris
+        assignment.save()
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, self.chris, self.start_week, self.start_week+1), 1)
+        self.assert_ledger_is_consistent()
+
+        assignment.delete()
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, self.chris, self.start_week, self.start_week+1), 0)
+        self.assert_ledger_is_consistent()
+
+    def test__cleaning_week_disabled_and_invalidated(self):
+        cleaning_week = self.bathroom_schedule.cleaningweek_set.get(week=self.start_week)
+        cleaning_week.disabled = True
+        cleaning_week.save()
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, self.angie, self.start_week, self.end_week), 2)
+        self.assert_ledger_is_consistent()
+
+        cleaning_week.disabled = False
+        cleaning_week.save()
+        self.bathroom_schedule.cleaningweek_set.get(week=self.start_week+1).set_assignments_valid_field(False)
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.bathroom_schedule, self.angie, self.start_week, self.end_week), 2)
+        self.assert_ledger_is_consistent()
+
+    def test__cleaning_week_deleted(self):
+        self.kitchen_schedule.cleaningweek_set.get(week=self.start_week).delete()
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.kitchen_schedule, None, self.start_week, self.end_week), 1)
+        self.assert_ledger_is_consistent()
+
+    def test__cleaner_on_several_weekdays_of_a_week(self):
+        # angie cleans the bathroom (Wednesday) and the kitchen (Friday) in the same week. Django adds Meta.ordering
+        # of Assignment (which includes the weekday) to GROUP BY, which must not split the counts.
+        self.kitchen_schedule.assignment_set.create(cleaner=self.angie, cleaning_week=self.kitchen_cleaning_week_2500)
+        for schedule, cleaner, count in [(self.kitchen_schedule, self.angie, 1), (self.kitchen_schedule, None, 3),
+                                         (self.bathroom_schedule, self.angie, 3), (self.bedroom_schedule, self.bob, 1)]:
+            self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+                schedule, cleaner, self.start_week, self.end_week), count)
+        self.assert_ledger_is_consistent()
+
+    def test__batched_assignment_signals(self):
+        kitchen_cleaning_week = Assignment.objects.filter(schedule=self.kitchen_schedule).first().cleaning_week
+        original_refresh = AssignmentLedgerQuerySet.refresh
+        with patch.object(AssignmentLedgerQuerySet, 'refresh', autospec=True,
+                          side_effect=original_refresh) as mock_refresh:
+            with batched_assignment_signals():
+                Assignment.objects.filter(schedule=self.bathroom_schedule).delete()
+                # Deletes the Assignments along with their CleaningWeek
+                kitchen_cleaning_week.delete()
+                mock_refresh.assert_not_called()
+        # Once per Schedule
+        self.assertEqual(mock_refresh.call_count, 2)
+        self.assertFalse(AssignmentLedger.objects.filter(schedule=self.bathroom_schedule).exists())
+        self.assertFalse(AssignmentLedger.objects.filter(schedule=self.kitchen_schedule,
+                                                         week=kitchen_cleaning_week.week).exists())
+        self.assert_ledger_is_consistent()
@@ -1,4 +1,6 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from webinterface.models import *
 
 import logging
@@ -41,6 +43,21 @@ class CleaningWeekQuerySetTest(TestCase):
         assignments_invalid = CleaningWeek.objects.assignments_invalid()
         self.assertSetEqual(set(assignments_invalid), {self.cw4})
 
+    def test__invalidate_assignments(self):
+        cleaner = Cleaner.objects.create(name="cleaner")
+        Assignment.objects.create(cleaner=cleaner, cleaning_week=self.cw1, schedule=self.schedule)
+
+        with CaptureQueriesContext(connection) as queries:
+            invalidated = CleaningWeek.objects.filter(week__gte=self.start_week + 1).invalidate_assignments()
+        self.assertEqual(invalidated, 2)
+        self.assertEqual(len([x for x in queries.captured_queries
+                              if x['sql'].startswith('UPDATE "webinterface_cleaningweek"')]), 1)
+        self.assertSetEqual(set(CleaningWeek.objects.assignments_invalid()), {self.cw2, self.cw3, self.cw4})
+
+        self.assertEqual(CleaningWeek.objects.all().invalidate_assignments(), 1)
+        self.assertEqual(AssignmentLedger.objects.count_in_timespan(
+            self.schedule, cleaner, self.start_week, self.start_week + 3), 0)
+
 
 class CleaningWeekTest(TestCase):
     @classmethod
@@ -33,10 +33,18 @@ class DutySwitchTest(BaseFixtureWithDutySwitch, TestCase):
         string = self.angie_bathroom_dutyswitch_2502.__str__()
         self.assertIn(self.angie.name, string)
 
-    @patch('webinterface.models.Assignment.has_passed', autospec=True, return_value=False)
-    @patch('webinterface.models.current_epoch_week', autospec=True)
-    def test__possible_acceptors(self, mock_current_epoch_week, mock_has_passed):
-        mock_current_epoch_week.return_value = self.start_week
+    def on_date(self, date: datetime.date):
+        mock_now = patch('webinterface.models.timezone.now', autospec=True,
+                         return_value=timezone.make_aware(datetime.datetime.combine(date, datetime.time(hour=12))))
+        mock_current_epoch_week = patch('webinterface.models.current_epoch_week', autospec=True,
+                                        return_value=date_to_epoch_week(date))
+        mock_now.start()
+        mock_current_epoch_week.start()
+        self.addCleanup(mock_now.stop)
+        self.addCleanup(mock_current_epoch_week.stop)
+
+    def test__possible_acceptors(self):
+        self.on_date(epoch_week_to_monday(self.start_week))
 
         self.assertSetEqual(set(self.angie_bathroom_dutyswitch_2502.possible_acceptors()),
                             set(Assignment.objects.filter(
@@ -62,25 +70,39 @@ class DutySwitchTest(BaseFixtureWithDutySwitch, TestCase):
                                 cleaning_week__week__range=(self.start_week, self.start_week + 2)))
                             )
 
-    @patch('webinterface.models.Assignment.has_passed', autospec=True, return_value=True)
-    @patch('webinterface.models.current_epoch_week', autospec=True)
-    def test__requester_assignment_has_passed(self, mock_current_epoch_week, mock_has_passed):
-        mock_current_epoch_week.return_value = self.start_week
+    def test__possible_acceptors__single_query(self):
+        self.on_date(epoch_week_to_monday(self.start_week))
+        dutyswitch = DutySwitch.objects.select_related('requester_assignment__cleaning_week').\
+            get(pk=self.bob_garage_dutyswitch_2503.pk)
+        with self.assertNumQueries(1):
+            [str(x) for x in dutyswitch.possible_acceptors()]
+
+    def test__requester_assignment_has_passed(self):
+        self.on_date(epoch_week_to_monday(self.start_week + 4))
         self.assertFalse(self.angie_bathroom_dutyswitch_2502.possible_acceptors().exists())
         self.assertFalse(self.dave_garage_dutyswitch_2500.possible_acceptors().exists())
 
-    @patch('webinterface.models.Assignment.has_passed', autospec=True, side_effect=[False, True, False, False, False])
-    @patch('webinterface.models.current_epoch_week', autospec=True)
-    def test__one_acceptor_has_passed(self, mock_current_epoch_week, mock_has_passed):
-        mock_current_epoch_week.return_value = self.start_week
-
-        # has_passed will return True on its second call, on dave's garage duty in start_week
+    def test__one_acceptor_has_passed(self):
+        # Dave's garage duty on the Monday of start_week has passed on Tuesday
+        self.on_date(epoch_week_to_monday(self.start_week) + datetime.timedelta(days=1))
         self.assertSetEqual(set(self.bob_garage_dutyswitch_2503.possible_acceptors()),
                             set(Assignment.objects.filter(
                                 schedule=self.garage_schedule,
                                 cleaning_week__week__range=(self.start_week+1, self.start_week + 2)))
                             )
 
+    def test__acceptor_with_tasks_ready_to_be_done_has_not_passed(self):
+        self.on_date(epoch_week_to_monday(self.start_week) + datetime.timedelta(days=1))
+        template = TaskTemplate.objects.create(name="garage_task", start_days_before=0, end_days_after=2,
+                                               schedule=self.garage_schedule)
+        Task.objects.create(template=template,
+                            cleaning_week=self.garage_schedule.cleaningweek_set.get(week=self.start_week))
+        self.assertSetEqual(set(self.bob_garage_dutyswitch_2503.possible_acceptors()),
+                            set(Assignment.objects.filter(
+                                schedule=self.garage_schedule,
+                                cleaning_week__week__range=(self.start_week, self.start_week + 2)))
+                            )
+
 
 class DutySwitchDatabaseTests(TestCase):
     def setUp(self) -> None:
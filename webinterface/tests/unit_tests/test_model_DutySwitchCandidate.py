@@ -0,0 +1,97 @@
+from django.test import TestCase
+from webinterface.models import *
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithDutySwitch
+
+from unittest.mock import *
+
+
+class DutySwitchCandidateTest(BaseFixtureWithDutySwitch, TestCase):
+    def setUp(self) -> None:
+        # The fixture's Assignments are in the past, so the "has passed" check is made on the Monday of start_week
+        patcher = patch('webinterface.models.timezone.now', autospec=True)
+        self.mock_now = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.set_date(epoch_week_to_monday(self.start_week))
+
+    def set_date(self, date: datetime.date):
+        self.mock_now.return_value = timezone.make_aware(datetime.datetime.combine(date, datetime.time(hour=12)))
+
+    def assert_candidates_are_up_to_date(self):
+        for dutyswitch in DutySwitch.objects.all():
+            expected = set(dutyswitch.eligible_acceptors()) if dutyswitch.acceptor_assignment is None \
+                and not dutyswitch.requester_assignment.cleaning_week.disabled else set()
+            self.assertSetEqual(set(x.assignment for x in dutyswitch.dutyswitchcandidate_set.all()), expected,
+                                msg=str(dutyswitch))
+            self.assertTrue(all(x.cleaner == x.assignment.cleaner for x in dutyswitch.dutyswitchcandidate_set.all()))
+
+    def test__fixture(self):
+        self.assertTrue(DutySwitchCandidate.objects.exists())
+        self.assert_candidates_are_up_to_date()
+
+    def test__rebuild(self):
+        DutySwitchCandidate.objects.all().delete()
+        DutySwitchCandidate.objects.rebuild()
+        self.assert_candidates_are_up_to_date()
+
+    def test__acceptor_weeks_removed(self):
+        dutyswitch = DutySwitch.objects.get(pk=self.bob_garage_dutyswitch_2503.pk)
+        dutyswitch.acceptor_weeks.remove(self.garage_schedule.cleaningweek_set.get(week=self.start_week))
+        self.assert_candidates_are_up_to_date()
+
+    def test__assignment_changes_cleaner(self):
+        assignment = Assignment.objects.get(schedule=self.garage_schedule, cleaning_week__week=self.start_week+1)
+        assignment.cleaner = self.bob
+        assignment.save()
+        self.assert_candidates_are_up_to_date()
+
+    def test__assignment_deleted(self):
+        Assignment.objects.get(schedule=self.bathroom_schedule, cleaning_week__week=self.start_week+3).delete()
+        self.assert_candidates_are_up_to_date()
+
+    def test__cleaning_week_disabled(self):
+        for week in [self.start_week+1, self.start_week+3]:
+            cleaning_week = self.garage_schedule.cleaningweek_set.get(week=week)
+            cleaning_week.disabled = True
+            cleaning_week.save()
+            self.assert_candidates_are_up_to_date()
+        self.assertFalse(self.bob_garage_dutyswitch_2503.dutyswitchcandidate_set.exists())
+
+    def test__cleaner_excluded(self):
+        self.garage_schedule.cleaningweek_set.get(week=self.start_week+1).excluded.add(self.bob)
+        self.assert_candidates_are_up_to_date()
+
+    def test__affiliation_ends(self):
+        affiliation = Affiliation.objects.get(cleaner=self.dave)
+        affiliation.end = self.start_week + 2
+        affiliation.save()
+        self.assert_candidates_are_up_to_date()
+
+    def test__dutyswitch_accepted(self):
+        dutyswitch = DutySwitch.objects.get(pk=self.bob_garage_dutyswitch_2503.pk)
+        dutyswitch.acceptor_assignment = dutyswitch.dutyswitchcandidate_set.first().assignment
+        dutyswitch.save()
+        self.assertFalse(DutySwitchCandidate.objects.filter(dutyswitch=self.bob_garage_dutyswitch_2503.pk).exists())
+        self.assert_candidates_are_up_to_date()
+
+    def test__acceptable_by(self):
+        for cleaner in Cleaner.objects.all():
+            self.assertSetEqual(set(DutySwitch.objects.acceptable_by(cleaner)),
+                                set(x for x in DutySwitch.objects.open()
+                                    if x.possible_acceptors().filter(cleaner=cleaner).exists()),
+                                msg=cleaner.name)
+
+    def test__acceptable_by__passed_assignments(self):
+        self.assertIn(self.dave_garage_dutyswitch_2500, DutySwitch.objects.acceptable_by(self.bob))
+
+        # On Tuesday, dave's garage duty on Monday has passed
+        self.set_date(epoch_week_to_monday(self.start_week) + datetime.timedelta(days=1))
+        for cleaner in Cleaner.objects.all():
+            self.assertSetEqual(set(DutySwitch.objects.acceptable_by(cleaner)),
+                                set(x for x in DutySwitch.objects.open()
+                                    if x.possible_acceptors().filter(cleaner=cleaner).exists()),
+                                msg=cleaner.name)
+        self.assertNotIn(self.dave_garage_dutyswitch_2500, DutySwitch.objects.acceptable_by(self.bob))
+
+    def test__acceptable_by__single_query(self):
+        with self.assertNumQueries(1):
+            list(DutySwitch.objects.acceptable_by(self.bob))
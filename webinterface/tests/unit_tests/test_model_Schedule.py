@@ -64,6 +64,15 @@ class ScheduleTest(BaseFixture, TestCase):
         result = self.bathroom_schedule.deployment_ratios(self.start_week)
         self.assertListEqual([[self.bob, 0.3], [self.angie, 0.5]], result)
 
+    def test__deployment_ratio_series(self):
+        weeks = list(range(self.start_week - 2, self.end_week + 3))
+        for schedule in [self.bathroom_schedule, self.kitchen_schedule, self.bedroom_schedule, self.garage_schedule]:
+            with self.assertNumQueries(2):
+                series = schedule.deployment_ratio_series(weeks)
+            for week in weeks:
+                self.assertListEqual(sorted(series[week], key=lambda x: (x[1], x[0].pk)),
+                                     sorted(schedule.deployment_ratios(week), key=lambda x: (x[1], x[0].pk)))
+
     def test__occurs_in_week(self):
         weekly_schedule = Schedule(frequency=1)
         even_week_schedule = Schedule(frequency=2)
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from webinterface.models import *
+from webinterface.tests.unit_tests.fixtures import BaseFixture
+
+
+class ScheduleMembershipTest(BaseFixture, TestCase):
+    def assert_memberships_are_up_to_date(self):
+        expected = set((x.pk, schedule.pk, x.cleaner_id, x.beginning, x.end)
+                       for x in Affiliation.objects.all() for schedule in x.group.schedules.all())
+        self.assertSetEqual(set(ScheduleMembership.objects.values_list(
+            'affiliation', 'schedule', 'cleaner', 'beginning', 'end')), expected)
+
+    def assert_active_in_week_for_schedule_agrees(self):
+        for schedule in Schedule.objects.all():
+            for week in range(self.start_week - 1, self.end_week + 2):
+                expected = set(x for x in Affiliation.objects.active_in_week(week)
+                               if x.group.schedules.filter(pk=schedule.pk).exists())
+                self.assertSetEqual(set(Affiliation.objects.active_in_week_for_schedule(week, schedule)), expected)
+                self.assertSetEqual(set(Cleaner.objects.active(schedule=schedule, week=week)),
+                                    set(x.cleaner for x in expected))
+
+    def test__fixture(self):
+        self.assert_memberships_are_up_to_date()
+        self.assert_active_in_week_for_schedule_agrees()
+
+    def test__rebuild(self):
+        ScheduleMembership.objects.all().delete()
+        ScheduleMembership.objects.rebuild()
+        self.assert_memberships_are_up_to_date()
+
+    def test__affiliation_dates_change(self):
+        affiliation = Affiliation.objects.get(pk=self.bob_affiliation_2.pk)
+        affiliation.end = self.end_week + 5
+        affiliation.save()
+        self.assert_memberships_are_up_to_date()
+        self.assert_active_in_week_for_schedule_agrees()
+
+    def test__affiliation_group_changes(self):
+        affiliation = Affiliation.objects.get(pk=self.dave_affiliation.pk)
+        affiliation.group = self.upper_group
+        affiliation.save()
+        self.assert_memberships_are_up_to_date()
+        self.assert_active_in_week_for_schedule_agrees()
+
+    def test__affiliation_deleted(self):
+        Affiliation.objects.get(pk=self.angie_affiliation.pk).delete()
+        self.assert_memberships_are_up_to_date()
+
+    def test__schedule_group_changed(self):
+        self.upper_group.schedules.remove(self.bathroom_schedule)
+        self.assert_memberships_are_up_to_date()
+        self.bathroom_schedule.schedulegroup_set.add(self.lower_group)
+        self.assert_memberships_are_up_to_date()
+        self.lower_group.schedules.clear()
+        self.assert_memberships_are_up_to_date()
+        self.kitchen_schedule.schedulegroup_set.clear()
+        self.assert_memberships_are_up_to_date()
+        self.assert_active_in_week_for_schedule_agrees()
+
+    def test__cleaner_active__no_duplicates(self):
+        # bob and chris each have two Affiliations, and the lower ScheduleGroup has three Schedules
+        self.assertEqual(Cleaner.objects.active(week=self.start_week).count(), 4)
+        self.assertEqual(Cleaner.objects.active(schedule=self.kitchen_schedule, week=self.start_week).count(), 4)
+        self.assertListEqual(list(Cleaner.objects.active(schedule=self.bathroom_schedule, week=self.end_week)),
+                             [self.angie, self.chris])
+        self.assertListEqual(list(Cleaner.objects.inactive(schedule=self.bathroom_schedule, week=self.end_week)),
+                             [self.bob, self.dave])
+
+    def test__cleaner_active__group_without_schedules(self):
+        group = ScheduleGroup.objects.create(name="empty")
+        cleaner = Cleaner.objects.create(name="eve")
+        Affiliation.objects.create(cleaner=cleaner, group=group, beginning=self.start_week, end=self.end_week)
+        self.assertIn(cleaner, Cleaner.objects.active(week=self.start_week))
+        self.assertFalse(ScheduleMembership.objects.filter(cleaner=cleaner).exists())
@@ -0,0 +1,89 @@
+from django.test import TestCase
+from webinterface.models import *
+from cleansys import settings
+from webinterface.plot_cache import get_plot, rebuild_plot, rebuild_stale_plots, write_plot_file
+from webinterface.tests.unit_tests.fixtures import BaseFixture
+
+import tempfile
+from unittest.mock import *
+
+
+class PlotCacheTest(BaseFixture, TestCase):
+    def setUp(self) -> None:
+        self.media_root = tempfile.TemporaryDirectory()
+        cleaner_analytics_file = os.path.join(self.media_root.name, 'cleaner_analytics.html')
+        self.patchers = [patch('webinterface.models.MEDIA_ROOT', self.media_root.name),
+                         patch('webinterface.models.CLEANER_ANALYTICS_FILE', cleaner_analytics_file),
+                         patch('cleansys.settings.CLEANER_ANALYTICS_FILE', cleaner_analytics_file)]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self) -> None:
+        for patcher in self.patchers:
+            patcher.stop()
+        self.media_root.cleanup()
+
+    def data_versions(self) -> dict:
+        return {x.schedule_id: x.data_version for x in AnalyticsPlot.objects.all()}
+
+    def test__assignment_change_invalidates_plots_of_its_schedule(self):
+        plots = [AnalyticsPlot.objects.for_schedule(x) for x in [None, self.bathroom_schedule, self.kitchen_schedule]]
+        self.bathroom_schedule.assignment_set.create(
+            cleaner=self.bob, cleaning_week=self.bathroom_schedule.cleaningweek_set.get(week=self.start_week))
+        self.assertDictEqual(self.data_versions(), {None: plots[0].data_version + 1,
+                                                    self.bathroom_schedule.pk: plots[1].data_version + 1,
+                                                    self.kitchen_schedule.pk: plots[2].data_version})
+
+    def test__affiliation_change_invalidates_plots_of_its_groups(self):
+        plots = [AnalyticsPlot.objects.for_schedule(x) for x in [self.bathroom_schedule, self.garage_schedule]]
+        affiliation = Affiliation.objects.get(pk=self.angie_affiliation.pk)
+        affiliation.end = self.end_week + 5
+        affiliation.save()
+        self.assertEqual(self.data_versions()[self.bathroom_schedule.pk], plots[0].data_version + 1)
+        self.assertEqual(self.data_versions()[self.garage_schedule.pk], plots[1].data_version)
+
+    def test__get_plot_doesnt_render(self):
+        with patch('webinterface.plot_cache.rebuild_plot', autospec=True) as mock_rebuild_plot:
+            self.assertIsNone(get_plot(self.bathroom_schedule))
+            self.assertIsNone(get_plot(None))
+        mock_rebuild_plot.assert_not_called()
+        self.assertFalse(os.path.isfile(self.bathroom_schedule.analytics_plot_path()))
+
+    def test__rebuild_plot(self):
+        plot = AnalyticsPlot.objects.for_schedule(self.bathroom_schedule)
+        rebuild_plot(plot)
+        self.assertTrue(AnalyticsPlot.objects.get(pk=plot.pk).is_fresh())
+        self.assertIsNotNone(get_plot(self.bathroom_schedule))
+
+        # A stale plot is still served until it is rebuilt
+        self.bathroom_schedule.assignment_set.first().delete()
+        self.assertIsNotNone(get_plot(self.bathroom_schedule))
+        self.assertFalse(AnalyticsPlot.objects.for_schedule(self.bathroom_schedule).is_fresh())
+        rebuild_stale_plots()
+        self.assertTrue(AnalyticsPlot.objects.for_schedule(self.bathroom_schedule).is_fresh())
+
+    def test__rebuild_stale_plots(self):
+        # The cleaner analytics plot and one plot per enabled Schedule
+        self.assertEqual(rebuild_stale_plots(), 4)
+        self.assertTrue(os.path.isfile(settings.CLEANER_ANALYTICS_FILE))
+        self.assertEqual(rebuild_stale_plots(), 0)
+        self.assertEqual(rebuild_stale_plots(force=True), 4)
+
+    def test__write_plot_file_replaces_the_file(self):
+        path = os.path.join(self.media_root.name, 'plot.html')
+        write_plot_file(path, "old")
+        write_plot_file(path, "new")
+        with open(path) as file:
+            self.assertEqual(file.read(), "new")
+        self.assertListEqual(os.listdir(self.media_root.name), ['plot.html'])
+
+    def test__write_plot_file_keeps_the_old_file_on_failure(self):
+        path = os.path.join(self.media_root.name, 'plot.html')
+        write_plot_file(path, "old")
+        with patch('webinterface.plot_cache.os.replace', autospec=True) as mock_replace:
+            mock_replace.side_effect = OSError("disk full")
+            with self.assertRaises(OSError):
+                write_plot_file(path, "new")
+        with open(path) as file:
+            self.assertEqual(file.read(), "old")
+        self.assertListEqual(os.listdir(self.media_root.name), ['plot.html'])
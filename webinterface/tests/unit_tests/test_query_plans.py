@@ -0,0 +1,68 @@
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase
+from webinterface.models import *
+from webinterface.query_plans import explain_catalogue, full_scans
+
+import io
+from unittest.mock import *
+
+
+class QueryPlansTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # A synthetic database which is large enough for the query planner to prefer indexes over scans
+        week = current_epoch_week()
+        weeks = range(week - 150, week + 50)
+        schedules = [Schedule.objects.create(name="schedule{}".format(i), weekday=i % 7) for i in range(6)]
+        group = ScheduleGroup.objects.create(name="group")
+        group.schedules.set(schedules)
+        templates = [TaskTemplate.objects.create(name="task", schedule=x, start_days_before=1, end_days_after=2)
+                     for x in schedules]
+
+        Cleaner.objects.bulk_create(Cleaner(name="cleaner{}".format(i), slug="cleaner{}".format(i))
+                                    for i in range(60))
+        cleaners = list(Cleaner.objects.all())
+        Affiliation.objects.bulk_create(Affiliation(cleaner=x, group=group, beginning=week - 150 + i, end=week + 50)
+                                        for i, x in enumerate(cleaners))
+        ScheduleMembership.objects.rebuild()
+
+        CleaningWeek.objects.bulk_create(CleaningWeek(schedule=x, week=w, assignments_valid=True)
+                                         for x in schedules for w in weeks)
+        cleaning_weeks = list(CleaningWeek.objects.all())
+        Assignment.objects.bulk_create(Assignment(cleaner=cleaners[(x.pk + i) % len(cleaners)], cleaning_week=x,
+                                                  schedule_id=x.schedule_id)
+                                       for x in cleaning_weeks for i in range(2))
+        Task.objects.bulk_create(Task(cleaning_week=x, template=templates[schedules.index(x.schedule)],
+                                      cleaned_by=cleaners[x.pk % len(cleaners)] if x.week < week else None)
+                                 for x in cleaning_weeks)
+        DutySwitch.objects.bulk_create(DutySwitch(requester_assignment=x)
+                                       for x in Assignment.objects.filter(cleaning_week__week__gte=week)[::10])
+        QueuedEmail.objects.bulk_create(QueuedEmail(subject="subject", body="body", to="a@b.c",
+                                                    sent=timezone.now() if i % 20 else None) for i in range(2000))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test__full_scans(self):
+        self.assertListEqual(full_scans("SCAN webinterface_task\nSEARCH webinterface_cleaner USING INDEX x (y=?)"),
+                             ['webinterface_task'])
+        self.assertListEqual(full_scans("SCAN TABLE webinterface_task AS T3"), ['webinterface_task'])
+        self.assertListEqual(full_scans('Seq Scan on "webinterface_assignment"  (cost=0.00..1.01 rows=1)'),
+                             ['webinterface_assignment'])
+        self.assertListEqual(full_scans("SCAN webinterface_schedule"), [])
+
+    def test__no_full_scans(self):
+        for name, plan, scans in explain_catalogue():
+            self.assertListEqual(scans, [], msg="{}:\n{}".format(name, plan))
+
+    def test__command(self):
+        out = io.StringIO()
+        call_command('explain_queries', '--plans', stdout=out)
+        self.assertIn('DutySwitch.objects.open(): OK', out.getvalue())
+        self.assertIn('SEARCH', out.getvalue())
+
+    def test__command__fail_on_scan(self):
+        with self.assertRaises(CommandError):
+            with patch('webinterface.management.commands.explain_queries.explain_catalogue',
+                       return_value=[('query', 'SCAN webinterface_task', ['webinterface_task'])]):
+                call_command('explain_queries', '--fail-on-scan', stdout=io.StringIO())
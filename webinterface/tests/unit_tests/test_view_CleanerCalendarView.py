@@ -0,0 +1,72 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.views import cleaner_calendar_rows, CleanerView
+from webinterface.epoch_calendar import frozen_epoch_week
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithTasks
+
+
+# The calendar as CleanerCalendarView.get_context_data() built it before cleaner_calendar_rows()
+def legacy_calendar_rows(cleaner: Cleaner) -> list:
+    assignments = list(cleaner.assignment_set.in_week_or_later(week=current_epoch_week()-1))
+    calendar_rows = []
+    all_tasks = Task.objects.filter(cleaning_week__in=[x.cleaning_week for x in assignments], cleaned_by__isnull=True)
+    if len(assignments) >= 1:
+        for week in range(min(current_epoch_week(), assignments[0].cleaning_week.week),
+                          assignments[-1].cleaning_week.week):
+            monday = epoch_week_to_monday(week)
+            columns = []
+            for weekday in range(0, 7):
+                day = monday + timezone.timedelta(days=weekday)
+                columns.append({
+                    'date': day.strftime("%d.%m."),
+                    'is_today': timezone.now().date() == day,
+                    'equiv_page': CleanerView.paginate_by,
+                    'assignments': [x for x in assignments if x.assignment_date() == day],
+                    'task_ready': any(x.is_active_on_date(day) for x in all_tasks)
+                })
+            calendar_rows.append(columns)
+    return calendar_rows
+
+
+class CleanerCalendarViewTest(BaseFixtureWithTasks, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.kitchen_task_template = TaskTemplate.objects.create(name="kitchen_task", start_days_before=6,
+                                                                end_days_after=6, schedule=cls.kitchen_schedule)
+        for cleaning_week in CleaningWeek.objects.filter(schedule=cls.kitchen_schedule):
+            cleaning_week.create_missing_tasks()
+
+    def test__same_as_legacy(self):
+        for week in range(self.start_week - 2, self.end_week + 2):
+            with frozen_epoch_week(week):
+                for cleaner in Cleaner.objects.all():
+                    self.assertListEqual(cleaner_calendar_rows(cleaner), legacy_calendar_rows(cleaner),
+                                         msg="{} in week {}".format(cleaner, week))
+
+    def test__task_ready(self):
+        with frozen_epoch_week(self.start_week):
+            rows = cleaner_calendar_rows(self.angie)
+        # angie's bathroom duties are on Wednesdays. The Tasks of start_week are done, the ones of the week after
+        # can be done from Sunday of start_week until the Saturday after.
+        self.assertListEqual([x['task_ready'] for x in rows[0]], [False] * 6 + [True])
+        self.assertListEqual([x['task_ready'] for x in rows[1]], [True] * 7)
+        self.assertListEqual([[y.pk for y in x['assignments']] for x in rows[0]],
+                             [[], [], [self.angie_for_bathroom_in_week_2500.pk], [], [], [], []])
+
+    def test__no_assignments(self):
+        with frozen_epoch_week(self.end_week + 10):
+            self.assertListEqual(cleaner_calendar_rows(self.angie), [])
+
+    def test__query_count_independent_of_assignments(self):
+        def page_queries(cleaner):
+            self.client.force_login(cleaner.user)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse('webinterface:cleaner-calendar')).status_code, 200)
+            return len(queries.captured_queries)
+
+        with frozen_epoch_week(self.start_week):
+            self.assertEqual(page_queries(self.angie), page_queries(self.dave))
@@ -0,0 +1,88 @@
+from django.test import TestCase
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.ics_feed import feed_token, cleaner_from_token, ics_line, ics_escape
+from webinterface.epoch_calendar import frozen_epoch_week
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithTasks
+
+
+class CleanerICSFeedViewTest(BaseFixtureWithTasks, TestCase):
+    def url(self, cleaner: Cleaner) -> str:
+        return reverse('webinterface:cleaner-ics-feed', kwargs={'token': feed_token(cleaner)})
+
+    def get(self, cleaner: Cleaner, **headers):
+        with frozen_epoch_week(self.start_week):
+            return self.client.get(self.url(cleaner), **headers)
+
+    def test__token(self):
+        self.assertEqual(cleaner_from_token(feed_token(self.angie)), self.angie)
+        self.assertIsNone(cleaner_from_token(feed_token(self.angie) + "x"))
+        url = reverse('webinterface:cleaner-ics-feed', kwargs={'token': feed_token(self.angie) + "x"})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test__feed(self):
+        response = self.get(self.angie)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        content = b"".join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(content.endswith("END:VCALENDAR\r\n"))
+        self.assertTrue(all(len(x.encode('utf-8')) <= 75 for x in content.split("\r\n")))
+
+        # angie has bathroom duty on the Wednesdays of the three first weeks, but start_week-1 is the first one shown
+        for week in [self.start_week, self.start_week + 1, self.start_week + 2]:
+            self.assertIn("DTSTART;VALUE=DATE:{}".format(epoch_week_to_date(week, 2).strftime("%Y%m%d")), content)
+        self.assertEqual(content.count("SUMMARY:Putzdienst: bathroom"), 3)
+        # The Tasks of start_week are done, so there are windows for the two later weeks only
+        self.assertEqual(content.count("SUMMARY:Aufgaben bereit: bathroom"), 2)
+        window_start = epoch_week_to_date(self.start_week + 1, 2) - datetime.timedelta(days=3)
+        self.assertIn("DTSTART;VALUE=DATE:{}".format(window_start.strftime("%Y%m%d")), content)
+
+    def test__conditional_get(self):
+        response = self.get(self.angie)
+        etag = response['ETag']
+        # A deletion doesn't make the newest modification time newer, so there is no Last-Modified to rely on
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        self.assertEqual(self.get(self.angie, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.get(self.bob)['ETag'], etag)
+
+        # Cleaning a Task changes the feed
+        task = Task.objects.filter(cleaning_week=self.bathroom_cleaning_week_2501).first()
+        task.cleaned_by = self.angie
+        task.save()
+        self.assertEqual(self.get(self.angie, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test__etag_changes_when_assignment_is_deleted(self):
+        etag = self.get(self.angie)['ETag']
+        self.angie_for_bathroom_in_week_2502.delete()
+        self.assertEqual(self.get(self.angie, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test__etag_changes_when_task_template_is_edited(self):
+        etag = self.get(self.angie)['ETag']
+        template = self.bathroom_schedule.tasktemplate_set.first()
+        template.end_days_after = 4
+        template.save()
+        self.assertEqual(self.get(self.angie, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test__etag_changes_when_schedule_is_edited(self):
+        etag = self.get(self.angie)['ETag']
+        schedule = Schedule.objects.get(pk=self.bathroom_schedule.pk)
+        schedule.name = "badezimmer"
+        schedule.save()
+        self.assertEqual(self.get(self.angie, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test__query_count(self):
+        with frozen_epoch_week(self.start_week):
+            # Cleaner, feed state, Assignments and prefetched Tasks
+            with self.assertNumQueries(4):
+                b"".join(self.client.get(self.url(self.angie)).streaming_content)
+            with self.assertNumQueries(4):
+                b"".join(self.client.get(self.url(self.dave)).streaming_content)
+
+    def test__ics_line(self):
+        self.assertEqual(ics_line("SUMMARY:short"), "SUMMARY:short\r\n")
+        folded = ics_line("DESCRIPTION:" + "ä" * 100)
+        self.assertTrue(all(len(x.encode('utf-8')) <= 75 for x in folded.split("\r\n")))
+        self.assertEqual(folded.replace("\r\n ", "").rstrip("\r\n"), "DESCRIPTION:" + "ä" * 100)
+        self.assertEqual(ics_escape("a,b;c\\d\ne"), "a\\,b\\;c\\\\d\\ne")
@@ -0,0 +1,64 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.epoch_calendar import frozen_epoch_week
+from webinterface.tests.unit_tests.fixtures import BaseFixtureWithDutySwitch, BaseFixtureWithTasks
+
+from unittest.mock import *
+
+
+class CleanerViewTest(BaseFixtureWithDutySwitch, BaseFixtureWithTasks, TestCase):
+    def page_queries(self, cleaner: Cleaner, page: int = 1) -> int:
+        self.client.force_login(cleaner.user)
+        with frozen_epoch_week(self.start_week):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('webinterface:cleaner', kwargs={'page': page}))
+        self.assertEqual(response.status_code, 200)
+        return len(queries.captured_queries)
+
+    def test__with_card_data__agrees_with_model_methods(self):
+        first_day = epoch_week_to_monday(self.start_week - 1)
+        for date in [first_day + datetime.timedelta(days=x) for x in range(0, 7 * 6, 2)]:
+            with patch('webinterface.models.timezone.now', autospec=True) as mock_now:
+                mock_now.return_value = timezone.make_aware(datetime.datetime.combine(date, datetime.time(hour=12)))
+                for assignment in Assignment.objects.with_card_data():
+                    msg = "{} on {}".format(assignment, date)
+                    self.assertEqual(assignment.tasks_ready, assignment.tasks_are_ready_to_be_done(), msg=msg)
+                    self.assertEqual(assignment.passed, assignment.has_passed(), msg=msg)
+                    self.assertListEqual(assignment.other_cleaners_on_card(),
+                                         list(assignment.other_cleaners_in_week_for_schedule()), msg=msg)
+                    self.assertEqual(assignment.nr_tasks, assignment.cleaning_week.task_set.count(), msg=msg)
+                    self.assertEqual(assignment.nr_completed_tasks,
+                                     assignment.cleaning_week.completed_tasks().count(), msg=msg)
+                    if assignment.nr_tasks:
+                        self.assertEqual(assignment.all_tasks_are_completed_on_card(),
+                                         assignment.cleaning_week.all_tasks_are_completed(), msg=msg)
+                    else:
+                        self.assertFalse(assignment.all_tasks_are_completed_on_card())
+                    switch_requested = assignment.switch_requested()
+                    self.assertEqual(assignment.open_dutyswitch_pk, switch_requested.pk if switch_requested else None,
+                                     msg=msg)
+
+    def test__dutyswitch_link(self):
+        self.client.force_login(self.angie.user)
+        page = 1 + list(self.angie.assignment_set.in_enabled_cleaning_weeks()).index(
+            self.angie_bathroom_dutyswitch_2502.requester_assignment) // 5
+        with patch('webinterface.models.timezone.now', autospec=True) as mock_now:
+            mock_now.return_value = timezone.make_aware(datetime.datetime.combine(
+                epoch_week_to_monday(self.start_week), datetime.time(hour=12)))
+            with frozen_epoch_week(self.start_week):
+                response = self.client.get(reverse('webinterface:cleaner', kwargs={'page': page}))
+        self.assertContains(response, reverse('webinterface:dutyswitch-update', kwargs={
+            'dutyswitch_pk': self.angie_bathroom_dutyswitch_2502.pk, 'page': page}))
+
+    def test__query_count_independent_of_assignments(self):
+        queries = self.page_queries(self.angie)
+        self.assertEqual(self.page_queries(self.bob), queries)
+
+        # More DutySwitches and completed Tasks on the page don't cost more queries
+        for assignment in self.angie.assignment_set.all():
+            DutySwitch.objects.get_or_create(requester_assignment=assignment)
+        Task.objects.filter(cleaning_week__assignment__cleaner=self.angie).update(cleaned_by=self.angie)
+        self.assertEqual(self.page_queries(self.angie), queries)
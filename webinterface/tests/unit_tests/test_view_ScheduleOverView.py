@@ -0,0 +1,57 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.views import ScheduleOverView
+
+from unittest.mock import *
+
+
+class ScheduleOverViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.current_week = 2600
+        cls.schedules = [Schedule.objects.create(name="schedule{}".format(i)) for i in range(3)]
+        cls.cleaner = Cleaner.objects.create(name="cleaner")
+        for schedule in cls.schedules:
+            TaskTemplate.objects.create(name="task1", schedule=schedule, start_days_before=1, end_days_after=1)
+            TaskTemplate.objects.create(name="task2", schedule=schedule, start_days_before=1, end_days_after=1)
+            for week in range(cls.current_week - 60, cls.current_week + 1):
+                schedule.cleaningweek_set.create(week=week, assignments_valid=True).create_missing_tasks()
+        Task.objects.filter(cleaning_week__week=cls.current_week - 1, template__name="task1").\
+            update(cleaned_by=cls.cleaner)
+
+        cls.superuser = User.objects.create_superuser(username="admin", password="admin")
+
+    def get_overview(self, weeks_into_past: int):
+        self.client.force_login(self.superuser)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('webinterface:schedule-overview-weeks',
+                                               kwargs={'weeks_into_past': weeks_into_past}))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries.captured_queries)
+
+    @patch('webinterface.views.current_epoch_week', autospec=True)
+    def test__query_count_independent_of_weeks(self, mock_current_epoch_week):
+        mock_current_epoch_week.return_value = self.current_week
+        response, nr_queries = self.get_overview(weeks_into_past=2)
+        response_year, nr_queries_year = self.get_overview(weeks_into_past=52)
+        self.assertEqual(nr_queries, nr_queries_year)
+        self.assertEqual(len(response_year.context['rows']), 53)
+
+    @patch('webinterface.views.current_epoch_week', autospec=True)
+    def test__weeks_into_past_is_capped(self, mock_current_epoch_week):
+        mock_current_epoch_week.return_value = self.current_week
+        response, _ = self.get_overview(weeks_into_past=1000)
+        self.assertEqual(response.context['weeks_into_past'], ScheduleOverView.max_weeks_into_past)
+
+    @patch('webinterface.views.current_epoch_week', autospec=True)
+    def test__grid(self, mock_current_epoch_week):
+        mock_current_epoch_week.return_value = self.current_week
+        response, _ = self.get_overview(weeks_into_past=2)
+        row = response.context['rows'][1]
+        self.assertEqual(row['week'], self.current_week - 1)
+        self.assertListEqual([x.schedule for x in row['cleaning_weeks']], self.schedules)
+        self.assertListEqual([(x.nr_completed_tasks, x.nr_tasks, x.completed_tasks_ratio)
+                              for x in row['cleaning_weeks']], [(1, 2, 0.5)] * 3)
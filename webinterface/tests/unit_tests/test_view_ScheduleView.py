@@ -0,0 +1,63 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from webinterface.models import *
+
+from unittest.mock import *
+
+
+class ScheduleViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.start_week = 2500
+        cls.schedule = Schedule.objects.create(name="schedule", cleaners_per_date=2)
+        cls.short_schedule = Schedule.objects.create(name="short", cleaners_per_date=2)
+        cls.group = ScheduleGroup.objects.create(name="group")
+        cls.group.schedules.add(cls.schedule, cls.short_schedule)
+
+        cls.cleaners = [Cleaner.objects.create(name="cleaner{}".format(i)) for i in range(3)]
+        for cleaner in cls.cleaners:
+            Affiliation.objects.create(cleaner=cleaner, group=cls.group,
+                                       beginning=cls.start_week, end=cls.start_week + 20)
+
+        for schedule, nr_weeks in [(cls.schedule, 10), (cls.short_schedule, 2)]:
+            TaskTemplate.objects.create(name="task1", schedule=schedule, start_days_before=1, end_days_after=1)
+            TaskTemplate.objects.create(name="task2", schedule=schedule, start_days_before=1, end_days_after=1)
+            schedule.create_assignments_over_timespan(cls.start_week, cls.start_week + nr_weeks - 1, in_memory=True)
+            schedule.tasktemplate_set.create(name="task3", start_days_before=1, end_days_after=1)
+            task = Task.objects.filter(cleaning_week__schedule=schedule).first()
+            task.cleaned_by = cls.cleaners[0]
+            task.save()
+
+        cls.superuser = User.objects.create_superuser(username="admin", password="admin")
+
+    def page_queries(self, schedule: Schedule) -> list:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('webinterface:schedule', kwargs={'slug': schedule.slug, 'page': 1}))
+        self.assertEqual(response.status_code, 200)
+        return queries.captured_queries
+
+    @patch('webinterface.models.current_epoch_week', autospec=True)
+    def test__query_count_independent_of_page_size(self, mock_current_epoch_week):
+        mock_current_epoch_week.return_value = self.start_week + 5
+        self.client.force_login(self.superuser)
+        self.assertEqual(len(self.page_queries(self.schedule)), len(self.page_queries(self.short_schedule)))
+
+    @patch('webinterface.models.current_epoch_week', autospec=True)
+    def test__query_budget(self, mock_current_epoch_week):
+        mock_current_epoch_week.return_value = self.start_week + 5
+        # Session, user, schedule, paginator count, cleaning weeks, prefetched assignments and tasks
+        self.client.force_login(self.cleaners[0].user)
+        self.assertEqual(len(self.page_queries(self.schedule)), 7)
+
+        # The warnings on top of the page for the superuser take a constant number of queries
+        self.client.force_login(self.superuser)
+        self.assertEqual(len(self.page_queries(self.schedule)), 14)
+
+    def test__annotations(self):
+        cleaning_week = self.schedule.cleaningweek_set.with_listing_data().first()
+        self.assertEqual(cleaning_week.nr_assignments, 2)
+        self.assertEqual(cleaning_week.nr_tasks, 2)
+        self.assertEqual(cleaning_week.nr_completed_tasks, 1)
+        self.assertTrue(cleaning_week.has_missing_task_templates)
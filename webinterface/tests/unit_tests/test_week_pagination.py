@@ -0,0 +1,68 @@
+from django.core.paginator import Paginator
+from django.test import TestCase
+from django.urls import reverse
+from webinterface.models import *
+from webinterface.week_pagination import WeekAnchoredPaginator, keyset_condition
+from webinterface.epoch_calendar import frozen_epoch_week
+from webinterface.tests.unit_tests.fixtures import BaseFixture
+
+
+class WeekAnchoredPaginatorTest(BaseFixture, TestCase):
+    ordering = ('cleaning_week__week', 'schedule__weekday', 'pk')
+
+    def paginator(self, anchor_week: int, per_page: int = 3) -> WeekAnchoredPaginator:
+        return WeekAnchoredPaginator(Assignment.objects.all(), per_page, anchor_week=anchor_week,
+                                     ordering=self.ordering)
+
+    def test__same_pages_as_paginator(self):
+        expected = Paginator(Assignment.objects.order_by(*self.ordering), 3)
+        for anchor_week in range(self.start_week - 1, self.end_week + 2):
+            paginator = self.paginator(anchor_week)
+            self.assertEqual(paginator.num_pages, expected.num_pages)
+            for number in expected.page_range:
+                self.assertListEqual(list(paginator.page(number)), list(expected.page(number)),
+                                     msg="Page {} with anchor {}".format(number, anchor_week))
+
+    def test__anchor_page_number(self):
+        assignments = list(Assignment.objects.order_by(*self.ordering))
+        for anchor_week in range(self.start_week - 1, self.end_week + 1):
+            index = next(i for i, x in enumerate(assignments) if x.cleaning_week.week >= anchor_week)
+            self.assertEqual(self.paginator(anchor_week).anchor_page_number(), 1 + index // 3)
+        self.assertEqual(self.paginator(self.end_week + 1).anchor_page_number(), 1)
+
+    def test__page_number_of(self):
+        paginator = self.paginator(self.start_week + 2)
+        for index, assignment in enumerate(Assignment.objects.order_by(*self.ordering)):
+            self.assertEqual(paginator.page_number_of(assignment.pk), 1 + index // 3)
+        self.assertEqual(paginator.page_number_of(-1), 1)
+
+    def test__keyset_condition(self):
+        assignments = list(Assignment.objects.order_by(*self.ordering))
+        middle = assignments[len(assignments) // 2]
+        key = Assignment.objects.filter(pk=middle.pk).values_list(*self.ordering).get()
+        self.assertListEqual(list(Assignment.objects.filter(keyset_condition(self.ordering, key)).
+                                  order_by(*self.ordering)), assignments[len(assignments) // 2:])
+        self.assertListEqual(list(Assignment.objects.filter(keyset_condition(self.ordering, key, inclusive=False)).
+                                  order_by(*self.ordering)), assignments[len(assignments) // 2 + 1:])
+
+    def test__query_count(self):
+        # Counts and the page
+        with self.assertNumQueries(2):
+            self.paginator(self.start_week + 2).page(1)
+        # Counts, the key of the first row and the page
+        with self.assertNumQueries(3):
+            self.paginator(self.start_week + 2).page(3)
+
+    def test__cleaner_view_redirects(self):
+        self.client.force_login(self.bob.user)
+        assignments = list(self.bob.assignment_set.in_enabled_cleaning_weeks())
+        with frozen_epoch_week(self.start_week + 2):
+            index = next(i for i, x in enumerate(assignments) if x.cleaning_week.week >= self.start_week + 2)
+            response = self.client.get(reverse('webinterface:cleaner-no-page'))
+            self.assertRedirects(response, reverse('webinterface:cleaner', kwargs={'page': 1 + index // 5}),
+                                 fetch_redirect_response=False)
+            for index, assignment in enumerate(assignments):
+                response = self.client.get(reverse('webinterface:cleaner-no-page-to-assignment',
+                                                   kwargs={'assignment_pk': assignment.pk}))
+                self.assertRedirects(response, reverse('webinterface:cleaner', kwargs={'page': 1 + index // 5}),
+                                     fetch_redirect_response=False)
@@ -60,6 +60,7 @@ urlpatterns = [
     path('du/', login_required(CleanerView.as_view()), name='cleaner-no-page'),
     path('du/dienst<int:assignment_pk>/', login_required(CleanerView.as_view()), name='cleaner-no-page-to-assignment'),
     path('du/kalender/', login_required(CleanerCalendarView.as_view()), name='cleaner-calendar'),
+    path('du/kalender/<str:token>.ics', CleanerICSFeedView.as_view(), name='cleaner-ics-feed'),
     path('putzer-analytics/', login_required(CleanerAnalyticsView.as_view()), name='cleaner-analytics'),
     path('putzer-analytics/p<int:cleaner_page>/', login_required(CleanerAnalyticsView.as_view()),
          name='cleaner-analytics-with-cleaner-page'),
@@ -114,6 +115,8 @@ urlpatterns = [
          name='schedule-task-new'),
     path('schedule-overview', must_be_admin(ScheduleOverView.as_view()),
          name='schedule-overview'),
+    path('schedule-overview/<int:weeks_into_past>', must_be_admin(ScheduleOverView.as_view()),
+         name='schedule-overview-weeks'),
 
     path('schedule-group-new/', must_be_admin(ScheduleGroupNewView.as_view()),
          name='schedule-group-new'),
@@ -1,17 +1,27 @@
 import plotly.offline as opy
 import plotly.graph_objs as go
 from django.shortcuts import redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.http import HttpResponseRedirect, HttpResponseForbidden
 from django.contrib.auth.views import LoginView
-from django.views.generic import TemplateView
-from django.http import Http404
+from django.views.generic import TemplateView, View
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
 from django.shortcuts import get_object_or_404
 from webinterface.models import *
+from webinterface.health_snapshot import HealthSnapshot
+from webinterface.plot_cache import get_plot, write_plot_file
+from webinterface.week_pagination import WeekAnchoredPaginator
+from webinterface.ics_feed import feed_token, cleaner_from_token, feed_first_week, feed_state, ics_feed
+from webinterface.epoch_calendar import epoch_weeks_to_dates, epoch_week_range_to_days
 from cleansys import settings
 import markdown
+from array import array
+from itertools import accumulate
+from django.db.models import Count
 
 
 def back_button_page_context(kwargs: dict) -> dict:
@@ -27,6 +37,78 @@ def back_button_page_context(kwargs: dict) -> dict:
     return context
 
 
+def assignment_count_matrix(cleaners: list, weeks: list) -> list:
+    """
+    Counts the Assignments in enabled CleaningWeeks of each Cleaner in each week with one grouped query.
+
+    :param cleaners: The Cleaners which make up the rows of the matrix
+    :param weeks: The weeks which make up the columns of the matrix
+    :return: One array('i') per Cleaner, holding the number of Assignments in each week
+    """
+    cleaner_index = {cleaner.pk: i for i, cleaner in enumerate(cleaners)}
+    week_index = {week: i for i, week in enumerate(weeks)}
+    matrix = [array('i', [0]) * len(weeks) for _ in cleaners]
+
+    for x in Assignment.objects.in_enabled_cleaning_weeks().filter(
+            cleaner__in=list(cleaner_index), cleaning_week__week__in=weeks).order_by().\
+            values('cleaner', 'cleaning_week__week').annotate(count=Count('pk')):
+        matrix[cleaner_index[x['cleaner']]][week_index[x['cleaning_week__week']]] = x['count']
+    return matrix
+
+
+def cleaner_calendar_rows(cleaner: Cleaner, today: datetime.date = None) -> list:
+    """
+    Builds the weeks of the CleanerCalendarView with two queries, one for the Assignments and one for the open
+    Tasks. The Assignments are bucketed by their date and the days on which each Task can be done are added up
+    in a difference array over the calendar, so that the cost grows with days + Tasks instead of days * Tasks.
+
+    :return: One list of 7 day dicts per week
+    """
+    today = today or timezone.now().date()
+    assignments = list(cleaner.assignment_set.in_week_or_later(week=current_epoch_week()-1).
+                       select_related('schedule', 'cleaning_week__schedule'))
+    if not assignments:
+        return []
+
+    first_week = min(current_epoch_week(), assignments[0].cleaning_week.week)
+    last_week = assignments[-1].cleaning_week.week
+    days = epoch_week_range_to_days(first_week, last_week - 1)
+    if not days:
+        return []
+    first_day = days[0]
+
+    assignments_on_day = {}
+    for assignment in assignments:
+        assignments_on_day.setdefault(assignment.assignment_date(), []).append(assignment)
+
+    # tasks_ready[i+1] - tasks_ready[i] is the change in the number of open Tasks from days[i-1] to days[i]
+    tasks_ready = [0] * (len(days) + 1)
+    for week, weekday, start_days_before, end_days_after in Task.objects.filter(
+            cleaning_week__in=set(x.cleaning_week_id for x in assignments), cleaned_by__isnull=True).\
+            values_list('cleaning_week__week', 'cleaning_week__schedule__weekday',
+                        'template__start_days_before', 'template__end_days_after'):
+        assignment_day = (epoch_week_to_date(week, weekday) - first_day).days
+        start = max(assignment_day - start_days_before, 0)
+        end = min(assignment_day + end_days_after, len(days) - 1)
+        if start <= end:
+            tasks_ready[start] += 1
+            tasks_ready[end + 1] -= 1
+    tasks_ready = list(accumulate(tasks_ready))
+
+    calendar_rows = []
+    for i, day in enumerate(days):
+        if day.weekday() == 0:
+            calendar_rows.append([])
+        calendar_rows[-1].append({
+            'date': day.strftime("%d.%m."),
+            'is_today': today == day,
+            'equiv_page': CleanerView.paginate_by,
+            'assignments': assignments_on_day.get(day, []),
+            'task_ready': tasks_ready[i] > 0
+        })
+    return calendar_rows
+
+
 def create_cleaner_analytics(weeks_into_past=20, weeks_into_future=20, recreate=False):
     """
     This function creates the offline plotly html file which is included in CleanerAnalyticsView
@@ -44,11 +126,15 @@ def create_cleaner_analytics(weeks_into_past=20, weeks_into_future=20, recreate=
         weeks = list(weeks)
         weeks.sort()
 
+        cleaners = list(Cleaner.objects.all())
+        matrix = assignment_count_matrix(cleaners=cleaners, weeks=weeks)
+        week_dates = epoch_weeks_to_dates(weeks, weekday=6)
+
         fig = go.Figure()
-        for cleaner in Cleaner.objects.all():
+        for cleaner, assignment_counts in zip(cleaners, matrix):
             fig.add_trace(go.Scatter(
-                x=[epoch_week_to_sunday(x) for x in weeks],
-                y=[cleaner.assignment_set.in_enabled_cleaning_weeks().filter(cleaning_week__week=x).count() for x in weeks],
+                x=week_dates,
+                y=assignment_counts.tolist(),
                 name=cleaner.name,
                 mode='lines+markers'
             ))
@@ -58,10 +144,7 @@ def create_cleaner_analytics(weeks_into_past=20, weeks_into_future=20, recreate=
                           yaxis={'title': 'Anzahl Putzdienste'})
         plot_html = opy.plot(fig, auto_open=False, output_type='div')
 
-        if os.path.isfile(settings.CLEANER_ANALYTICS_FILE):
-            os.remove(settings.CLEANER_ANALYTICS_FILE)
-        with open(settings.CLEANER_ANALYTICS_FILE, "w") as file:
-            file.write(plot_html)
+        write_plot_file(settings.CLEANER_ANALYTICS_FILE, plot_html)
 
 
 def create_schedule_analytics(weeks_into_past=20, weeks_into_future=20, only=None, recreate=False):
@@ -88,9 +171,9 @@ def create_schedule_analytics(weeks_into_past=20, weeks_into_future=20, only=Non
         weeks.sort()
 
         data = {}
+        series = schedule.deployment_ratio_series(weeks=weeks)
         for week in weeks:
-            cleaners__ratios = schedule.deployment_ratios(week=week)
-            for cleaner, ratio in cleaners__ratios:
+            for cleaner, ratio in series[week]:
                 if cleaner.name not in data:
                     data[cleaner.name] = {'weeks': [], 'ratios': []}
                 data[cleaner.name]['weeks'].append(week)
@@ -99,7 +182,7 @@ def create_schedule_analytics(weeks_into_past=20, weeks_into_future=20, only=Non
         fig = go.Figure()
         for cleaner, weeks__ratios in data.items():
             fig.add_trace(go.Scatter(
-                x=[epoch_week_to_sunday(x) for x in weeks__ratios['weeks']],
+                x=epoch_weeks_to_dates(weeks__ratios['weeks'], weekday=6),
                 y=weeks__ratios['ratios'],
                 name=cleaner,
                 connectgaps=True,
@@ -113,10 +196,7 @@ def create_schedule_analytics(weeks_into_past=20, weeks_into_future=20, only=Non
 
         plot_html = opy.plot(fig, auto_open=False, output_type='div')
 
-        if os.path.isfile(schedule.analytics_plot_path()):
-            os.remove(schedule.analytics_plot_path())
-        with open(schedule.analytics_plot_path(), "w") as file:
-            file.write(plot_html)
+        write_plot_file(schedule.analytics_plot_path(), plot_html)
 
 
 class MarkdownView(TemplateView):
@@ -171,26 +251,15 @@ class AdminView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        enabled_schedules = Schedule.objects.enabled()
-        # webinterface_snippets/schedule_panel.html needs to cover the same cases!
-        context['action_needed_schedules'] = \
-            set(enabled_schedules.filter(tasktemplate__isnull=True)) | \
-            set(enabled_schedules.filter(assignment__isnull=True)) | \
-            set(enabled_schedules.filter(schedulegroup__isnull=True)) | \
-            set(x for x in Schedule.objects.enabled() if x.cleaningweek_set.assignments_invalid().exists()) | \
-            set(x for x in Schedule.objects.enabled() if x.assignments_are_running_out())
-
-        action_needed_schedule_pks = [x.pk for x in context['action_needed_schedules']]
-        context['active_schedule_list'] = enabled_schedules.exclude(pk__in=action_needed_schedule_pks)
-        context['disabled_schedule_list'] = Schedule.objects.disabled()
-
-        # webinterface_snippets/cleaner_panel.html needs to cover the same cases!
-        context['action_needed_cleaners'] = \
-            set(Cleaner.objects.filter(affiliation__isnull=True)) | \
-            set(x for x in Cleaner.objects.all() if x.is_homeless_soon())
-        action_needed_cleaner_pks = [x.pk for x in context['action_needed_cleaners']]
-        context['active_cleaner_list'] = Cleaner.objects.active().exclude(pk__in=action_needed_cleaner_pks)
-        context['inactive_cleaner_list'] = Cleaner.objects.inactive().exclude(pk__in=action_needed_cleaner_pks)
+        # webinterface_snippets/schedule_panel.html and cleaner_panel.html display the health of the snapshot
+        snapshot = HealthSnapshot()
+        context['action_needed_schedules'] = snapshot.action_needed_schedules
+        context['active_schedule_list'] = snapshot.active_schedules
+        context['disabled_schedule_list'] = snapshot.disabled_schedules
+
+        context['action_needed_cleaners'] = snapshot.action_needed_cleaners
+        context['active_cleaner_list'] = snapshot.active_cleaners
+        context['inactive_cleaner_list'] = snapshot.inactive_cleaners
 
         context['schedule_group_list'] = ScheduleGroup.objects.all()
         return context
@@ -206,19 +275,19 @@ class ScheduleView(ListView):
         self.cleaning_weeks = self.schedule.cleaningweek_set.all()
 
         if 'page' not in kwargs:
-            if self.cleaning_weeks.filter(week__gt=current_epoch_week()-1).exists():
-                index_of_current_cleaning_week = next(i for i, v
-                                                      in enumerate(self.cleaning_weeks)
-                                                      if v.week >= current_epoch_week())
-                page_nr_with_current_cleaning_week = 1 + (index_of_current_cleaning_week // self.paginate_by)
-            else:
-                page_nr_with_current_cleaning_week = 1
+            page_nr_with_current_cleaning_week = self.get_paginator(self.cleaning_weeks, self.paginate_by).\
+                anchor_page_number()
             return redirect(reverse_lazy('webinterface:schedule',
                                          kwargs={'slug': kwargs['slug'], 'page': page_nr_with_current_cleaning_week}))
         return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        return self.cleaning_weeks
+        return self.cleaning_weeks.with_listing_data()
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return WeekAnchoredPaginator(queryset, per_page, anchor_week=current_epoch_week(), ordering=('week',),
+                                     base_queryset=self.cleaning_weeks,
+                                     allow_empty_first_page=allow_empty_first_page, **kwargs)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -233,9 +302,7 @@ class ScheduleAnalyticsView(DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context = {**context, **back_button_page_context(self.kwargs)}
-        create_schedule_analytics(only=context['schedule'].analytics_plot_path(), recreate=False)
-        with open(context['schedule'].analytics_plot_path(), 'r') as plot:
-            context['plot'] = plot.read()
+        context['plot'] = get_plot(schedule=context['schedule'])
 
         return context
 
@@ -253,29 +320,36 @@ class SchedulePrintView(TemplateView):
 
 class ScheduleOverView(TemplateView):
     template_name = "webinterface/schedule_overview.html"
+    max_weeks_into_past = 52
 
     def get_context_data(self, **kwargs):
-        weeks_into_past = 10
-        weeks_into_future = 1
+        weeks_into_past = min(max(kwargs.get('weeks_into_past', 10), 1), self.max_weeks_into_past)
+        current_week = current_epoch_week()
+
+        displayed_weeks = [x for x in range(current_week-weeks_into_past, current_week+1)]
 
-        displayed_weeks = [x for x in range(current_epoch_week()-weeks_into_past, current_epoch_week()+1)]
+        enabled_schedules = list(Schedule.objects.enabled())
 
-        # week_ranges = \
-        #     [f"{epoch_week_to_monday(x).strftime('%d. %b %Y')} bis {epoch_week_to_sunday(x).strftime('%d. %b %Y')}"
-        #      for x in displayed_weeks]
+        # One query for the whole grid, which is then pivoted into rows of weeks and columns of schedules
+        cleaning_weeks = {}
+        for cleaning_week in CleaningWeek.objects.with_task_counts().\
+                filter(schedule__in=enabled_schedules, week__range=(displayed_weeks[0], displayed_weeks[-1])):
+            cleaning_week.completed_tasks_ratio = \
+                cleaning_week.nr_completed_tasks / cleaning_week.nr_tasks if cleaning_week.nr_tasks else 0.0
+            cleaning_weeks[(cleaning_week.week, cleaning_week.schedule_id)] = cleaning_week
 
-        enabled_schedules = Schedule.objects.enabled()
         rows = [
             {
                 'week': x,
                 'timeframe': [epoch_week_to_monday(x), epoch_week_to_sunday(x)],
-                'cleaning_weeks': [s.cleaningweek_set.filter(week=x).first() for s in enabled_schedules]
+                'cleaning_weeks': [cleaning_weeks.get((x, s.pk)) for s in enabled_schedules]
             } for x in displayed_weeks]
 
-        context = {'schedules': Schedule.objects.enabled(),
+        context = {'schedules': enabled_schedules,
                    'rows': rows,
-                   'current_week': current_epoch_week(),
-                   'weeks_into_past': weeks_into_past}
+                   'current_week': current_week,
+                   'weeks_into_past': weeks_into_past,
+                   'max_weeks_into_past': self.max_weeks_into_past}
         return context
 
 
@@ -312,29 +386,30 @@ class CleanerView(ListView):
         self.assignments = self.cleaner.assignment_set.in_enabled_cleaning_weeks()
 
         if 'page' not in kwargs:
-            if self.assignments.in_week_or_later(week=current_epoch_week()+1).exists():
-                if 'assignment_pk' in kwargs:
-                    index_of_current_cleaning_week = next(i for i, v
-                                                          in enumerate(self.assignments)
-                                                          if v.pk == kwargs['assignment_pk'])
-                else:
-                    index_of_current_cleaning_week = next(i for i, v
-                                                          in enumerate(self.assignments)
-                                                          if v.cleaning_week.week >= current_epoch_week())
-                page_nr_with_current_assignments = 1 + (index_of_current_cleaning_week // self.paginate_by)
+            paginator = self.get_paginator(self.assignments, self.paginate_by)
+            if 'assignment_pk' in kwargs:
+                page_nr_with_current_assignments = paginator.page_number_of(kwargs['assignment_pk'])
             else:
-                page_nr_with_current_assignments = 1
+                page_nr_with_current_assignments = paginator.anchor_page_number()
             return redirect(reverse_lazy('webinterface:cleaner',
                                          kwargs={'page': page_nr_with_current_assignments}))
 
         return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        return self.assignments
+        return self.assignments.with_card_data()
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return WeekAnchoredPaginator(queryset, per_page, anchor_week=current_epoch_week(),
+                                     ordering=('cleaning_week__week', 'schedule__weekday', 'pk'),
+                                     base_queryset=self.assignments,
+                                     allow_empty_first_page=allow_empty_first_page, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['cleaner'] = self.cleaner
+        context['acceptable_dutyswitches'] = DutySwitch.objects.acceptable_by(self.cleaner).select_related(
+            'requester_assignment__cleaner', 'requester_assignment__cleaning_week__schedule')
         return context
 
 
@@ -349,33 +424,34 @@ class CleanerCalendarView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        assignments = self.cleaner.assignment_set.in_week_or_later(week=current_epoch_week()-1)
-        assignments = list(assignments)
-
         context['calendar_header'] = ['Mo', 'Di', 'Mi', 'Do', 'Fr', 'Sa', 'So']
-        context['calendar_rows'] = []
-
-        all_tasks = Task.objects.filter(cleaning_week__in=[x.cleaning_week for x in assignments],
-                                        cleaned_by__isnull=True)
-        if len(assignments) >= 1:
-            for week in range(min(current_epoch_week(), assignments[0].cleaning_week.week),
-                              assignments[-1].cleaning_week.week):
-                monday = epoch_week_to_monday(week)
-                columns = []
-                for weekday in range(0, 7):
-                    day = monday + timezone.timedelta(days=weekday)
-                    day_data = {
-                        'date': day.strftime("%d.%m."),
-                        'is_today': timezone.now().date() == day,
-                        'equiv_page': CleanerView.paginate_by,
-                        'assignments': [x for x in assignments if x.assignment_date() == day],
-                        'task_ready': any(x.is_active_on_date(day) for x in all_tasks)
-                    }
-                    columns.append(day_data)
-                context['calendar_rows'].append(columns)
+        context['calendar_rows'] = cleaner_calendar_rows(self.cleaner)
+        context['ics_feed_url'] = self.request.build_absolute_uri(
+            reverse('webinterface:cleaner-ics-feed', kwargs={'token': feed_token(self.cleaner)}))
         return context
 
 
+class CleanerICSFeedView(View):
+    """
+    The Cleaner's Assignments as iCalendar feed for calendar apps. The URL contains a signed token instead of
+    requiring a login. Requests with a matching If-None-Match header get a 304 response.
+    """
+    def get(self, request, *args, **kwargs):
+        cleaner = cleaner_from_token(kwargs['token'])
+        if cleaner is None:
+            raise Http404("Diesen Kalender gibt es nicht.")
+
+        first_week = feed_first_week()
+        etag = feed_state(cleaner, first_week)
+        response = get_conditional_response(request, etag=quote_etag(etag))
+        if response is None:
+            response = StreamingHttpResponse(ics_feed(cleaner, first_week),
+                                             content_type='text/calendar; charset=utf-8')
+            response['Content-Disposition'] = 'inline; filename="{}.ics"'.format(cleaner.slug)
+        response['ETag'] = quote_etag(etag)
+        return response
+
+
 class CleanerAnalyticsView(ListView):
     model = Cleaner
     template_name = 'webinterface/cleaner_analytics_dashboard.html'
@@ -386,9 +462,7 @@ class CleanerAnalyticsView(ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context = {**context, **back_button_page_context(self.kwargs)}
-        create_cleaner_analytics(recreate=False)  # Skips if already there
-        with open(settings.CLEANER_ANALYTICS_FILE, 'r') as plot:
-            context['plot'] = plot.read()
+        context['plot'] = get_plot(schedule=None)
 
         return context
 
@@ -0,0 +1,89 @@
+"""
+Pagination of long, week ordered listings (the CleaningWeeks of a Schedule, the Assignments of a Cleaner).
+
+Django's Paginator fetches a page with OFFSET, so the database walks over all rows in front of the page, and
+finding the page which contains the current week meant loading the whole listing. The WeekAnchoredPaginator keeps
+the same page numbers, but counts the rows before an anchor week once and reaches a page from there with a keyset
+condition (key >= first key of the page). The rows which are skipped are at most the ones between the page and the
+anchor week, so the cost doesn't grow with the length of the history.
+"""
+from django.core.paginator import Paginator
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+
+
+def keyset_condition(ordering: tuple, key: tuple, inclusive: bool = True) -> Q:
+    """
+    :param ordering: The fields the rows are ordered by, the last one must be unique
+    :param key: The values of the fields in ordering of a row
+    :param inclusive: Whether the row itself fulfills the condition
+    :return: The rows which come after the row with the key
+    """
+    condition = Q(**{ordering[-1] + ('__gte' if inclusive else '__gt'): key[-1]})
+    for field, value in reversed(list(zip(ordering[:-1], key[:-1]))):
+        condition = Q(**{field + '__gt': value}) | (Q(**{field: value}) & condition)
+    # The condition on the first field alone lets the database use an index for the range
+    return Q(**{ordering[0] + '__gte': key[0]}) & condition
+
+
+class WeekAnchoredPaginator(Paginator):
+    def __init__(self, object_list, per_page, anchor_week: int, ordering: tuple, base_queryset=None, **kwargs):
+        """
+        :param object_list: The QuerySet the pages are taken from
+        :param anchor_week: Usually the current epoch week
+        :param ordering: The fields the rows are ordered by. The first one is the epoch week, the last one is unique.
+        :param base_queryset: The same rows as object_list without its annotations and prefetches, which is used for
+        counting and for looking up keys. Defaults to object_list.
+        """
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+        self.anchor_week = anchor_week
+        self.ordering = tuple(ordering)
+        self.base_queryset = (base_queryset if base_queryset is not None else object_list).order_by(*ordering)
+
+    @cached_property
+    def counts(self) -> dict:
+        """The number of all rows and of the rows before the anchor week, in one query"""
+        return self.base_queryset.aggregate(
+            total=Count('pk'), before_anchor=Count('pk', filter=Q(**{self.ordering[0] + '__lt': self.anchor_week})))
+
+    @cached_property
+    def count(self) -> int:
+        return self.counts['total']
+
+    def anchor_page_number(self) -> int:
+        """
+        :return: The page with the first row in or after the anchor week, or 1 if there is none
+        """
+        if self.counts['total'] == self.counts['before_anchor']:
+            return 1
+        return 1 + self.counts['before_anchor'] // self.per_page
+
+    def page_number_of(self, pk) -> int:
+        """
+        :return: The page with the row with the primary key pk, or 1 if it isn't in the listing
+        """
+        key = self.base_queryset.filter(pk=pk).values_list(*self.ordering).first()
+        if key is None:
+            return 1
+        index = self.base_queryset.exclude(keyset_condition(self.ordering, key)).count()
+        return 1 + index // self.per_page
+
+    def key_at(self, index: int) -> tuple:
+        """
+        :return: The key of the row at index, which is reached from the anchor week
+        """
+        before_anchor = self.counts['before_anchor']
+        if index >= before_anchor:
+            keys = self.base_queryset.filter(**{self.ordering[0] + '__gte': self.anchor_week})
+            return keys.values_list(*self.ordering)[index - before_anchor]
+        keys = self.base_queryset.filter(**{self.ordering[0] + '__lt': self.anchor_week}).reverse()
+        return keys.values_list(*self.ordering)[before_anchor - 1 - index]
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        if bottom == 0:
+            rows = self.object_list
+        else:
+            rows = self.object_list.filter(keyset_condition(self.ordering, self.key_at(bottom)))
+        return self._get_page(list(rows[:self.per_page]), number, self)